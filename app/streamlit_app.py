@@ -12,9 +12,15 @@ sys.path.append(parent_dir)
 
 # Import custom functions
 from tab_df.display import display_tab_df_content
-from tab_num.display import display_tab_num_content
-from tab_text.display import display_tab_text_content
-from tab_date.display import display_tab_date_content
+from tab_num.display import display_tab_num_content, submit_num_profiling
+from tab_text.display import display_tab_text_content, submit_text_profiling
+from tab_date.display import display_tab_date_content, submit_date_profiling
+from utils import config
+from utils.background import background_profiler
+from utils.budget import memory_estimate, over_memory_budget
+from utils.instrument import Instrumentation, recording
+from utils.partitions import open_uploads
+from utils.store import hash_upload, invalidate_upload
 
 # Set Streamlit Page Configuration
 st.set_page_config(
@@ -25,31 +31,79 @@ st.set_page_config(
 )
 
 # Set objects in Streamlit session state
+# The parsed upload itself lives in utils.store, keyed by its content, so reruns don't parse it again
 st.session_state["file_path"] = None
-st.session_state["df"] = None
-st.session_state["dataset"] = None
-st.session_state["selected_num_col"] = None
-st.session_state["num_column"] = None
-st.session_state["selected_text_col"] = None
-st.session_state["text_column"] = None
-st.session_state["selected_date_col"] = None
-st.session_state["date_column"] = None
 
 # Display Title
 st.title("CSV Explorer")
 
 # Add Window to upload CSV file
 with st.expander("ℹ️ - Streamlit application for performing data exploration on a CSV", expanded=True):
-    st.session_state.file_path = st.file_uploader("Choose a CSV file")
+    # Several CSV files, or zip archives of them, are explored as one dataset made of all their rows
+    uploads = st.file_uploader("Choose a CSV file (or several partitions of the same dataset, or a zip of them)", accept_multiple_files=True)
+    # The files are only read again when the selection changes, so that the upload keeps the same object (and hash) across reruns
+    selection = tuple((upload.name, upload.size, getattr(upload, "file_id", None)) for upload in uploads)
+    if st.session_state.get("upload_selection") != selection:
+        st.session_state["upload_selection"] = selection
+        st.session_state["upload"] = open_uploads(uploads)
+        # Columns picked to find duplicated rows belong to the previous upload
+        st.session_state.pop("duplicate_subset", None)
+    st.session_state.file_path = st.session_state["upload"]
+    if uploads and st.session_state.file_path is None:
+        st.warning("No CSV file found in the selected files.", icon="⚠️")
+    # Parsed uploads are cached in memory and on disk, this forces the current one to be parsed again
+    if st.session_state.file_path is not None and st.button("Clear cached copy of this file"):
+        invalidate_upload(st.session_state.file_path)
+        background_profiler.forget(hash_upload(st.session_state.file_path))
+    st.checkbox("Memory-optimized load (categories, smaller numeric types and Arrow strings)", key="optimize_memory")
+    st.checkbox("Approximate unique counts and medians with mergeable sketches (bounded memory, error shown)", key="approximate_stats")
+    st.checkbox("Sample-first exploration (estimates from a sample right away, exact values computed in the background)", key="sample_first")
+    # Each session records its own steps, memory is only measured when recording is switched on for the whole app (CSV_EXPLORER_INSTRUMENT=1)
+    record_performance = st.checkbox("Record performance (time, rows and memory of each step)", value=config.INSTRUMENT, key="record_performance")
+    if "instrumentation" not in st.session_state:
+        st.session_state["instrumentation"] = Instrumentation(enabled=False, trace_memory=False)
+    instrumentation = st.session_state["instrumentation"]
+    instrumentation.set_enabled(record_performance)
 
-# If a CSV file is uploaded, display the different tabs
+# If a CSV file is uploaded, display the selected tab
+# st.tabs would run the content of the four tabs on every rerun, a radio only runs the one on screen
 if st.session_state.file_path is not None:
-    tab_df, tab_num, tab_text, tab_date = st.tabs(["DataFrame", "Numeric Serie", "Text Serie", "Datetime Serie"])
-    with tab_df:
-        display_tab_df_content(file_path=st.session_state.file_path)
-    with tab_num:
-        display_tab_num_content(file_path=st.session_state.file_path)
-    with tab_text:
-        display_tab_text_content(file_path=st.session_state.file_path)
-    with tab_date:
-        display_tab_date_content(file_path=st.session_state.file_path)
+    TABS = {
+        "DataFrame": display_tab_df_content,
+        "Numeric Serie": display_tab_num_content,
+        "Text Serie": display_tab_text_content,
+        "Datetime Serie": display_tab_date_content
+    }
+    # Every numeric, text and datetime column starts being profiled in the background right away, whichever tab is shown
+    if background_profiler.enabled:
+        submit_num_profiling(file_path=st.session_state.file_path)
+        submit_text_profiling(file_path=st.session_state.file_path)
+        submit_date_profiling(file_path=st.session_state.file_path)
+
+    # Uploads too large for the memory budget are never loaded whole, the tabs fall back to chunked and sampled computations
+    optimize = st.session_state.get("optimize_memory", False)
+    if over_memory_budget(st.session_state.file_path, optimize):
+        estimate = memory_estimate(st.session_state.file_path, optimize) / 1024 ** 2
+        st.warning(f"This file would take about {estimate:,.0f} MiB in memory once loaded, over the budget of {config.MEMORY_BUDGET_BYTES / 1024 ** 2:,.0f} MiB per dataset: the DataFrame tab reads it chunk by chunk and the column tabs show values estimated from a sample of its rows, with their confidence interval.", icon="⚠️")
+    # Estimates are shown with their confidence interval, a rerun picks up the exact values computed since
+    elif st.session_state.get("sample_first", False):
+        if background_profiler.enabled:
+            st.info("Values shown with a confidence interval are estimated from a sample of the rows, they are replaced by the exact values once these have been computed in the background.")
+            st.button("Refresh")
+        else:
+            st.info("Values shown with a confidence interval are estimated from a sample of the rows. Background profiling is off, so exact values are not computed.")
+
+    active_tab = st.radio("Tab", list(TABS), horizontal=True, label_visibility="collapsed", key="active_tab")
+    with recording(instrumentation):
+        TABS[active_tab](file_path=st.session_state.file_path)
+
+# Display the recorded steps, the slowest first, and the raw records as JSON
+if instrumentation.enabled:
+    with st.expander("Performance", expanded=False):
+        if st.button("Clear records"):
+            instrumentation.clear()
+        if instrumentation.records:
+            st.dataframe(instrumentation.summary(), hide_index=True, use_container_width=True)
+            st.download_button("Download records as JSON", instrumentation.to_json(), file_name="performance.json", mime="application/json")
+        else:
+            st.write("No step recorded yet.")
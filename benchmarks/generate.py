@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+# Column types cycled through by each type mix
+TYPE_MIXES = {
+    "numeric": ["int", "float"],
+    "text": ["text"],
+    "dates": ["date"],
+    "mixed": ["int", "float", "text", "date"]
+}
+# Number of distinct values of text and date columns, "high" gives (almost) one value per row
+CARDINALITIES = {"low": 20, "high": None}
+MISSING_RATIO = 0.05
+
+
+def generate_column(rng, col_type, n_rows, n_distinct):
+    """
+    --------------------
+    Description
+    --------------------
+    -> generate_column (function): Function that draws the values of one synthetic column, with about MISSING_RATIO of missing values for floats, texts and dates
+
+    --------------------
+    Parameters
+    --------------------
+    -> rng (np.random.Generator): Random generator
+    -> col_type (str): "int", "float", "text" or "date"
+    -> n_rows (int): Number of values
+    -> n_distinct (int): Number of distinct text or date values (None for one value per row)
+
+    --------------------
+    Returns
+    --------------------
+    -> (np.ndarray): Values of the column
+
+    """
+    n_distinct = n_rows if n_distinct is None else n_distinct
+    if col_type == "int":
+        return rng.integers(-1000, 100_000, n_rows)
+    if col_type == "float":
+        values = rng.normal(50, 20, n_rows).round(3)
+    elif col_type == "text":
+        vocabulary = np.char.add("value_", rng.choice(10 ** 9, n_distinct, replace=False).astype(str))
+        values = vocabulary[rng.integers(0, n_distinct, n_rows)].astype(object)
+    else:
+        start = np.datetime64("2000-01-01")
+        days = rng.choice(9000, min(n_distinct, 9000), replace=False)
+        dates = np.datetime_as_string(start + days.astype("timedelta64[D]"), unit="D")
+        values = dates[rng.integers(0, len(dates), n_rows)].astype(object)
+    values[rng.random(n_rows) < MISSING_RATIO] = np.nan
+    return values
+
+
+def generate_dataframe(n_rows, n_cols, type_mix="mixed", cardinality="low", seed=0):
+    """
+    --------------------
+    Description
+    --------------------
+    -> generate_dataframe (function): Function that builds a synthetic dataframe whose columns cycle through the types of a type mix, always the same for the same arguments
+
+    --------------------
+    Parameters
+    --------------------
+    -> n_rows (int): Number of rows
+    -> n_cols (int): Number of columns
+    -> type_mix (str): One of the keys of TYPE_MIXES (default set to "mixed")
+    -> cardinality (str): One of the keys of CARDINALITIES (default set to "low")
+    -> seed (int): Seed of the random generator (default set to 0)
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): Synthetic dataframe
+
+    """
+    rng = np.random.default_rng(seed)
+    col_types = TYPE_MIXES[type_mix]
+    columns = {}
+    for col_index in range(n_cols):
+        col_type = col_types[col_index % len(col_types)]
+        columns[f"{col_type}_{col_index}"] = generate_column(rng, col_type, n_rows, CARDINALITIES[cardinality])
+    return pd.DataFrame(columns)
+
+
+def generate_csv(path, n_rows, n_cols, type_mix="mixed", cardinality="low", seed=0):
+    generate_dataframe(n_rows, n_cols, type_mix, cardinality, seed).to_csv(path, index=False)
+    return path
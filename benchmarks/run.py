@@ -0,0 +1,323 @@
+"""
+Benchmark suite of the logic classes on synthetic CSV files.
+
+Usage (from the project directory):
+    python -m benchmarks.run [--grid quick|default|full] [--baseline benchmarks/baseline.json] [--save-baseline] [--threshold 0.25]
+
+For every case of the grid (row count x column count x type mix x cardinality) a CSV file is generated, then every public method
+of Dataset, NumericColumn, TextColumn and DateColumn is timed (best of --repeat runs) and its peak memory measured with tracemalloc.
+Results are compared with the baseline file: the run fails when a method is slower, or needs more memory, than its baseline by more
+than the threshold, or when the statistics computed on a case differ from the baseline ones. It also fails when there is no baseline
+file, unless --save-baseline creates it.
+"""
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generate import CARDINALITIES, TYPE_MIXES, generate_csv
+from tab_date.logics import DateColumn, profile_date_column
+from tab_df.logics import Dataset
+from tab_num.logics import NumericColumn, profile_numeric_column
+from tab_text.logics import TextColumn, profile_text_column
+from utils.disk_cache import disk_cache
+from utils.lazy import reset_stats
+from utils.store import dataset_store, hash_upload
+
+GRIDS = {
+    "quick": {"rows": [10_000], "cols": [8], "type_mixes": ["mixed"], "cardinalities": ["low", "high"]},
+    "default": {"rows": [10_000, 100_000], "cols": [8, 32], "type_mixes": ["numeric", "text", "mixed"], "cardinalities": ["low", "high"]},
+    "full": {"rows": [10_000, 100_000, 1_000_000], "cols": [8, 32], "type_mixes": list(TYPE_MIXES), "cardinalities": list(CARDINALITIES)}
+}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Methods timed on their own entry (construction) instead of being called again on a built instance
+SKIPPED_METHODS = {
+    Dataset: {"set_data", "set_data_chunked", "set_data_partitioned", "set_aggregate", "set_data_sampled", "set_df", "read_rows"},
+    NumericColumn: set(),
+    TextColumn: set(),
+    DateColumn: set()
+}
+# Methods taking the name of the column as argument, they are timed last as they reset the statistics of the column
+COLUMN_METHODS = ["set_data"]
+
+
+def measure(function, repeat=3):
+    """
+    --------------------
+    Description
+    --------------------
+    -> measure (function): Function that times a function (best of repeat runs) and measures its peak memory in a separate run traced by tracemalloc, whose overhead would distort the timing.
+    tracemalloc sees the memory allocated through Python and NumPy, not the one allocated by pyarrow.
+
+    --------------------
+    Parameters
+    --------------------
+    -> function (callable): Function to measure, called without arguments
+    -> repeat (int): Number of timed runs (default set to 3)
+
+    --------------------
+    Returns
+    --------------------
+    -> (tuple): Best duration in seconds and peak memory in bytes
+
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(durations), peak
+
+
+def public_methods(cls):
+    # Methods of the class in definition order, the ones taking the column name last
+    methods = [name for name, value in vars(cls).items() if inspect.isfunction(value) and not name.startswith("_")]
+    methods = [name for name in methods if name not in SKIPPED_METHODS[cls]]
+    return [name for name in methods if name not in COLUMN_METHODS] + [name for name in methods if name in COLUMN_METHODS]
+
+
+def forget_stats(column):
+    # Memoized statistics and the column state kept in the store are dropped, so that a method computes what it reads instead of finding it cached
+    reset_stats(column)
+    if column.state_key is not None and not column.is_serie_none():
+        dataset_store.discard(column.state_key, column.state_name())
+
+
+def call_on_columns(columns, method):
+    # Run a method on the profiled object of every column, passing the column name to the methods that need it
+    def run():
+        for col_name, column in columns.items():
+            forget_stats(column)
+            if method in COLUMN_METHODS:
+                getattr(column, method)(col_name)
+            else:
+                getattr(column, method)()
+    return run
+
+
+def fingerprint(outputs):
+    text = json.dumps(outputs, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def summary_values(column):
+    return column.get_summary().astype(str).values.tolist()
+
+
+def benchmark_file(file_path, repeat=3):
+    """
+    --------------------
+    Description
+    --------------------
+    -> benchmark_file (function): Function that times every public method of the four logic classes on one CSV file.
+    Constructions and find_* methods start from an empty store (cold parse) or without the schema (schema inference); the other methods are called on profiled columns whose memoized statistics and stored column state are dropped before each call, so that each timing covers the statistics the method reads as well as its own work.
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str): Path to the CSV file
+    -> repeat (int): Number of timed runs of each method (default set to 3)
+
+    --------------------
+    Returns
+    --------------------
+    -> (tuple): List of (class name, method name, seconds, peak bytes) and dictionary with a fingerprint of the statistics computed by each class
+
+    """
+    timings = []
+    fingerprints = {}
+    key = hash_upload(file_path)
+
+    def add(cls, method, function):
+        seconds, peak = measure(function, repeat)
+        timings.append((cls.__name__, method, seconds, peak))
+
+    add(Dataset, "__init__", lambda: (dataset_store.clear(), Dataset(file_path)))
+    add(Dataset, "__init__ (chunked)", lambda: Dataset(file_path, chunked=True))
+    dataset = Dataset(file_path)
+    for method in public_methods(Dataset):
+        add(Dataset, method, getattr(dataset, method))
+    fingerprints[Dataset.__name__] = fingerprint(dataset.get_summary().astype(str).values.tolist())
+
+    profilers = [
+        (NumericColumn, lambda: NumericColumn(file_path=file_path), "find_num_cols", profile_numeric_column),
+        (TextColumn, lambda: TextColumn(file_path=file_path), "find_text_cols", profile_text_column),
+        (DateColumn, lambda: DateColumn(file_path), "find_date_cols", profile_date_column)
+    ]
+    for cls, build, find_method, profile_column in profilers:
+        def find():
+            # The parsed dataframe stays in memory, only the schema is inferred again
+            dataset_store.discard(key, "schema")
+            instance = build()
+            getattr(instance, find_method)()
+            return instance
+        add(cls, find_method, find)
+        instance = find()
+
+        # Full profile of every column, then each method again on the profiled columns
+        add(cls, "profile (all statistics)", lambda: [profile_column(instance.df[col]) for col in instance.cols_list])
+        # Columns keep their state in the store under the content hash of the file, as they do in the app
+        columns = {col: profile_column(instance.df[col], state_key=key) for col in instance.cols_list}
+        for column in columns.values():
+            # Profiled columns only hold their serie, streaming methods read the file again
+            column.file_path = file_path
+        fingerprints[cls.__name__] = fingerprint({col: summary_values(column) for col, column in columns.items() if column.cols_list is not None})
+        for method in public_methods(cls):
+            if method != find_method:
+                add(cls, method, call_on_columns(columns, method))
+    return timings, fingerprints
+
+
+def case_name(n_rows, n_cols, type_mix, cardinality):
+    return f"{n_rows}x{n_cols}-{type_mix}-{cardinality}"
+
+
+def run_grid(grid, data_dir, repeat=3):
+    results = {"environment": environment(), "timings": [], "fingerprints": {}}
+    cases = list(itertools.product(grid["rows"], grid["cols"], grid["type_mixes"], grid["cardinalities"]))
+    for n_case, (n_rows, n_cols, type_mix, cardinality) in enumerate(cases, start=1):
+        case = case_name(n_rows, n_cols, type_mix, cardinality)
+        print(f"[{n_case}/{len(cases)}] {case}", flush=True)
+        file_path = generate_csv(os.path.join(data_dir, f"{case}.csv"), n_rows, n_cols, type_mix, cardinality)
+        timings, fingerprints = benchmark_file(file_path, repeat)
+        results["timings"].extend({"case": case, "class": cls, "method": method, "seconds": seconds, "peak_bytes": peak}
+                                  for cls, method, seconds, peak in timings)
+        results["fingerprints"][case] = fingerprints
+        dataset_store.clear()
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "cpu_count": os.cpu_count()
+    }
+
+
+def compare(results, baseline, threshold=0.25, min_seconds=0.01, min_bytes=1024 ** 2):
+    """
+    --------------------
+    Description
+    --------------------
+    -> compare (function): Function that lists the regressions of a run against a baseline: methods slower (or needing more memory) than their baseline by more than the threshold, and cases whose statistics changed.
+    Differences smaller than min_seconds or min_bytes are ignored as noise.
+
+    --------------------
+    Parameters
+    --------------------
+    -> results (dict): Results of the run
+    -> baseline (dict): Results of the baseline run
+    -> threshold (float): Largest accepted relative increase, 0.25 accepts up to 25% more (default set to 0.25)
+    -> min_seconds (float): Smallest increase of duration reported (default set to 0.01)
+    -> min_bytes (int): Smallest increase of peak memory reported (default set to 1 MiB)
+
+    --------------------
+    Returns
+    --------------------
+    -> (list): Messages describing each regression, empty if there is none
+
+    """
+    regressions = []
+    baseline_timings = {(row["case"], row["class"], row["method"]): row for row in baseline["timings"]}
+    for row in results["timings"]:
+        reference = baseline_timings.get((row["case"], row["class"], row["method"]))
+        if reference is None:
+            continue
+        name = f'{row["case"]} {row["class"]}.{row["method"]}'
+        if row["seconds"] > reference["seconds"] * (1 + threshold) and row["seconds"] - reference["seconds"] > min_seconds:
+            regressions.append(f'{name}: {row["seconds"]:.4f}s instead of {reference["seconds"]:.4f}s')
+        if row["peak_bytes"] > reference["peak_bytes"] * (1 + threshold) and row["peak_bytes"] - reference["peak_bytes"] > min_bytes:
+            regressions.append(f'{name}: peak memory {row["peak_bytes"]:,} bytes instead of {reference["peak_bytes"]:,}')
+
+    for case, fingerprints in results["fingerprints"].items():
+        for cls, value in fingerprints.items():
+            reference = baseline["fingerprints"].get(case, {}).get(cls)
+            if reference is not None and reference != value:
+                regressions.append(f"{case} {cls}: statistics differ from the baseline")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the logic classes on synthetic CSV files and compare with a baseline.")
+    parser.add_argument("--grid", choices=list(GRIDS), default="quick", help="Preset grid of cases (default: quick)")
+    parser.add_argument("--rows", type=int, nargs="+", help="Row counts, overriding the grid")
+    parser.add_argument("--cols", type=int, nargs="+", help="Column counts, overriding the grid")
+    parser.add_argument("--type-mixes", nargs="+", choices=list(TYPE_MIXES), help="Type mixes, overriding the grid")
+    parser.add_argument("--cardinalities", nargs="+", choices=list(CARDINALITIES), help="Cardinalities, overriding the grid")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs of each method, the best one is kept (default: 3)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Largest accepted relative slowdown or memory increase (default: 0.25)")
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="Smallest slowdown reported, in seconds (default: 0.01)")
+    parser.add_argument("--output", help="File where the results of the run are saved as JSON")
+    parser.add_argument("--data-dir", help="Directory where the synthetic CSV files are kept (default: a temporary directory)")
+    parser.add_argument("--no-fail", action="store_true", help="Report regressions without failing the run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    grid = dict(GRIDS[args.grid])
+    for name in ["rows", "cols", "type_mixes", "cardinalities"]:
+        if getattr(args, name):
+            grid[name] = getattr(args, name)
+
+    # Every run parses the files, later sessions reading the disk cache would measure something else
+    disk_cache.enabled = False
+    warnings.simplefilter("ignore")
+
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+        results = run_grid(grid, args.data_dir, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as data_dir:
+            results = run_grid(grid, data_dir, args.repeat)
+
+    for row in results["timings"]:
+        print(f'{row["case"]:<32} {row["class"] + "." + row["method"]:<45} {row["seconds"]:>10.4f}s {row["peak_bytes"] / 1024 ** 2:>10.1f} MiB')
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(results, handle, indent=1)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as handle:
+            json.dump(results, handle, indent=1)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        # Without a baseline nothing is compared, a run passing silently would look like a run without regression
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return 1
+
+    with open(args.baseline) as handle:
+        regressions = compare(results, json.load(handle), args.threshold, args.min_seconds)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    print(f"{len(regressions)} regression(s) against {args.baseline} (threshold {args.threshold:.0%})")
+    return 1 if regressions and not args.no_fail else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Headless batch profiling of a directory of CSV files, without Streamlit.
+
+Usage (from the project directory):
+    python -m cli.batch_profile <input_dir> <output_dir> [--format json|parquet] [--workers N] [--memory-limit 2G]
+
+Every file is profiled by a worker process with the logic classes of the app (Dataset, NumericColumn, TextColumn and DateColumn)
+and one profile is written per file, named after it (e.g. sales.csv -> sales.profile.json); with --recursive the sub-directories
+of the input directory are mirrored in the output directory (e.g. 2024/sales.csv -> 2024/sales.profile.json), so files with the same name don't overwrite each other.
+"""
+import argparse
+import fnmatch
+import json
+import multiprocessing
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from tab_date.logics import DateColumn, profile_date_column
+from tab_df.logics import Dataset
+from tab_num.logics import NumericColumn, compute_histogram, profile_numeric_column
+from tab_text.logics import TextColumn, profile_text_column, stream_heavy_hitters, top_k_with_other
+from utils import config
+from utils.disk_cache import disk_cache
+from utils.schema import is_text_dtype
+from utils.sketches import sketch_csv
+from utils.store import dataset_store
+
+FORMATS = ["json", "parquet"]
+MEMORY_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_memory(value):
+    """
+    --------------------
+    Description
+    --------------------
+    -> parse_memory (function): Function that converts a memory size such as "512M" or "2G" (or a plain number of bytes) into a number of bytes
+
+    --------------------
+    Parameters
+    --------------------
+    -> value (str): Memory size
+
+    --------------------
+    Returns
+    --------------------
+    -> (int): Number of bytes
+
+    """
+    value = value.strip().upper().rstrip("B")
+    if value and value[-1] in MEMORY_UNITS:
+        return int(float(value[:-1]) * MEMORY_UNITS[value[-1]])
+    return int(value)
+
+
+def limit_memory(max_bytes):
+    # Worker initializer: cap the address space of the process, a file that needs more fails with MemoryError instead of exhausting the machine
+    if not max_bytes:
+        return
+    try:
+        import resource
+    except ImportError:
+        # The resource module only exists on Unix, the limit is not enforced elsewhere
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+
+
+def records(df):
+    if df is None:
+        return []
+    if hasattr(df, "data"):
+        # Styled dataframes (frequent values of a numeric column)
+        df = df.data
+    return df.to_dict(orient="records")
+
+
+def summary_dict(summary_df):
+    return dict(zip(summary_df["Description"], summary_df["Value"]))
+
+
+def profile_file(file_path, bins=None, bin_strategy="fixed", optimize=False, approximate=False):
+    """
+    --------------------
+    Description
+    --------------------
+    -> profile_file (function): Function that computes, for one CSV file, the statistics the app displays: the dataset summary and columns table, then the statistics, histogram and frequent values of every numeric, text and datetime column.
+    Files read chunk by chunk (larger than config.CHUNKED_THRESHOLD_BYTES) only get the dataset summary and columns table, the most frequent values of every text column found with bounded memory (see tab_text.logics.stream_heavy_hitters), plus in approximate mode the distinct count and median of every column from sketches merged over the chunks.
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str): Path to the CSV file
+    -> bins (int): Number of bins of the numeric histograms (default set to config.HISTOGRAM_BINS)
+    -> bin_strategy (str): Binning strategy of the numeric histograms (default set to "fixed")
+    -> optimize (bool): Flag stating if the file is loaded with smaller data types (default set to False)
+    -> approximate (bool): Flag stating if distinct counts and medians are estimated with sketches (default set to False)
+
+    --------------------
+    Returns
+    --------------------
+    -> (dict): Profile of the file
+
+    """
+    dataset = Dataset(file_path, optimize=optimize)
+    profile = {
+        "file": os.path.abspath(file_path),
+        "size_bytes": os.path.getsize(file_path),
+        "chunked": dataset.chunked,
+        "dataset": {"summary": summary_dict(dataset.get_summary()), "columns": records(dataset.table)},
+        "numeric": {},
+        "text": {},
+        "datetime": {},
+        "date_reports": []
+    }
+    if dataset.chunked and approximate:
+        profile["sketches"] = {
+            col: {"n_unique": sketch.n_unique, "median": sketch.median, "n_values": sketch.n_values, "n_missing": sketch.n_missing, **sketch.error_bounds()}
+            for col, sketch in sketch_csv(file_path).items()
+        }
+    if dataset.chunked and dataset.n_rows:
+        # Counts are at most error_bound below the true ones, whatever the number of distinct values
+        text_cols = [col for col, dtype in dataset.dtypes.items() if is_text_dtype(dtype)]
+        for col, summary in stream_heavy_hitters(file_path, text_cols).items():
+            profile["text"][col] = {
+                "summary": {"n_values": summary.n_values, "error_bound": summary.error_bound},
+                "top_values": records(top_k_with_other(summary.counters, config.BARCHART_TOP_K, summary.n_values))
+            }
+    if dataset.chunked or dataset.n_rows == 0:
+        return profile
+
+    num_col_instance = NumericColumn(file_path=file_path, bins=bins, bin_strategy=bin_strategy, optimize=optimize)
+    num_col_instance.find_num_cols()
+    for col in num_col_instance.cols_list:
+        column = profile_numeric_column(num_col_instance.df[col], num_col_instance.bins, bin_strategy, approximate)
+        profile["numeric"][col] = {
+            "summary": column.stats,
+            "histogram": records(compute_histogram(column.serie, column.bins, column.bin_strategy)),
+            "frequent": records(column.frequent)
+        }
+
+    text_column = TextColumn(file_path=file_path, optimize=optimize)
+    text_column.find_text_cols()
+    for col in text_column.cols_list:
+        column = profile_text_column(text_column.df[col], text_column.top_k, approximate)
+        profile["text"][col] = {"summary": summary_dict(column.get_summary()), "frequent": records(column.frequent)}
+
+    date_column = DateColumn(file_path, optimize=optimize)
+    profile["date_reports"] = records(date_column.date_reports)
+    for col in date_column.cols_list:
+        column = profile_date_column(date_column.df[col], approximate=approximate)
+        if column.cols_list is not None:
+            profile["datetime"][col] = {"summary": summary_dict(column.get_summary()), "frequent": records(column.frequent)}
+    return profile
+
+
+def to_builtin(value):
+    # JSON encoder fallback for NumPy scalars, timestamps and other values pandas returns
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def profile_to_frame(profile):
+    """
+    --------------------
+    Description
+    --------------------
+    -> profile_to_frame (function): Function that flattens a profile into a long table (one row per value) so that it can be saved as Parquet
+
+    --------------------
+    Parameters
+    --------------------
+    -> profile (dict): Profile returned by profile_file
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): Dataframe with the columns section, column, table, row, field and value (values are saved as text)
+
+    """
+    rows = []
+
+    def add_table(section, column, table, content):
+        if isinstance(content, dict):
+            content = [content]
+        for row, record in enumerate(content):
+            for field, value in record.items():
+                rows.append((section, column, table, row, str(field), json.dumps(value, default=to_builtin)))
+
+    add_table("file", None, "summary", {key: profile[key] for key in ["file", "size_bytes", "chunked"]})
+    add_table("dataset", None, "summary", profile["dataset"]["summary"])
+    add_table("dataset", None, "columns", profile["dataset"]["columns"])
+    for section in ["numeric", "text", "datetime"]:
+        for column, tables in profile[section].items():
+            for table, content in tables.items():
+                add_table(section, column, table, content)
+    add_table("datetime", None, "date_reports", profile["date_reports"])
+    return pd.DataFrame(rows, columns=["section", "column", "table", "row", "field", "value"])
+
+
+def output_path(file_path, input_dir, output_dir, output_format):
+    # The path of the file relative to the input directory is kept, so that files of different sub-directories get different profiles
+    name = os.path.splitext(os.path.relpath(file_path, input_dir))[0]
+    return os.path.join(output_dir, f"{name}.profile.{output_format}")
+
+
+def write_profile(profile, path, output_format):
+    if output_format == "parquet":
+        profile_to_frame(profile).to_parquet(path, index=False)
+    else:
+        with open(path, "w") as handle:
+            json.dump(profile, handle, indent=2, default=to_builtin)
+
+
+def run_job(job):
+    """
+    --------------------
+    Description
+    --------------------
+    -> run_job (function): Function run by a worker process: profiles one file, writes its profile and reports how it went, errors included, so that one bad file doesn't stop the batch
+
+    --------------------
+    Parameters
+    --------------------
+    -> job (tuple): Path to the CSV file, path to its profile, output format and keyword arguments of profile_file
+
+    --------------------
+    Returns
+    --------------------
+    -> (tuple): Path to the CSV file, path to the profile (None on error), error message (None on success) and duration in seconds
+
+    """
+    file_path, path, output_format, options = job
+    start = time.perf_counter()
+    try:
+        profile = profile_file(file_path, **options)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_profile(profile, path, output_format)
+        return file_path, path, None, time.perf_counter() - start
+    except MemoryError:
+        return file_path, None, "memory limit exceeded", time.perf_counter() - start
+    except Exception as error:
+        return file_path, None, f"{type(error).__name__}: {error}", time.perf_counter() - start
+    finally:
+        # Parsed files are not reused by the next job, they only take memory
+        dataset_store.clear()
+
+
+def find_files(input_dir, pattern="*.csv", recursive=False):
+    if not recursive:
+        names = sorted(os.listdir(input_dir))
+        return [os.path.join(input_dir, name) for name in names if fnmatch.fnmatch(name, pattern) and os.path.isfile(os.path.join(input_dir, name))]
+    file_paths = []
+    for root, _, names in os.walk(input_dir):
+        file_paths.extend(os.path.join(root, name) for name in sorted(names) if fnmatch.fnmatch(name, pattern))
+    return sorted(file_paths)
+
+
+def init_worker(max_bytes, use_disk_cache):
+    limit_memory(max_bytes)
+    # Parsing and deprecation warnings would be repeated for every file, errors are reported per file instead
+    warnings.simplefilter("ignore")
+    disk_cache.enabled = disk_cache.enabled and use_disk_cache
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Profile every CSV file of a directory in parallel, without Streamlit.")
+    parser.add_argument("input_dir", help="Directory holding the CSV files")
+    parser.add_argument("output_dir", help="Directory where one profile per file is written")
+    parser.add_argument("--format", choices=FORMATS, default="json", help="Format of the profiles (default: json, parquet needs pyarrow)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of files profiled at the same time (default: number of cores)")
+    parser.add_argument("--memory-limit", type=parse_memory, default=None, help="Maximum memory of each worker, e.g. 512M or 2G (Unix only, default: no limit)")
+    parser.add_argument("--pattern", default="*.csv", help="File name pattern of the files to profile (default: *.csv)")
+    parser.add_argument("--recursive", action="store_true", help="Also look for files in the sub-directories")
+    parser.add_argument("--bins", type=int, default=config.HISTOGRAM_BINS, help="Number of bins of the numeric histograms")
+    parser.add_argument("--bin-strategy", default="fixed", help="Binning strategy of the numeric histograms")
+    parser.add_argument("--optimize", action="store_true", help="Load the files with smaller data types")
+    parser.add_argument("--approximate", action="store_true", help="Estimate distinct counts and medians with mergeable sketches, also for files read chunk by chunk")
+    parser.add_argument("--disk-cache", action="store_true", help="Save the parsed files in the disk cache used by the app")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    file_paths = find_files(args.input_dir, args.pattern, args.recursive)
+    if not file_paths:
+        print(f"No file matching {args.pattern} in {args.input_dir}", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    options = {"bins": args.bins, "bin_strategy": args.bin_strategy, "optimize": args.optimize, "approximate": args.approximate}
+    jobs = [(file_path, output_path(file_path, args.input_dir, args.output_dir, args.format), args.format, options) for file_path in file_paths]
+    n_failed = 0
+    # Each worker is replaced after a few files so that memory fragmented by large files is given back
+    with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(args.memory_limit, args.disk_cache), maxtasksperchild=10) as pool:
+        for n_done, (file_path, path, error, seconds) in enumerate(pool.imap_unordered(run_job, jobs), start=1):
+            status = f"-> {path}" if error is None else f"FAILED ({error})"
+            print(f"[{n_done}/{len(jobs)}] {file_path} {status} in {seconds:.1f}s", flush=True)
+            n_failed += error is not None
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
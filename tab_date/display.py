@@ -1,5 +1,26 @@
 import streamlit as st
-from tab_date.logics import DateColumn
+from tab_date.logics import GRANULARITIES, DateColumn, profile_date_column
+from utils.background import background_profiler
+from utils.schema import exact_schema_ready
+from utils.store import hash_upload
+
+def submit_date_profiling(file_path):
+    # DateColumn already looks for the datetime columns when it is created, the bar granularity is the one chosen on the previous run
+    options = {"granularity": st.session_state.get("date_granularity", "auto"), "approximate": st.session_state.get("approximate_stats", False)}
+    optimize = st.session_state.get("optimize_memory", False)
+    # In sample-first mode the columns of the sample are used until the whole upload has been loaded in the background
+    sample_first = st.session_state.get("sample_first", False) and file_path is not None and not exact_schema_ready(file_path, optimize)
+    dataset2 = DateColumn(file_path, optimize=optimize, sample_first=sample_first, **options)
+
+    # Every datetime column is profiled in the background, tasks already submitted with the same settings are not run again
+    task_names = {}
+    # The column classes switch to the sample on their own when the whole upload would not fit in the memory budget
+    if file_path is not None and not dataset2.sample_first:
+        key = hash_upload(file_path)
+        for col in dataset2.cols_list:
+            task_names[col] = ("datetime", col, dataset2.optimize, *options.values())
+            background_profiler.submit(key, task_names[col], profile_date_column, dataset2.df[col], state_key=key, **options)
+    return dataset2, task_names
 
 def display_tab_date_content(file_path):
     """
@@ -8,11 +29,12 @@ def display_tab_date_content(file_path):
     --------------------
     -> display_tab_date_content (function): Function that will instantiate tab_date.logics.DateColumn class, save it into Streamlit session state and call its tab_date.logics.DateColumn.find_date_cols() method in order to find all datetime columns.
     Then it will display a Streamlit select box with the list of datetime columns found.
-    Once the user select a datetime column from the select box, it will call the tab_date.logics.DateColumn.set_data() method in order to compute all the information to be displayed.
+    Every datetime column is profiled in the background as soon as the file is uploaded (see submit_date_profiling); once the user select a datetime column from the select box, its profiled tab_date.logics.DateColumn is used, waiting for it with a progress bar if needed, or tab_date.logics.DateColumn.set_data() is called if it wasn't profiled in the background.
     Then it will display a Streamlit Expander container with the following contents:
     - the results of tab_date.logics.DateColumn.get_summary() as a Streamlit Table
-    - the graph from tab_date.logics.DateColumn.histogram using Streamlit.altair_chart()
+    - the graph from tab_date.logics.DateColumn.barchart using Streamlit.altair_chart(), with a select box to override the bucket granularity
     - the results of tab_date.logics.DateColumn.frequent using Streamlit.write
+    - the results of tab_date.logics.DateColumn.date_reports (detected format and parse success ratio of each text column) using Streamlit.dataframe
  
     --------------------
     Parameters
@@ -27,11 +49,25 @@ def display_tab_date_content(file_path):
 
     """
 
-    dataset2 = DateColumn(file_path)
-    dataset2.find_date_cols()
+    dataset2, task_names = submit_date_profiling(file_path)
     
     column_selected = st.selectbox('Which datetime column do you want to explore', dataset2.cols_list)
-    dataset2.set_data(column_selected)
+
+    # Use the column profiled in the background, waiting for it if needed, or profile it now if it wasn't submitted
+    # The detection reports cover the whole file, so they are kept from the DateColumn of the file
+    date_reports = dataset2.date_reports
+    profiled = None
+    if column_selected in task_names:
+        key = hash_upload(file_path)
+        n_done, n_total = background_profiler.progress(key, task_names.values())
+        if n_done < n_total:
+            st.progress(n_done / n_total, text=f"Profiling datetime columns in the background: {n_done} of {n_total} done")
+        with st.spinner(f"Profiling {column_selected}..."):
+            profiled = background_profiler.result(key, task_names[column_selected])
+    if profiled is not None:
+        dataset2 = profiled
+    else:
+        dataset2.set_data(column_selected)
 
     if dataset2.cols_list != None:
 
@@ -44,11 +80,17 @@ def display_tab_date_content(file_path):
 
         # Display bar chart
         with st.expander("Bar Chart", expanded=True):
+            st.selectbox("Bar granularity", ["auto"] + list(GRANULARITIES), key="date_granularity")
             st.altair_chart(dataset2.barchart, use_container_width=True)
 
         # Display top 20 dates
         with st.expander("Most Frequent Values", expanded=True):
             st.dataframe(dataset2.frequent)
+
+        # Display how each text column was checked for dates
+        if not date_reports.empty:
+            with st.expander("Datetime Detection", expanded=False):
+                st.dataframe(date_reports, hide_index=True)
     else:
         st.warning(f'ERROR: No valid datetime or object column found in dataset', icon="⚠️")
 
@@ -1,13 +1,110 @@
+import numpy as np
 import pandas as pd
 import altair as alt
 from datetime import datetime
 
+from utils import config
+from utils.budget import over_memory_budget
+from utils.estimate import sample_estimator
+from utils.incremental import load_column_state
+from utils.instrument import instrument_methods
+from utils.lazy import compute_stats, memoized_stat, reset_stats
+from utils.optimize import to_object
+from utils.schema import DATETIME, TEXT, get_schema
+from utils.sketches import HyperLogLog, distinct_error
+from utils.store import dataset_store, hash_upload
+
+NS_PER_MINUTE = 60 * 10 ** 9
+NS_PER_DAY = 24 * 60 * NS_PER_MINUTE
+
+# Bucket granularities of the bar chart, from the finest to the coarsest, with their (average) length in nanoseconds
+GRANULARITIES = {
+    "minute": NS_PER_MINUTE,
+    "hour": 60 * NS_PER_MINUTE,
+    "day": NS_PER_DAY,
+    "week": 7 * NS_PER_DAY,
+    "month": 30 * NS_PER_DAY,
+    "year": 365 * NS_PER_DAY
+}
+
+# 1970-01-01 was a Thursday, weeks are floored to the Monday before it
+WEEK_OFFSET = -3 * NS_PER_DAY
+
+
+def choose_granularity(span, target_bars=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> choose_granularity (function): Function that picks the finest bucket granularity giving at most target_bars bars over the span of a datetime serie
+
+    --------------------
+    Parameters
+    --------------------
+    -> span (int): Difference between the maximum and the minimum of the serie in nanoseconds
+    -> target_bars (int): Maximum number of bars wanted (default set to config.DATE_TARGET_BARS)
+
+    --------------------
+    Returns
+    --------------------
+    -> (str): One of the keys of GRANULARITIES
+
+    """
+    target_bars = config.DATE_TARGET_BARS if target_bars is None else target_bars
+    for granularity, length in GRANULARITIES.items():
+        if span / length <= target_bars:
+            return granularity
+    return "year"
+
+
+def floor_timestamps(values, granularity):
+    """
+    --------------------
+    Description
+    --------------------
+    -> floor_timestamps (function): Function that floors an int64 array of nanoseconds since the epoch to the start of its bucket with vectorized integer arithmetic
+
+    --------------------
+    Parameters
+    --------------------
+    -> values (np.ndarray): Array of int64 timestamps in nanoseconds, without NaT
+    -> granularity (str): One of the keys of GRANULARITIES
+
+    --------------------
+    Returns
+    --------------------
+    -> (np.ndarray): Array of int64 bucket starts in nanoseconds
+
+    """
+    if granularity in ("minute", "hour", "day"):
+        length = GRANULARITIES[granularity]
+        return values - values % length
+    if granularity == "week":
+        length = GRANULARITIES["week"]
+        return values - (values - WEEK_OFFSET) % length
+    # Months and years have no fixed length, NumPy floors them on its own calendar units
+    unit = "M" if granularity == "month" else "Y"
+    return values.view("datetime64[ns]").astype(f"datetime64[{unit}]").astype("datetime64[ns]").view("int64")
+
+
+def date_counts(piece):
+    # Counters of DateColumn that add up over the rows, missing values fall in none of them
+    day_of_week = piece.dt.dayofweek
+    return {
+        "n_weekend": int(day_of_week.isin([5, 6]).sum()),
+        "n_weekday": int(day_of_week.isin([0, 1, 2, 3, 4]).sum()),
+        "n_empty_1900": int((piece == pd.to_datetime('1900-01-01')).sum()),
+        "n_empty_1970": int((piece == pd.to_datetime('1970-01-01')).sum())
+    }
+
+@instrument_methods
 class DateColumn:
     """
     --------------------
     Description
     --------------------
     -> DateColumn (class): Class that manages a column from a dataframe of datetime data type
+    The statistics, the bar chart and the frequent values are computed on first access (see utils.lazy.memoized_stat) and forgotten when set_data loads another column.
 
     --------------------
     Attributes
@@ -27,24 +124,47 @@ class DateColumn:
     -> n_empty_1970 (int): Number of times a serie has dates equal to '1970-01-01' (optional)
     -> barchart (int): Altair barchart displaying the count for each value of a serie (optional)
     -> frequent (int): Dataframe containing the most frequest value of a serie (optional)
+    -> granularity (str): Bucket granularity of the barchart, "auto" or one of the keys of GRANULARITIES (default set to "auto")
+    -> target_bars (int): Number of bars aimed for when the granularity is picked automatically (default set to config.DATE_TARGET_BARS)
+    -> granularity_used (str): Bucket granularity actually used by the barchart (optional)
+    -> date_reports (pd.DataFrame): Dataframe explaining, for each text column tried as datetime, the detected format and the share of values parsed (optional)
+    -> optimize (bool): Flag stating if the columns come from the memory-optimized dataframe (default set to False)
+    -> approximate (bool): Flag stating if the number of unique values is estimated with a HyperLogLog sketch instead of a hash table of the values (default set to False)
+    -> sample_first (bool): Flag stating if the columns come from the sample of the sample-first mode (see utils.store.load_sample), the statistics are then extrapolated to the whole file (default set to False)
+    -> estimator (SampleEstimator): Estimator extrapolating the statistics of the sample, only set in sample-first mode (default set to None)
+    -> over_budget (bool): Flag stating if sample-first mode was switched on because loading the whole file would exceed config.MEMORY_BUDGET_BYTES (see utils.budget) (default set to False)
+    -> state_key (str): Content hash of the upload the columns come from, under which their ColumnState is kept in the store so that an upload with rows appended only adds the new rows to it (default set to None, which computes the state without keeping it)
+    -> state (ColumnState): Mergeable statistics of a serie of timezone-naive datetimes (see utils.incremental), None for other series (optional)
 
     """
-    def __init__(self, file_path=None, df=None):
+    state = memoized_stat("set_state")
+    n_unique = memoized_stat("set_unique")
+    n_missing = memoized_stat("set_missing")
+    col_min = memoized_stat("set_min")
+    col_max = memoized_stat("set_max")
+    n_weekend = memoized_stat("set_weekend")
+    n_weekday = memoized_stat("set_weekday")
+    n_future = memoized_stat("set_future")
+    n_empty_1900 = memoized_stat("set_empty_1900")
+    n_empty_1970 = memoized_stat("set_empty_1970")
+    barchart = memoized_stat("set_barchart", alt.Chart())
+    granularity_used = memoized_stat("set_barchart")
+    frequent = memoized_stat("set_frequent", pd.DataFrame(columns=['value', 'occurrence', 'percentage']))
+
+    def __init__(self, file_path=None, df=None, granularity="auto", target_bars=None, optimize=False, sample_first=False, approximate=False):
         self.file_path = file_path
         self.df = df
+        self.optimize = optimize
+        self.sample_first = sample_first
+        self.over_budget = False
+        self.estimator = None
+        self.approximate = approximate
+        self.granularity = granularity
+        self.target_bars = config.DATE_TARGET_BARS if target_bars is None else target_bars
+        self.state_key = None
         self.cols_list = []
         self.serie = None
-        self.n_unique = None
-        self.n_missing = None
-        self.col_min = None
-        self.col_max = None
-        self.n_weekend = None
-        self.n_weekday = None
-        self.n_future = None
-        self.n_empty_1900 = None
-        self.n_empty_1970 = None
-        self.barchart = alt.Chart()
-        self.frequent = pd.DataFrame(columns=['value', 'occurrence', 'percentage'])
+        self.date_reports = pd.DataFrame()
         self.find_date_cols()
 
 
@@ -53,7 +173,7 @@ class DateColumn:
         --------------------
         Description
         --------------------
-        -> find_date_cols (method): Class method that will load the uploaded CSV file as Pandas DataFrame and store it as attribute (self.df) if it hasn't been provided before.
+        -> find_date_cols (method): Class method that will get the schema inferred on the uploaded CSV file (or on the dataframe provided) and store its converted dataframe as attribute (self.df).
         Then it will find all columns of datetime data type. If it can't find any datetime then it will look for all columns of text time. Then it will store the results in the relevant attribute (self.cols_list).
 
         --------------------
@@ -67,27 +187,24 @@ class DateColumn:
         -> None
 
         """
-        if self.file_path is not None:
-            self.file_path.seek(0)
-            data_df = pd.read_csv(self.file_path, low_memory=False)
+        # A file whose parsed dataframe would not fit in the memory budget is profiled from its sample instead
+        if not self.sample_first and self.file_path is not None and over_memory_budget(self.file_path, self.optimize):
+            self.sample_first = self.over_budget = True
+        # Column types come from the schema inferred once per upload and shared with the other tabs
+        schema = get_schema(self.file_path, self.df, self.optimize, self.sample_first)
+        list_of_dt_txt_columns = schema.cols_of(DATETIME)
+        if self.sample_first and self.file_path is not None:
+            self.estimator = sample_estimator(self.file_path)
+        # States of a sample are not kept, they would be mistaken for the ones of the whole upload
+        elif self.file_path is not None:
+            self.state_key = hash_upload(self.file_path)
 
-        list_of_dt_txt_columns = []
-        for col in data_df.columns:
-            if data_df[col].dtype == 'object':
-                try:
-                    data_df[col] = pd.to_datetime(data_df[col], format='mixed')
-                    list_of_dt_txt_columns.append(col)
-                except ValueError as error:
-                    pass
-        
         if len(list_of_dt_txt_columns) == 0:
-            for col in data_df.columns:
-                if data_df[col].dtype == 'object':
-                    list_of_dt_txt_columns.append(col)
+            list_of_dt_txt_columns = schema.cols_of(TEXT)
 
-
-        self.df = data_df
+        self.df = schema.df
         self.cols_list = list_of_dt_txt_columns
+        self.date_reports = schema.date_reports_frame()
 
 
 
@@ -99,7 +216,7 @@ class DateColumn:
         --------------------
         Description
         --------------------
-        -> set_data (method): Class method that sets the self.serie attribute with the relevant column from the dataframe and then computes all requested information from self.serie to be displayed in the Date section of Streamlit app 
+        -> set_data (method): Class method that sets the self.serie attribute with the relevant column from the dataframe and forgets the information computed on the previous column; each piece of information to be displayed in the Date section of Streamlit app is computed from self.serie when it is first read
 
         --------------------
         Parameters
@@ -112,23 +229,15 @@ class DateColumn:
         -> None
         """
         try:
-            self.serie = self.df[col_name]
+            # Categorical and Arrow string columns of the optimized dataframe are read as the object columns they replace
+            self.serie = to_object(self.df[col_name])
             self.convert_serie_to_date()
 
             if self.is_serie_none():
-                self.serie = self.df[col_name]
-
-            self.set_unique()
-            self.set_missing()
-            self.set_min()
-            self.set_max()
-            self.set_weekend()
-            self.set_weekday()
-            self.set_future()
-            self.set_empty_1900()
-            self.set_empty_1970()
-            self.set_barchart()
-            self.set_frequent()
+                self.serie = to_object(self.df[col_name])
+
+            # Statistics are computed by their set_* method the first time they are read
+            reset_stats(self)
         except:
             self.cols_list = None
 
@@ -190,12 +299,55 @@ class DateColumn:
             return False
         
 
+    def state_name(self):
+        """
+        --------------------
+        Description
+        --------------------
+        -> state_name (method): Class method that gives the name under which the ColumnState of the serie is kept in the store, which changes with its data type and the approximate mode
+
+        --------------------
+        Parameters
+        --------------------
+        -> None
+
+        --------------------
+        Returns
+        --------------------
+        -> (tuple): Name of the state in the store
+
+        """
+        return ("column_state", "datetime", self.serie.name, str(self.serie.dtype), self.approximate)
+
+
+    def set_state(self):
+        """
+        --------------------
+        Description
+        --------------------
+        -> set_state (method): Class method that gets the ColumnState of a serie of timezone-naive datetimes (counts of values, missing values, weekend, weekday, 1900-01-01 and 1970-01-01 dates, minimum and maximum), only adding the new rows to the state of the earlier upload when rows were appended to it, and store it in the relevant attribute(self.state).
+
+        --------------------
+        Parameters
+        --------------------
+        -> None
+
+        --------------------
+        Returns
+        --------------------
+        -> None
+
+        """
+        if not self.is_serie_none() and pd.api.types.is_datetime64_dtype(self.serie):
+            self.state = load_column_state(self.state_key, self.state_name(), self.serie, dataset_store, date_counts, self.approximate)
+
+
     def set_unique(self):
         """
         --------------------
         Description
         --------------------
-        -> set_unique (method): Class method that computes the number of unique value of a serie and store the results in the relevant attribute(self.n_unique).
+        -> set_unique (method): Class method that computes the number of unique value of a serie (estimated with a HyperLogLog sketch in approximate mode) and store the results in the relevant attribute(self.n_unique).
 
         --------------------
         Parameters
@@ -208,7 +360,16 @@ class DateColumn:
         -> None
 
         """
-        self.n_unique = self.serie.nunique()
+        if self.approximate and self.state is not None:
+            self.n_unique = self.state.distinct.count()
+        elif self.approximate:
+            distinct = HyperLogLog(config.SKETCH_PRECISION)
+            distinct.update(self.serie.dropna())
+            self.n_unique = distinct.count()
+        elif self.state is not None:
+            self.n_unique = len(self.state.value_counts)
+        else:
+            self.n_unique = self.serie.nunique()
         
 
     def set_missing(self):
@@ -229,7 +390,10 @@ class DateColumn:
         -> None
 
         """
-        self.n_missing = self.serie.isnull().sum()
+        if self.state is not None:
+            self.n_missing = self.state.n_missing
+        else:
+            self.n_missing = self.serie.isnull().sum()
         
 
     def set_min(self):
@@ -253,6 +417,8 @@ class DateColumn:
         try:
             if self.is_serie_none():
                 self.col_min = 'N/A'
+            elif self.state is not None:
+                self.col_min = pd.NaT if self.state.col_min is None else self.state.col_min
             else:
                 self.col_min = self.serie.min()
         except:
@@ -279,6 +445,8 @@ class DateColumn:
         try:
             if self.is_serie_none():
                 self.col_max = 'N/A'
+            elif self.state is not None:
+                self.col_max = pd.NaT if self.state.col_max is None else self.state.col_max
             else:
                 self.col_max = self.serie.max()
         except:
@@ -305,6 +473,8 @@ class DateColumn:
         try:
             if self.is_serie_none():
                 self.n_weekend = 'N/A'
+            elif self.state is not None:
+                self.n_weekend = self.state.counts['n_weekend']
             else:
                 df = pd.DataFrame({'date_column': self.serie})
                 df['day_of_week'] = df['date_column'].dt.dayofweek
@@ -334,6 +504,8 @@ class DateColumn:
         try:
             if self.is_serie_none():
                 self.n_weekday = 'N/A'
+            elif self.state is not None:
+                self.n_weekday = self.state.counts['n_weekday']
             else:
                 df = pd.DataFrame({'date_column': self.serie})
                 df['day_of_week'] = df['date_column'].dt.dayofweek
@@ -390,6 +562,8 @@ class DateColumn:
         try:
             if self.is_serie_none():
                 self.n_empty_1900 = 'N/A'
+            elif self.state is not None:
+                self.n_empty_1900 = self.state.counts['n_empty_1900']
             else:
                 df = pd.DataFrame({'date_column': self.serie})
                 self.n_empty_1900 = len(df[df['date_column'] == pd.to_datetime('1900-01-01')])
@@ -420,6 +594,8 @@ class DateColumn:
         try:
             if self.is_serie_none():
                 self.n_empty_1970 = 'N/A'
+            elif self.state is not None:
+                self.n_empty_1970 = self.state.counts['n_empty_1970']
             else:
                 df = pd.DataFrame({'date_column': self.serie})
                 self.n_empty_1970 = len(df[df['date_column'] == pd.to_datetime('1970-01-01')])
@@ -435,6 +611,7 @@ class DateColumn:
         Description
         --------------------
         -> set_barchart (method): Class method that computes the Altair barchart displaying the count for each value of a serie and store the results in the relevant attribute(self.barchart).
+        Datetime values are grouped in buckets (minute, hour, day, week, month or year) picked from the span of the serie and self.target_bars unless self.granularity overrides it.
 
         --------------------
         Parameters
@@ -447,6 +624,10 @@ class DateColumn:
         -> None
 
         """
+        if pd.api.types.is_datetime64_any_dtype(self.serie) and self.serie.notna().any():
+            self.set_bucketed_barchart()
+            return
+
         axis = "date"
         if self.is_of_valid_datetime() == False:
             axis = "value"
@@ -455,6 +636,25 @@ class DateColumn:
         df2 = df.groupby(axis).size().reset_index(name='number_of_records')
         self.barchart = alt.Chart(df2).mark_bar().encode(x=axis, y="number_of_records")
 
+    def set_bucketed_barchart(self):
+        serie = self.serie.dropna()
+        if serie.dt.tz is not None:
+            # Buckets follow the local wall clock of the serie
+            serie = serie.dt.tz_localize(None)
+        values = serie.to_numpy(dtype="datetime64[ns]").view("int64")
+
+        self.granularity_used = self.granularity
+        if self.granularity_used not in GRANULARITIES:
+            self.granularity_used = choose_granularity(int(values.max() - values.min()), self.target_bars)
+
+        buckets, counts = np.unique(floor_timestamps(values, self.granularity_used), return_counts=True)
+        df = pd.DataFrame({"date": buckets.view("datetime64[ns]"), "number_of_records": counts})
+        self.barchart = alt.Chart(df).mark_bar().encode(
+            x=alt.X("date:T", title=f"date ({self.granularity_used})"),
+            y="number_of_records:Q",
+            tooltip=["date:T", "number_of_records:Q"]
+        )
+
         
       
     def set_frequent(self, end=20):
@@ -476,12 +676,20 @@ class DateColumn:
         -> None
 
         """
-        df = pd.DataFrame({'value': self.serie})
-        df2 = df.groupby('value').size().reset_index(name='occurrance')
-        total_count = df2['occurrance'].sum()
+        if self.state is not None:
+            # Only the most frequent values are counted in approximate mode
+            counts = self.state.heavy_hitters.counters if self.approximate else self.state.value_counts
+            df2 = pd.DataFrame({'value': counts.index, 'occurrance': counts.to_numpy()})
+            total_count = self.state.n_values
+        else:
+            df = pd.DataFrame({'value': self.serie})
+            df2 = df.groupby('value').size().reset_index(name='occurrance')
+            total_count = df2['occurrance'].sum()
         df2['percentage'] = df2['occurrance'] / total_count
         df2 = df2.sort_values(by='percentage', ascending=False)
         self.frequent = df2.head(end)
+        if self.estimator is not None:
+            self.frequent = self.estimator.estimate_frequent(self.frequent, 'occurrance')
         
 
     def get_summary(self):
@@ -514,7 +722,7 @@ class DateColumn:
                             "Maximum Value"
                             ],
 
-            "Value": [self.n_unique,
+            "Value": ["≈ {:,} (± {:.1%})".format(self.n_unique, distinct_error()) if self.approximate else self.n_unique,
                       self.n_missing,
                       self.n_weekend,
                       self.n_weekday,
@@ -525,4 +733,37 @@ class DateColumn:
                       self.col_max
                       ]
         }
+        if self.estimator is not None:
+            # Counts of rows are extrapolated to the whole file, the unique, minimum and maximum values are the ones of the sample
+            return self.estimator.estimate_summary(pd.DataFrame(summary_data), counts=summary_data["Description"][1:7])
         return pd.DataFrame(summary_data)
+
+
+
+def profile_date_column(serie, granularity="auto", target_bars=None, approximate=False, state_key=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> profile_date_column (function): Function that computes every statistic, the bar chart and the frequent values of a datetime (or text) column, to be run in the background (see utils.background)
+
+    --------------------
+    Parameters
+    --------------------
+    -> serie (pd.Series): Column, as converted by the schema
+    -> granularity (str): Bucket granularity of the barchart, "auto" or one of the keys of GRANULARITIES (default set to "auto")
+    -> target_bars (int): Number of bars aimed for when the granularity is picked automatically (default set to config.DATE_TARGET_BARS)
+    -> approximate (bool): Flag stating if the number of unique values is estimated with a sketch (default set to False)
+    -> state_key (str): Content hash of the upload the column comes from, to share its ColumnState through the store (default set to None)
+
+    --------------------
+    Returns
+    --------------------
+    -> (DateColumn): Column with everything already computed, its cols_list is None if the column couldn't be analysed
+
+    """
+    date_column = DateColumn(df=serie.to_frame(), granularity=granularity, target_bars=target_bars, approximate=approximate)
+    date_column.state_key = state_key
+    date_column.cols_list = [serie.name]
+    date_column.set_data(serie.name)
+    return compute_stats(date_column)
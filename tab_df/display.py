@@ -1,19 +1,66 @@
 import streamlit as st
 
-from tab_df.logics import Dataset
+from tab_df.logics import Dataset, profile_dataset
+from utils.background import background_profiler
+from utils.ingest import upload_columns
+from utils.schema import exact_schema_ready
+from utils.store import detach_upload, hash_upload
+
+def load_dataset(file_path):
+    # Create the Dataset object and set data, using the duplicate settings chosen on the previous run
+    # Columns picked for another upload are dropped, the file may not have them
+    columns = upload_columns(file_path)
+    duplicate_subset = [col for col in st.session_state.get("duplicate_subset") or [] if col in columns]
+    options = {
+        "duplicate_subset": duplicate_subset or None,
+        "approximate_duplicates": st.session_state.get("approximate_duplicates", False),
+        "optimize": st.session_state.get("optimize_memory", False)
+    }
+    if not st.session_state.get("sample_first", False):
+        return Dataset(file_path, **options)
+
+    # Sample-first mode: the exact Dataset is computed in the background, after the whole upload has been loaded for the other tabs
+    exact_schema_ready(file_path, options["optimize"])
+    key = hash_upload(file_path)
+    name = ("dataset", tuple(options["duplicate_subset"] or []), options["approximate_duplicates"], options["optimize"])
+    future = background_profiler.future(key, name)
+    if future is None:
+        future = background_profiler.submit_local(key, name, profile_dataset, detach_upload(file_path), **options)
+    if future is not None and future.done():
+        dataset = background_profiler.result(key, name)
+        if dataset is not None:
+            return dataset
+    return Dataset(file_path, sample_first=True, **options)
 
 def display_tab_df_content(file_path):
-    # Create the Dataset object and set data
-    dataset = Dataset(file_path)
+    dataset = load_dataset(file_path)
 
     # Check if the dataframe is empty and display a message if so
-    if dataset.df is None or dataset.df.empty:
+    if dataset.n_rows == 0:
         st.write("No columns to display. Please upload a dataset with data.")
         return  # Exit the function if the dataframe is empty
 
+    if dataset.over_budget:
+        st.info("This file would not fit in the memory budget once loaded, so it has been read chunk by chunk: head, tail and sample are limited to the rows kept while reading it.")
+    elif dataset.chunked:
+        st.info("This file is large, so it has been read chunk by chunk: head, tail and sample are limited to the rows kept while reading it.")
+
+    # Each file of a multi-file upload is summarized on its own, in parallel, and the summaries are merged
+    if dataset.partitions is not None:
+        st.info(f"{len(dataset.partitions)} files are explored as one dataset: head, tail and sample are limited to the rows kept while reading them.")
+        with st.expander("Partitions", expanded=False):
+            st.table(dataset.partitions)
+            if dataset.schema_differences.empty:
+                st.write("All files have the same columns and data types.")
+            else:
+                st.write("Columns that are missing from some files or whose data type differs between files:")
+                st.table(dataset.schema_differences)
+
     # If the dataframe is not empty, proceed to display the data
     with st.expander("Dataset Summary", expanded=True):
         st.table(dataset.get_summary())
+        st.multiselect("Columns used to find duplicated rows (all columns if empty)", dataset.cols_list, key="duplicate_subset")
+        st.checkbox("Estimate duplicated rows (faster on very large files, error bound shown)", key="approximate_duplicates")
 
     # Display the columns, data types, and memory usage
     with st.expander("Columns Information", expanded=True):
@@ -22,7 +69,7 @@ def display_tab_df_content(file_path):
     # Data exploration section
     with st.expander("Data Exploration", expanded=True):
         row_count = st.slider("Select number of rows to display", 5, 50, value=5)  # Added default value for slider
-        display_option = st.radio("Choose rows to display", ["head", "tail", "sample"])
+        display_option = st.radio("Choose rows to display", ["head", "tail", "sample", "rows"])
         
         # Display the dataframe based on the user selection
         if display_option == "head":
@@ -31,3 +78,11 @@ def display_tab_df_content(file_path):
             st.dataframe(dataset.get_tail(row_count))
         elif display_option == "sample":
             st.dataframe(dataset.get_sample(row_count))
+        elif display_option == "rows":
+            # Files that aren't loaded whole are read by seeking to the rows through their byte-offset index
+            start = st.number_input("First row", min_value=0, max_value=max(dataset.n_rows - 1, 0), value=0, step=row_count)
+            rows = dataset.get_rows(int(start), row_count)
+            if rows is None:
+                st.write("Rows can't be read directly from this file, only its head, tail and sample are available.")
+            else:
+                st.dataframe(rows)
@@ -1,5 +1,21 @@
+import functools
+
+import numpy as np
 import pandas as pd
 
+from utils import config
+from utils.budget import over_memory_budget
+from utils.duplicates import DuplicateCounter, count_duplicates
+from utils.estimate import SampleEstimator
+from utils.incremental import appended_read_options, dtype_kind, load_incremental, open_appended
+from utils.ingest import ReservoirSample, iter_csv_chunks, merge_dtypes, use_chunked_mode
+from utils.instrument import instrument_methods
+from utils.partitions import is_partitioned, map_partitions, schema_differences
+from utils.row_index import load_row_index
+from utils.schema import is_text_dtype, load_sample_schema, load_schema
+from utils.store import dataset_store, hash_upload, load_dataframe, load_memory_before, load_sample
+
+@instrument_methods
 class Dataset:
     """
     --------------------
@@ -20,10 +36,49 @@ class Dataset:
     -> n_num_cols (int): Number of columns that are numeric type (default set to 0)
     -> n_text_cols (int): Number of columns that are text type (default set to 0)
     -> table (pd.Series): Pandas DataFrame containing the list of columns, their data types and memory usage from dataframe (default set to None)
+    -> chunked (bool): Flag stating if the file is read chunk by chunk instead of being loaded whole (default set to None, which switches it on when the file is larger than config.CHUNKED_THRESHOLD_BYTES or when its parsed dataframe would exceed config.MEMORY_BUDGET_BYTES)
+    -> over_budget (bool): Flag stating if chunked mode was switched on because loading the whole file would exceed the memory budget (see utils.budget) (default set to False)
+    -> head_df (pd.DataFrame): First rows of the file, only kept in chunked and sample-first modes (default set to None)
+    -> tail_df (pd.DataFrame): Last rows of the file, only kept in chunked and sample-first modes (default set to None)
+    -> reservoir (ReservoirSample): Uniform sample of the rows of the file, only kept in chunked and sample-first modes (default set to None)
+    -> dtypes (dict): Data type of each column over the whole file, only kept in chunked, partitioned and sample-first modes to parse the rows read through the row index (default set to empty dict)
+    -> duplicate_subset (list): List of columns names used to find duplicated rows (default set to None, which uses all columns)
+    -> approximate_duplicates (bool): Flag stating if duplicated rows are estimated with a HyperLogLog sketch instead of counted exactly (default set to False)
+    -> duplicates (DuplicateCounter): Counter used to find the duplicated rows (default set to None)
+    -> column_totals (pd.DataFrame): Number of missing values and memory usage of each column of the loaded dataframe, see count_column_totals (default set to None)
+    -> optimize (bool): Flag stating if the dataframe is loaded with smaller data types (categories, downcast numbers, Arrow strings), ignored in chunked and sample-first modes (default set to False)
+    -> sample_first (bool): Flag stating if the summary and the columns table are estimated from a uniform sample of the rows kept while streaming the file, instead of being computed on the whole file (default set to False)
+    -> estimator (SampleEstimator): Estimator extrapolating the sample to the whole file, only set in sample-first mode (default set to None)
+    -> intervals (dict): Confidence interval of each estimated line of the summary, only filled in sample-first mode (default set to empty dict)
+    -> partitioned (bool): Flag stating if the upload is made of several files (see utils.partitions), summarized one by one in parallel and merged (default set by the type of file_path)
+    -> partitions (pd.DataFrame): Number of rows and columns of each file of a partitioned upload (default set to None)
+    -> schema_differences (pd.DataFrame): Columns whose presence or data type differs between the files of a partitioned upload (default set to None)
     """
-    def __init__(self, file_path):
+    def __init__(self, file_path, chunked=None, duplicate_subset=None, approximate_duplicates=False, optimize=False, sample_first=False):
         self.file_path = file_path
+        self.sample_first = sample_first
+        self.partitioned = is_partitioned(file_path) and not sample_first
+        self.over_budget = False
+        if chunked is None:
+            chunked = use_chunked_mode(file_path)
+            # A file whose parsed dataframe would not fit in the memory budget is read chunk by chunk as well
+            if not chunked and not sample_first and not self.partitioned:
+                self.over_budget = chunked = over_memory_budget(file_path, optimize)
+        self.chunked = chunked and not sample_first and not self.partitioned
+        self.partitions = None
+        self.schema_differences = None
+        self.optimize = optimize
+        self.estimator = None
+        self.intervals = {}
+        self.duplicate_subset = duplicate_subset
+        self.approximate_duplicates = approximate_duplicates
+        self.duplicates = None
+        self.column_totals = None
         self.df = None
+        self.head_df = None
+        self.tail_df = None
+        self.reservoir = None
+        self.dtypes = {}
         self.cols_list = []
         self.n_rows = 0
         self.n_cols = 0
@@ -36,10 +91,20 @@ class Dataset:
         self.set_data()
 
     def set_data(self):
+        if self.sample_first:
+            self.set_data_sampled()
+            return
+        if self.partitioned:
+            self.set_data_partitioned()
+            return
+        if self.chunked:
+            self.set_data_chunked()
+            return
         self.set_df()
         self.set_columns()
         self.set_dimensions()
         self.set_duplicates()
+        self.set_column_totals()
         self.set_missing()
         self.set_numeric()
         self.set_text()
@@ -50,27 +115,144 @@ class Dataset:
         if not self.df is None and not self.df.empty:
             return
 
-        # Try to read the uploaded file directly using pandas
-        try:
-            # Check if file_path is an UploadedFile object
-            if hasattr(self.file_path, "read"):
-                # Read the file from the buffer
-                self.df = pd.read_csv(self.file_path)
-            else:
-                # It's a file path; proceed with the usual method
-                self.df = pd.read_csv(self.file_path)
-        except pd.errors.EmptyDataError:
-            # If the CSV is empty, set the DataFrame to None or an empty DataFrame
-            self.df = pd.DataFrame()
-
-        # Update the rest of the data
-        self.set_columns()
-        self.set_dimensions()
-        self.set_duplicates()
-        self.set_missing()
-        self.set_numeric()
-        self.set_text()
-        self.set_table()
+        # Parse the upload once and share it with the other tabs through the dataset store
+        self.df = load_dataframe(self.file_path, optimize=self.optimize)
+
+    def set_data_chunked(self, chunk_rows=None, preview_rows=None):
+        """
+        --------------------
+        Description
+        --------------------
+        -> set_data_chunked (method): Class method that reads the file chunk by chunk and computes the summary and the columns table from running aggregates, so that only one chunk is held in memory at a time.
+        The aggregates are kept in the dataset store: when the file is an earlier upload with rows appended (see utils.incremental), only the new rows are read and added to the aggregates of the earlier upload.
+
+        --------------------
+        Parameters
+        --------------------
+        -> chunk_rows (int): Number of rows per chunk (default set to config.CHUNK_ROWS)
+        -> preview_rows (int): Number of rows kept for the head, the tail and the sample (default set to config.CHUNKED_PREVIEW_ROWS)
+
+        --------------------
+        Returns
+        --------------------
+        -> None
+
+        """
+        options = (chunk_rows, preview_rows, self.duplicate_subset, self.approximate_duplicates)
+
+        def extend(aggregate, appended):
+            new_rows = aggregate_csv(open_appended(self.file_path, appended), *options, **appended_read_options(aggregate.cols_list, aggregate.dtypes))
+            # Text in a column of numbers changes how its earlier values are parsed and hashed, the file is then read again whole
+            for col, dtype in new_rows.dtypes.items():
+                if dtype_kind(merge_dtypes(aggregate.dtypes[col], dtype)) != dtype_kind(aggregate.dtypes[col]):
+                    return None
+            return aggregate.merge(new_rows)
+
+        aggregate = load_incremental(
+            self.file_path, hash_upload(self.file_path), ("aggregate", chunk_rows, preview_rows, tuple(self.duplicate_subset or []), self.approximate_duplicates),
+            lambda: aggregate_csv(self.file_path, *options), extend, dataset_store, lambda aggregate: aggregate.n_bytes
+        )
+        self.set_aggregate(aggregate)
+
+    def set_data_partitioned(self, chunk_rows=None, preview_rows=None):
+        """
+        --------------------
+        Description
+        --------------------
+        -> set_data_partitioned (method): Class method that summarizes each file of a PartitionedUpload in parallel, chunk by chunk, and merges their running aggregates into the summary and the columns table of the whole dataset, without stacking the files.
+        The number of rows of each file and the columns whose presence or data type differs between files are kept as well.
+
+        --------------------
+        Parameters
+        --------------------
+        -> chunk_rows (int): Number of rows per chunk (default set to config.CHUNK_ROWS)
+        -> preview_rows (int): Number of rows kept for the head, the tail and the sample (default set to config.CHUNKED_PREVIEW_ROWS)
+
+        --------------------
+        Returns
+        --------------------
+        -> None
+
+        """
+        upload = self.file_path
+        # Every file gets the columns of all the files, so that missing ones are counted and hashed as pd.concat would fill them
+        aggregates = map_partitions(upload, aggregate_csv, chunk_rows, preview_rows, self.duplicate_subset, self.approximate_duplicates, columns=upload.columns)
+        self.partitions = pd.DataFrame({
+            "File": upload.names,
+            "Rows": [aggregate.n_rows for aggregate in aggregates],
+            "Columns": [len(columns) for columns in upload.part_columns]
+        })
+        self.schema_differences = schema_differences(upload.names, upload.part_columns, [aggregate.dtypes for aggregate in aggregates])
+        self.set_aggregate(functools.reduce(DatasetAggregate.merge, aggregates))
+
+    def set_aggregate(self, aggregate):
+        # Summary and columns table from the running aggregates of the whole file
+        self.head_df = aggregate.head_df
+        self.tail_df = aggregate.tail_df
+        self.reservoir = aggregate.reservoir
+        self.cols_list = aggregate.cols_list
+        self.n_rows = aggregate.n_rows
+        self.n_missing = aggregate.n_missing
+        self.duplicates = aggregate.duplicates
+        self.n_duplicates = self.duplicates.n_duplicates
+
+        self.n_cols = len(self.cols_list)
+        self.dtypes = dict(aggregate.dtypes)
+        dtypes = pd.Series(aggregate.dtypes, dtype="object")
+        self.n_num_cols = int(dtypes.isin([np.dtype("float64"), np.dtype("int64")]).sum())
+        self.n_text_cols = int((dtypes == np.dtype("object")).sum())
+        self.table = pd.DataFrame({
+            "Column Name": self.cols_list,
+            "Data Type": [str(dtypes[col]) for col in self.cols_list],
+            "Memory Usage (Bytes)": [aggregate.memory[col] for col in self.cols_list]
+        })
+
+    def set_data_sampled(self):
+        """
+        --------------------
+        Description
+        --------------------
+        -> set_data_sampled (method): Class method that streams the file once (see utils.store.load_sample), counts its rows and columns exactly and estimates the missing values and the memory usage from the sample, with confidence intervals.
+        Duplicated rows can't be estimated from a sample, they are left to the exact values computed in the background.
+
+        --------------------
+        Parameters
+        --------------------
+        -> None
+
+        --------------------
+        Returns
+        --------------------
+        -> None
+
+        """
+        scan = load_sample(self.file_path)
+        sample = scan.df
+        self.reservoir = scan.reservoir
+        self.head_df = scan.head_df
+        self.tail_df = scan.tail_df
+        self.cols_list = scan.cols_list
+        self.n_rows = scan.n_rows
+        self.n_cols = len(self.cols_list)
+        self.estimator = SampleEstimator(len(sample), self.n_rows)
+
+        self.intervals["Missing Values"] = self.estimator.count(int(sample.isnull().sum().sum()), units=self.n_cols)
+        self.n_missing = round(self.intervals["Missing Values"][0])
+        self.dtypes = dict(scan.dtypes)
+        dtypes = pd.Series(scan.dtypes, dtype="object")
+        self.n_num_cols = int(dtypes.isin([np.dtype("float64"), np.dtype("int64")]).sum())
+        self.n_text_cols = int((dtypes == np.dtype("object")).sum())
+
+        # Memory usage is scaled up from the sample, the inferred types are the ones the other tabs use on the sample
+        scale = self.n_rows / len(sample) if len(sample) else 0
+        schema = load_sample_schema(self.file_path)
+        self.table = pd.DataFrame({
+            "Column Name": self.cols_list,
+            "Data Type": [str(scan.dtypes[col]) for col in self.cols_list],
+            "Estimated Memory Usage (Bytes)": (sample.memory_usage(deep=True, index=False) * scale).round().astype("int64").values,
+            "Inferred Type": [schema.kinds[col] for col in self.cols_list],
+            "Confidence": [round(schema.confidence[col], 2) for col in self.cols_list]
+        })
 
     def is_df_none(self):
         return self.df is None or self.df.empty
@@ -85,33 +267,106 @@ class Dataset:
 
     def set_duplicates(self):
         if not self.is_df_none():
-            self.n_duplicates = self.df.duplicated().sum()
+            # Rows are compared through 64-bit hashes, chunk by chunk, instead of building df.duplicated() on the whole frame
+            # The hashes are kept in the dataset store, an upload made of an earlier one with rows appended only hashes its new rows
+            df = self.df[self.duplicate_subset] if self.duplicate_subset else self.df
+            # Values hash differently once their column changes data type (e.g. integers becoming floats), the data types are part of the name of the kept hashes
+            dtypes = tuple(str(dtype) for dtype in df.dtypes)
+            self.duplicates = load_incremental(
+                self.file_path, hash_upload(self.file_path), ("duplicates", tuple(df.columns), self.approximate_duplicates, dtypes),
+                lambda: count_duplicates(df, approximate=self.approximate_duplicates),
+                lambda counter, appended: count_duplicates(df, counter=counter), dataset_store, lambda counter: counter.n_bytes
+            )
+            self.n_duplicates = self.duplicates.n_duplicates
+
+    def set_column_totals(self):
+        if not self.is_df_none():
+            # Kept in the dataset store like the duplicated rows hashes, an upload with rows appended only counts its new rows
+            # Categories are stored once per column whatever its number of rows, the memory usage of an optimized dataframe doesn't add up over rows
+            dtypes = tuple(str(dtype) for dtype in self.df.dtypes)
+            _, self.column_totals = load_incremental(
+                self.file_path, hash_upload(self.file_path), ("column_totals", tuple(self.df.columns), dtypes),
+                lambda: count_column_totals(self.df),
+                lambda totals, appended: None if self.optimize else count_column_totals(self.df, totals), dataset_store
+            )
 
     def set_missing(self):
         if not self.is_df_none():
-            self.n_missing = self.df.isnull().sum().sum()
+            self.n_missing = self.column_totals["n_missing"].sum()
 
     def set_numeric(self):
         if not self.is_df_none():
-            self.n_num_cols = self.df.select_dtypes(include=['float64', 'int64']).shape[1]
+            # Downcast columns (int8, float32...) are counted as well as the int64 and float64 ones
+            self.n_num_cols = sum(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) for dtype in self.df.dtypes)
 
     def set_text(self):
         if not self.is_df_none():
-            self.n_text_cols = self.df.select_dtypes(include=['object']).shape[1]
+            self.n_text_cols = sum(is_text_dtype(dtype) for dtype in self.df.dtypes)
 
     def get_head(self, n=5):
+        if self.chunked or self.sample_first or self.partitioned:
+            return None if self.head_df is None else self.head_df.head(n)
         if not self.is_df_none():
             return self.df.head(n)
         return None
 
+    def get_rows(self, start=0, n=5):
+        # Rows start to start + n - 1 of the file, read through the row index when the file isn't loaded whole
+        if not self.is_df_none():
+            return self.df.iloc[start:start + n]
+        return self.read_rows(np.arange(start, min(start + n, self.n_rows)))
+
+    def get_row_index(self):
+        # Files that aren't loaded whole are indexed on first use, uploads made of several files and files with stray quotes can't be
+        if self.chunked or self.sample_first:
+            return load_row_index(self.file_path)
+        return None
+
+    def read_rows(self, rows):
+        """
+        --------------------
+        Description
+        --------------------
+        -> read_rows (method): Class method that reads the given rows of a file that isn't loaded whole, seeking to them through its byte-offset index (see utils.row_index) instead of parsing the file
+        Text columns are kept as text in the rows read, as they are in the whole file.
+
+        --------------------
+        Parameters
+        --------------------
+        -> rows (np.ndarray): Row numbers to read
+
+        --------------------
+        Returns
+        --------------------
+        -> (pd.DataFrame): Rows indexed by their row numbers, None if the file has no row index
+
+        """
+        row_index = self.get_row_index()
+        if row_index is None:
+            return None
+        options = appended_read_options(self.cols_list, self.dtypes)
+        return row_index.read_rows(self.file_path, rows, options["names"], options["dtype"])
+
     def get_tail(self, n=5):
+        if self.chunked or self.sample_first or self.partitioned:
+            rows = self.read_rows(np.arange(max(self.n_rows - n, 0), self.n_rows))
+            if rows is not None:
+                return rows
+            return None if self.tail_df is None else self.tail_df.tail(n)
         if not self.is_df_none():
             return self.df.tail(n)
         return None
 
     def get_sample(self, n=5):
+        row_index = self.get_row_index()
+        if row_index is not None:
+            return self.read_rows(row_index.sample_rows(n))
+        if self.reservoir is not None:
+            return self.reservoir.get_sample(n)
         if not self.is_df_none():
-            return self.df.sample(n)
+            # Only n positions are drawn, instead of shuffling the positions of every row as df.sample does
+            positions = np.random.default_rng().choice(len(self.df), size=min(n, len(self.df)), replace=False)
+            return self.df.iloc[np.sort(positions)]
         return None
 
     def set_table(self):
@@ -119,12 +374,143 @@ class Dataset:
             self.table = pd.DataFrame({
                 "Column Name": self.df.columns,
                 "Data Type": [str(dtype) for dtype in self.df.dtypes],
-                "Memory Usage (Bytes)": self.df.memory_usage(deep=True).values[1:]  # Excluding the memory usage of the index
+                "Memory Usage (Bytes)": self.column_totals["memory_usage"].values  # Excluding the memory usage of the index
             })
+            if self.optimize:
+                self.table.insert(2, "Memory Before Optimization (Bytes)", load_memory_before(self.file_path).reindex(self.df.columns).values)
+            # Add the type each tab will use for the column, as inferred once for the whole upload
+            schema = load_schema(self.file_path, optimize=self.optimize)
+            self.table["Inferred Type"] = [schema.kinds[col] for col in self.df.columns]
+            self.table["Confidence"] = [round(schema.confidence[col], 2) for col in self.df.columns]
+
+    def format_duplicates(self):
+        if self.sample_first:
+            return "Computed in the background"
+        if self.duplicates is None:
+            return self.n_duplicates
+        return self.duplicates.format_duplicates()
 
     def get_summary(self):
         summary_data = {
             "Description": ["Number of Rows", "Number of Columns", "Duplicated Rows", "Missing Values", "Numeric Columns", "Text Columns"],
-            "Value": [self.n_rows, self.n_cols, self.n_duplicates, self.n_missing, self.n_num_cols, self.n_text_cols]
+            "Value": [self.n_rows, self.n_cols, self.format_duplicates(), self.n_missing, self.n_num_cols, self.n_text_cols]
         }
-        return pd.DataFrame(summary_data)
\ No newline at end of file
+        if self.estimator is not None:
+            # Rows and columns are counted while streaming the file, only the missing values are estimated
+            labels = {description: "exact" for description in summary_data["Description"]}
+            labels["Duplicated Rows"] = "-"
+            return self.estimator.estimate_summary(pd.DataFrame(summary_data), intervals=self.intervals, decimals=0, labels=labels)
+        return pd.DataFrame(summary_data)
+
+
+class DatasetAggregate:
+    """
+    --------------------
+    Description
+    --------------------
+    -> DatasetAggregate (class): Class that keeps the running aggregates behind the summary and the columns table of a file read chunk by chunk.
+    Two aggregates can be merged, so that the files of a partitioned upload are summarized separately and combined without stacking their rows.
+
+    --------------------
+    Attributes
+    --------------------
+    -> preview_rows (int): Number of rows kept for the head, the tail and the sample
+    -> duplicate_subset (list): List of columns names used to find duplicated rows (default set to None, which uses all columns)
+    -> head_df (pd.DataFrame): First rows (default set to None)
+    -> tail_df (pd.DataFrame): Last rows (default set to None)
+    -> reservoir (ReservoirSample): Uniform sample of the rows
+    -> cols_list (list): List of columns names (default set to empty list)
+    -> n_rows (int): Number of rows (default set to 0)
+    -> n_missing (int): Number of missing values (default set to 0)
+    -> dtypes (dict): Data type of each column, as pd.read_csv would infer it on all the rows (default set to empty dict)
+    -> memory (dict): Memory usage in bytes of each column (default set to empty dict)
+    -> duplicates (DuplicateCounter): Counter of the duplicated rows, integers hashed as floats so that chunks inferred as int or float agree
+
+    """
+    @property
+    def n_bytes(self):
+        # Memory kept by the aggregates, to bound the dataset store
+        previews = [df for df in [self.head_df, self.tail_df, self.reservoir.df] if df is not None]
+        return self.duplicates.n_bytes + sum(int(df.memory_usage(deep=True).sum()) for df in previews)
+
+    def __init__(self, preview_rows=None, duplicate_subset=None, approximate_duplicates=False):
+        self.preview_rows = config.CHUNKED_PREVIEW_ROWS if preview_rows is None else preview_rows
+        self.duplicate_subset = duplicate_subset
+        self.head_df = None
+        self.tail_df = None
+        self.reservoir = ReservoirSample(self.preview_rows)
+        self.cols_list = []
+        self.n_rows = 0
+        self.n_missing = 0
+        self.dtypes = {}
+        self.memory = {}
+        self.duplicates = DuplicateCounter(approximate=approximate_duplicates, numeric_as_float=True)
+
+    def update(self, chunk):
+        if self.head_df is None:
+            self.head_df = chunk.head(self.preview_rows)
+            self.cols_list = chunk.columns.tolist()
+        self.tail_df = pd.concat([self.tail_df, chunk.tail(self.preview_rows)]).tail(self.preview_rows)
+        self.reservoir.update(chunk)
+
+        self.n_rows += len(chunk)
+        self.n_missing += int(chunk.isnull().sum().sum())
+        for col, usage in chunk.memory_usage(deep=True, index=False).items():
+            self.memory[col] = self.memory.get(col, 0) + int(usage)
+            self.dtypes[col] = merge_dtypes(self.dtypes.get(col), chunk[col].dtype)
+
+        self.duplicates.update(chunk[self.duplicate_subset] if self.duplicate_subset else chunk)
+
+    def merge(self, other):
+        # Rows of other come after the ones of this aggregate, their row numbers are shifted accordingly
+        if other.head_df is not None:
+            shift = lambda df: df.set_axis(df.index + self.n_rows)
+            self.head_df = shift(other.head_df) if self.head_df is None else pd.concat([self.head_df, shift(other.head_df)]).head(self.preview_rows)
+            self.tail_df = pd.concat([self.tail_df, shift(other.tail_df)]).tail(self.preview_rows)
+            self.cols_list = list(dict.fromkeys(self.cols_list + other.cols_list))
+        self.reservoir.merge(other.reservoir)
+        self.n_rows += other.n_rows
+        self.n_missing += other.n_missing
+        for col, usage in other.memory.items():
+            self.memory[col] = self.memory.get(col, 0) + usage
+            self.dtypes[col] = merge_dtypes(self.dtypes.get(col), other.dtypes[col])
+        self.duplicates.merge(other.duplicates)
+        return self
+
+
+def aggregate_csv(file_path, chunk_rows=None, preview_rows=None, duplicate_subset=None, approximate_duplicates=False, columns=None, **kwargs):
+    # Running aggregates of a whole file, read chunk by chunk (with the given columns, missing ones filled with NaN, when it is one file of a partitioned upload)
+    aggregate = DatasetAggregate(preview_rows, duplicate_subset, approximate_duplicates)
+    for chunk in iter_csv_chunks(file_path, chunk_rows, **kwargs):
+        aggregate.update(chunk if columns is None or chunk.columns.tolist() == columns else chunk.reindex(columns=columns))
+    return aggregate
+
+
+def count_column_totals(df, totals=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> count_column_totals (function): Function that counts the missing values and the memory usage of each column of a dataframe, both add up over rows so that the totals of an earlier upload only need the rows appended after it
+
+    --------------------
+    Parameters
+    --------------------
+    -> df (pd.DataFrame): Dataframe to count
+    -> totals (tuple): Totals of the first rows of df, as returned by this function, only the rows after them are counted (default set to None, which counts every row)
+
+    --------------------
+    Returns
+    --------------------
+    -> (tuple): Number of rows counted and dataframe with the columns n_missing and memory_usage, indexed by column name
+
+    """
+    n_rows, counted = (0, None) if totals is None else totals
+    new_rows = df.iloc[n_rows:]
+    new_totals = pd.DataFrame({"n_missing": new_rows.isna().sum(), "memory_usage": new_rows.memory_usage(deep=True, index=False)})
+    return len(df), new_totals if counted is None else counted + new_totals
+
+
+def profile_dataset(file_path, duplicate_subset=None, approximate_duplicates=False, optimize=False):
+    # Exact summary and columns table of an upload, to be run in the background while the sample-first estimates are shown (see utils.background)
+    return Dataset(file_path, duplicate_subset=duplicate_subset, approximate_duplicates=approximate_duplicates, optimize=optimize)
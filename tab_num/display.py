@@ -1,10 +1,36 @@
 import streamlit as st
-from tab_num.logics import NumericColumn
+from tab_num.logics import BIN_STRATEGIES, NumericColumn, profile_numeric_column
+from utils import config
+from utils.background import background_profiler
+from utils.schema import exact_schema_ready
+from utils.store import hash_upload
 
-def display_tab_num_content(file_path=None, df=None):
-    num_col_instance = NumericColumn(file_path=file_path, df=df)
+def submit_num_profiling(file_path=None, df=None):
+    # The histogram settings chosen on the previous run are used to bin the columns
+    options = {
+        "bins": st.session_state.get("histogram_bins", config.HISTOGRAM_BINS),
+        "bin_strategy": st.session_state.get("histogram_strategy", "fixed"),
+        "approximate": st.session_state.get("approximate_stats", False)
+    }
+    optimize = st.session_state.get("optimize_memory", False)
+    # In sample-first mode the columns of the sample are used until the whole upload has been loaded in the background
+    sample_first = st.session_state.get("sample_first", False) and file_path is not None and not exact_schema_ready(file_path, optimize)
+    num_col_instance = NumericColumn(file_path=file_path, df=df, optimize=optimize, sample_first=sample_first, **options)
     num_col_instance.find_num_cols()
-    
+
+    # Every numeric column is profiled in the background, tasks already submitted with the same settings are not run again
+    task_names = {}
+    # The column classes switch to the sample on their own when the whole upload would not fit in the memory budget
+    if file_path is not None and not num_col_instance.sample_first:
+        key = hash_upload(file_path)
+        for col in num_col_instance.cols_list:
+            task_names[col] = ("numeric", col, num_col_instance.optimize, *options.values())
+            background_profiler.submit(key, task_names[col], profile_numeric_column, num_col_instance.df[col], state_key=key, **options)
+    return num_col_instance, task_names
+
+def display_tab_num_content(file_path=None, df=None):
+    num_col_instance, task_names = submit_num_profiling(file_path, df)
+
     if not num_col_instance.cols_list:
         st.write("No numeric columns found.")
         return
@@ -12,7 +38,19 @@ def display_tab_num_content(file_path=None, df=None):
     selected_num_col = st.selectbox("Select Numeric Column", num_col_instance.cols_list)
     
     if selected_num_col:
-        num_col_instance.set_data(selected_num_col)
+        # Use the column profiled in the background, waiting for it if needed, or profile it now if it wasn't submitted
+        profiled = None
+        if selected_num_col in task_names:
+            key = hash_upload(file_path)
+            n_done, n_total = background_profiler.progress(key, task_names.values())
+            if n_done < n_total:
+                st.progress(n_done / n_total, text=f"Profiling numeric columns in the background: {n_done} of {n_total} done")
+            with st.spinner(f"Profiling {selected_num_col}..."):
+                profiled = background_profiler.result(key, task_names[selected_num_col])
+        if profiled is not None:
+            num_col_instance = profiled
+        else:
+            num_col_instance.set_data(selected_num_col)
         with st.expander("Numeric Column", expanded=True):
             summary_df = num_col_instance.get_summary()
             if not summary_df.empty:
@@ -20,6 +58,9 @@ def display_tab_num_content(file_path=None, df=None):
             else:
                 st.write("No data to display in the summary table.")
         with st.expander("Histogram", expanded=True):
+            bins_col, strategy_col = st.columns(2)
+            bins_col.number_input("Number of bins", min_value=1, max_value=config.HISTOGRAM_MAX_BINS, value=config.HISTOGRAM_BINS, key="histogram_bins")
+            strategy_col.selectbox("Binning strategy", BIN_STRATEGIES, key="histogram_strategy")
             if num_col_instance.histogram:
                 st.altair_chart(num_col_instance.histogram)
             else:
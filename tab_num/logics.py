@@ -1,13 +1,222 @@
+import numpy as np
 import pandas as pd
 import altair as alt
 
+from utils import config
+from utils.budget import over_memory_budget
+from utils.estimate import sample_estimator
+from utils.incremental import ColumnState, load_column_state
+from utils.instrument import instrument_methods
+from utils.lazy import compute_stats, memoized_stat, reset_stats
+from utils.schema import NUMERIC, get_schema
+from utils.sketches import HyperLogLog, KLLSketch, distinct_error, rank_error
+from utils.store import dataset_store, hash_upload
 
+# "fixed" and "quantile" use the requested number of bins, the other strategies are NumPy's bin width estimators
+BIN_STRATEGIES = ["fixed", "quantile", "auto", "fd", "sturges", "sqrt"]
+
+
+def numeric_counts(piece):
+    # Counters of NumericColumn that add up over the rows, missing values are neither zero nor negative
+    return {"n_zeros": int((piece == 0).sum()), "n_negatives": int((piece < 0).sum())}
+
+
+def compute_numeric_stats(serie, approximate=False, state=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> compute_numeric_stats (function): Function that computes all the scalar statistics of a numeric serie.
+    Without a state, one fused NumPy kernel computes them with as few passes as possible over the array (see fused_numeric_stats).
+    With the ColumnState carried on from an earlier upload the serie extends (see utils.incremental), counts, mean, standard deviation and extremes are read from it, and only the exact median and distinct count go over the values again, sorting them once as the kernel does.
+    The results match the ones of the pandas methods (nunique, isnull, mean, std, min, max, median), except in approximate mode where the distinct count comes from a HyperLogLog sketch and the median from a KLL sketch (see utils.sketches).
+
+    --------------------
+    Parameters
+    --------------------
+    -> serie (pd.Series): Numeric serie
+    -> approximate (bool): Flag stating if the distinct count and the median are estimated with sketches (default set to False)
+    -> state (ColumnState): State of the serie carried on from an earlier upload (default set to None, which runs the fused kernel on the serie)
+
+    --------------------
+    Returns
+    --------------------
+    -> (dict): Dictionary with n_unique, n_missing, n_zeros, n_negatives, col_mean, col_std, col_min, col_max and col_median
+
+    """
+    if state is None:
+        return fused_numeric_stats(serie, approximate)
+    n_valid = state.n_values
+    if n_valid == 0:
+        return {"n_unique": 0, "n_missing": state.n_missing, "n_zeros": 0, "n_negatives": 0, "col_mean": np.nan,
+                "col_std": np.nan, "col_min": np.nan, "col_max": np.nan, "col_median": np.nan}
+
+    if approximate:
+        n_unique, col_median = state.distinct.count(), state.quantiles.quantile(0.5)
+    else:
+        values = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = values[~np.isnan(values)]
+        n_unique, col_median = exact_unique_median(valid, np.empty_like(valid))
+
+    return {
+        "n_unique": n_unique,
+        "n_missing": state.n_missing,
+        "n_zeros": state.counts["n_zeros"],
+        "n_negatives": state.counts["n_negatives"],
+        "col_mean": state.col_sum / n_valid,
+        "col_std": state.std,
+        "col_min": state.col_min,
+        "col_max": state.col_max,
+        "col_median": col_median
+    }
+
+
+def fused_numeric_stats(serie, approximate=False):
+    # Single pass kernel over the NumPy array: missing values are dropped once, one scratch buffer is reused for the standard deviation, then sorted in place once for both the median and the distinct count
+    values = serie.to_numpy()
+    if values.dtype.kind not in "iuf":
+        values = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    if values.dtype.kind == "f":
+        missing = np.isnan(values)
+        n_missing = int(np.count_nonzero(missing))
+        valid = values[~missing] if n_missing else values
+    else:
+        # Integer columns can't hold NaN, so there is nothing to drop
+        n_missing = 0
+        valid = values
+
+    n_valid = len(valid)
+    if n_valid == 0:
+        return {"n_unique": 0, "n_missing": n_missing, "n_zeros": 0, "n_negatives": 0, "col_mean": np.nan,
+                "col_std": np.nan, "col_min": np.nan, "col_max": np.nan, "col_median": np.nan}
+
+    col_mean = valid.sum(dtype=np.float64) / n_valid
+
+    # Same formula as pandas: sum of squared deviations from the mean divided by n - 1
+    scratch = np.subtract(valid, col_mean, dtype=np.float64)
+    np.square(scratch, out=scratch)
+    col_std = np.sqrt(scratch.sum() / (n_valid - 1)) if n_valid > 1 else np.nan
+
+    if approximate:
+        distinct = HyperLogLog(config.SKETCH_PRECISION)
+        distinct.update(pd.Series(valid))
+        quantiles = KLLSketch(config.SKETCH_K)
+        quantiles.update(valid)
+        n_unique, col_median = distinct.count(), quantiles.quantile(0.5)
+    else:
+        n_unique, col_median = exact_unique_median(valid, scratch)
+
+    return {
+        "n_unique": n_unique,
+        "n_missing": n_missing,
+        "n_zeros": int(np.count_nonzero(valid == 0)),
+        "n_negatives": int(np.count_nonzero(valid < 0)),
+        "col_mean": col_mean,
+        "col_std": col_std,
+        "col_min": valid.min(),
+        "col_max": valid.max(),
+        "col_median": col_median
+    }
+
+
+def numeric_state(serie, stats):
+    # ColumnState of a serie rebuilt from the statistics of the fused kernel without going over the values again, so that an upload extending this one only adds its new rows to it
+    state = ColumnState(count_values=False)
+    n_valid = len(serie) - stats["n_missing"]
+    state.n_rows, state.n_missing = len(serie), stats["n_missing"]
+    state.counts = {"n_zeros": stats["n_zeros"], "n_negatives": stats["n_negatives"]}
+    if n_valid:
+        state.col_sum = stats["col_mean"] * n_valid
+        state.m2 = stats["col_std"] ** 2 * (n_valid - 1) if n_valid > 1 else 0.0
+        state.col_min, state.col_max = stats["col_min"], stats["col_max"]
+    return state
+
+
+def exact_unique_median(valid, scratch):
+    # The scratch buffer is reused to sort a copy of the values once: the median is read in the middle of it and distinct values are counted on it, which is several times faster than hashing float64 values
+    n_valid = len(valid)
+    np.copyto(scratch, valid, casting="unsafe")
+    scratch.sort()
+    middle = n_valid // 2
+    col_median = scratch[middle] if n_valid % 2 else (scratch[middle - 1] + scratch[middle]) / 2
+    n_unique = int(np.count_nonzero(scratch[1:] != scratch[:-1])) + 1
+    return n_unique, col_median
+
+
+def estimated_bins(values, strategy):
+    # Number of equal width bins NumPy's estimators choose: the range divided by the bin width of the strategy, rounded up
+    n_values = len(values)
+    value_range = values.max() - values.min()
+    widths = {
+        "sqrt": lambda: value_range / np.sqrt(n_values),
+        "sturges": lambda: value_range / (np.log2(n_values) + 1),
+        "fd": lambda: 2 * np.subtract(*np.percentile(values, [75, 25])) * n_values ** (-1 / 3),
+    }
+    if strategy == "auto":
+        fd_width, sturges_width = widths["fd"](), widths["sturges"]()
+        width = min(fd_width, sturges_width) if fd_width else sturges_width
+    else:
+        width = widths[strategy]()
+    if not width or not np.isfinite(value_range / width):
+        return 1
+    return max(int(np.ceil(value_range / width)), 1)
+
+
+def compute_histogram(serie, bins=None, strategy="fixed"):
+    """
+    --------------------
+    Description
+    --------------------
+    -> compute_histogram (function): Function that bins a numeric serie with NumPy, so that only the bin edges and counts need to be sent to the chart whatever the length of the serie
+
+    --------------------
+    Parameters
+    --------------------
+    -> serie (pd.Series): Numeric serie
+    -> bins (int): Number of bins for the "fixed" (equal width) and "quantile" (equal frequency) strategies (default set to config.HISTOGRAM_BINS)
+    -> strategy (str): One of BIN_STRATEGIES, the automatic ones are capped at config.HISTOGRAM_MAX_BINS bins (default set to "fixed")
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): Dataframe with one row per bin and the columns bin_start, bin_end and count
+
+    """
+    bins = config.HISTOGRAM_BINS if bins is None else bins
+    values = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return pd.DataFrame(columns=["bin_start", "bin_end", "count"])
+
+    if strategy == "fixed":
+        edges = np.histogram_bin_edges(values, bins=bins)
+    elif strategy == "quantile":
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+        if len(edges) < 2:
+            edges = np.histogram_bin_edges(values, bins=1)
+    else:
+        # The number of bins is capped before any edge is built, outliers would otherwise make the estimators ask for billions of bins
+        edges = np.histogram_bin_edges(values, bins=min(estimated_bins(values, strategy), config.HISTOGRAM_MAX_BINS))
+
+    counts, edges = np.histogram(values, bins=edges)
+    return pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": counts})
+
+
+def style_frequent(value_counts):
+    return value_counts.style.format({
+        'value': '{:,.0f}',
+        'percentage': '{:,.2f}%'
+    })
+
+
+@instrument_methods
 class NumericColumn:
     """
     --------------------
     Description
     --------------------
     -> NumericColumn (class): Class that manages a column of numeric data type
+    The statistics, the histogram and the frequent values are computed on first access (see utils.lazy.memoized_stat) and forgotten when set_data loads another column.
 
     --------------------
     Attributes
@@ -25,61 +234,70 @@ class NumericColumn:
     -> col_median (int): Median value of a serie (default set to None)
     -> n_zeros (int): Number of times a serie has values equal to 0 (default set to None)
     -> n_negatives (int): Number of times a serie has negative values (default set to None)
+    -> state_key (str): Content hash of the upload the columns come from, under which their ColumnState is kept in the store so that an upload with rows appended only adds the new rows to it (default set to None, which computes the state without keeping it)
+    -> state (ColumnState): Mergeable statistics of a serie (see utils.incremental), in exact mode only when carried on from the earlier upload the serie extends, the fused kernel computing the statistics otherwise (default set to None)
+    -> stats (dict): All the scalar statistics of a serie, computed together by compute_numeric_stats (default set to None)
+    -> bins (int): Number of bins of the histogram (default set to config.HISTOGRAM_BINS)
+    -> bin_strategy (str): Binning strategy of the histogram, one of BIN_STRATEGIES (default set to "fixed")
+    -> optimize (bool): Flag stating if the columns come from the memory-optimized dataframe, where numbers may be stored on fewer bits (default set to False)
+    -> approximate (bool): Flag stating if the number of unique values and the median are estimated with mergeable sketches instead of sorting the column (default set to False)
+    -> sample_first (bool): Flag stating if the columns come from the sample of the sample-first mode (see utils.store.load_sample), the statistics are then extrapolated to the whole file (default set to False)
+    -> estimator (SampleEstimator): Estimator extrapolating the statistics of the sample, only set in sample-first mode (default set to None)
+    -> over_budget (bool): Flag stating if sample-first mode was switched on because loading the whole file would exceed config.MEMORY_BUDGET_BYTES (see utils.budget) (default set to False)
     -> histogram (alt.Chart): Altair histogram displaying the count for each bin value of a serie (default set to empty)
     -> frequent (pd.DataFrame): Datframe containing the most frequest value of a serie (default set to empty)
+    -> frequent_empty (bool): Flag stating if there is no frequent value to display (default set to True)
 
     """
-    def __init__(self, file_path=None, df=None):
+    state = memoized_stat("set_state")
+    stats = memoized_stat("set_stats")
+    n_unique = memoized_stat("set_unique")
+    n_missing = memoized_stat("set_missing")
+    n_zeros = memoized_stat("set_zeros")
+    n_negatives = memoized_stat("set_negatives")
+    col_mean = memoized_stat("set_mean")
+    col_std = memoized_stat("set_std")
+    col_min = memoized_stat("set_min")
+    col_max = memoized_stat("set_max")
+    col_median = memoized_stat("set_median")
+    histogram = memoized_stat("set_histogram", alt.Chart())
+    frequent = memoized_stat("set_frequent", pd.DataFrame(columns=['value', 'occurrence', 'percentage']))
+    frequent_empty = memoized_stat("set_frequent", True)
+
+    def __init__(self, file_path=None, df=None, bins=None, bin_strategy="fixed", optimize=False, sample_first=False, approximate=False):
         self.file_path = file_path
         self.df = df
+        self.optimize = optimize
+        self.sample_first = sample_first
+        self.over_budget = False
+        self.estimator = None
+        self.approximate = approximate
+        self.bins = config.HISTOGRAM_BINS if bins is None else bins
+        self.bin_strategy = bin_strategy
+        self.state_key = None
         self.cols_list = []
         self.serie = None
-        self.n_unique = None
-        self.n_missing = None
-        self.col_mean = None
-        self.col_std = None
-        self.col_min = None
-        self.col_max = None
-        self.col_median = None
-        self.n_zeros = None
-        self.n_negatives = None
-        self.histogram = alt.Chart()
-        self.frequent = pd.DataFrame(columns=['value', 'occurrence', 'percentage'])
 
     
     def find_num_cols(self):
-        if self.file_path is not None:
-            self.file_path.seek(0)
-            data_df = pd.read_csv(self.file_path, low_memory=False)
-
-        list_of_num_txt_columns = []
-        for col in data_df.columns:
-            if data_df[col].dtype in ['float64', 'int64']:
-                list_of_num_txt_columns.append(col)
-            elif data_df[col].dtype == 'object':
-                temp_series = pd.to_numeric(data_df[col], errors='coerce')
-                # Check if all values are numeric after conversion
-                if not temp_series.isnull().all():  # Ensure not all values are NaN after conversion
-                    data_df[col] = temp_series
-                    list_of_num_txt_columns.append(col)
-
-        self.df = data_df
-        self.cols_list = list_of_num_txt_columns
+        # A file whose parsed dataframe would not fit in the memory budget is profiled from its sample instead
+        if not self.sample_first and self.file_path is not None and over_memory_budget(self.file_path, self.optimize):
+            self.sample_first = self.over_budget = True
+        # Column types come from the schema inferred once per upload and shared with the other tabs
+        schema = get_schema(self.file_path, self.df, self.optimize, self.sample_first)
+        self.df = schema.df
+        self.cols_list = schema.cols_of(NUMERIC)
+        if self.sample_first and self.file_path is not None:
+            self.estimator = sample_estimator(self.file_path)
+        # States of a sample are not kept, they would be mistaken for the ones of the whole upload
+        elif self.file_path is not None:
+            self.state_key = hash_upload(self.file_path)
 
     def set_data(self, col_name):
         self.serie = self.df[col_name]
         self.convert_serie_to_num()
-        self.set_unique()
-        self.set_missing()
-        self.set_zeros()
-        self.set_negatives()
-        self.set_mean()
-        self.set_std()
-        self.set_min()
-        self.set_max()
-        self.set_median()
-        self.set_histogram()
-        self.set_frequent()
+        # Statistics are computed by their set_* method the first time they are read
+        reset_stats(self)
 
     def convert_serie_to_num(self):
         self.serie = pd.to_numeric(self.serie, errors='coerce')
@@ -87,72 +305,142 @@ class NumericColumn:
     def is_serie_none(self):
         return self.serie is None or self.serie.empty
 
+    def state_name(self):
+        return ("column_state", "numeric", self.serie.name, str(self.serie.dtype), self.approximate)
+
+    def set_state(self):
+        if not self.is_serie_none():
+            # In exact mode the fused kernel is faster than building a state, one is only read when the earlier upload kept it
+            self.state = load_column_state(self.state_key, self.state_name(), self.serie, dataset_store, numeric_counts, self.approximate,
+                                           count_values=False, from_scratch=self.approximate)
+
+    def set_stats(self):
+        if not self.is_serie_none():
+            self.stats = compute_numeric_stats(self.serie, self.approximate, self.state)
+            if self.state is None and self.state_key is not None:
+                dataset_store.put(self.state_key, self.state_name(), numeric_state(self.serie, self.stats))
+
     def set_unique(self):
         if not self.is_serie_none():
-            self.n_unique = self.serie.nunique()
+            self.n_unique = self.stats['n_unique']
 
     def set_missing(self):
         if not self.is_serie_none():
-            self.n_missing = self.serie.isnull().sum()
+            self.n_missing = self.stats['n_missing']
 
     def set_zeros(self):
         if not self.is_serie_none():
-            self.n_zeros = (self.serie == 0).sum()
+            self.n_zeros = self.stats['n_zeros']
 
     def set_negatives(self):
         if not self.is_serie_none():
-            self.n_negatives = (self.serie < 0).sum()
+            self.n_negatives = self.stats['n_negatives']
 
     def set_mean(self):
         if not self.is_serie_none():
-            self.col_mean = self.serie.mean()
+            self.col_mean = self.stats['col_mean']
 
     def set_std(self):
         if not self.is_serie_none():
-            self.col_std = self.serie.std()
+            self.col_std = self.stats['col_std']
 
     def set_min(self):
         if not self.is_serie_none():
-            self.col_min = self.serie.min()
+            self.col_min = self.stats['col_min']
 
     def set_max(self):
         if not self.is_serie_none():
-            self.col_max = self.serie.max()
+            self.col_max = self.stats['col_max']
 
     def set_median(self):
         if not self.is_serie_none():
-            self.col_median = self.serie.median()
+            self.col_median = self.stats['col_median']
 
     def set_histogram(self):
         if not self.is_serie_none():
-            # Convert series to DataFrame for Altair
-            data_for_histogram = self.serie.reset_index(drop=True).to_frame('value')
+            # Bins are computed here so the chart only receives one row per bin instead of the whole serie
+            data_for_histogram = compute_histogram(self.serie, self.bins, self.bin_strategy)
 
             # Create an Altair histogram chart
             self.histogram = alt.Chart(data_for_histogram).mark_bar().encode(
-                alt.X("value:Q", bin=True),
-                y='count()',
+                alt.X("bin_start:Q", bin="binned", title="value"),
+                alt.X2("bin_end:Q"),
+                alt.Y("count:Q", title="Count of Records"),
+                tooltip=["bin_start:Q", "bin_end:Q", "count:Q"]
             ).interactive()  # making it interactive
 
     def set_frequent(self, end=20):
         if not self.is_serie_none():
-            value_counts = self.serie.value_counts().head(end).reset_index()
+            # Only the most frequent values are counted in approximate mode
+            counts = self.state.heavy_hitters.top(end) if self.approximate else self.serie.value_counts().head(end)
+            value_counts = counts.reset_index()
             value_counts.columns = ['value', 'occurrence']
             value_counts['value'] = value_counts['value'].astype(int)
             value_counts['percentage'] = (value_counts['occurrence'] / len(self.serie)) * 100
+            if self.estimator is not None:
+                value_counts = self.estimator.estimate_frequent(value_counts, 'occurrence')
             
             self.frequent_empty = value_counts.empty
             
-            self.frequent = value_counts.style.format({
-                'value': '{:,.0f}',
-                'percentage': '{:,.2f}%'
-            })
+            self.frequent = style_frequent(value_counts)
+
+    def __getstate__(self):
+        # Stylers can't be pickled, the frequent values are sent as a dataframe when the column is profiled in another process
+        state = self.__dict__.copy()
+        if 'frequent' in state:
+            state['frequent'] = state['frequent'].data
+        return state
+
+    def __setstate__(self, state):
+        if 'frequent' in state:
+            state['frequent'] = style_frequent(state['frequent'])
+        self.__dict__.update(state)
 
     def get_summary(self):
+        n_unique, col_median = self.n_unique, "{:.2f}".format(self.col_median)
+        if self.approximate:
+            # Sketch estimates come with their error bound
+            n_unique = "≈ {:,} (± {:.1%})".format(n_unique, distinct_error())
+            col_median = "≈ {} (rank ± {:.1%})".format(col_median, rank_error())
         data = {
             'Description': ['Number of Unique Values', 'Number of Rows with Missing Values', 'Number of Rows with 0', 'Number of Rows with Negative Values',
                             'Average value', 'Standard Deviation Value', 'Minimum Value', 'Maximum Value', 'Median Value'],
-            'Value': [self.n_unique, self.n_missing, self.n_zeros, self.n_negatives, "{:.2f}".format(self.col_mean), 
-                            "{:.2f}".format(self.col_std), self.col_min, self.col_max, "{:.2f}".format(self.col_median)]
+            'Value': [n_unique, self.n_missing, self.n_zeros, self.n_negatives, "{:.2f}".format(self.col_mean), 
+                            "{:.2f}".format(self.col_std), self.col_min, self.col_max, col_median]
         }
-        return pd.DataFrame(data)
\ No newline at end of file
+        if self.estimator is not None:
+            # Counts, average and standard deviation are extrapolated to the whole file, the other values are the ones of the sample
+            return self.estimator.estimate_summary(
+                pd.DataFrame(data),
+                counts=['Number of Rows with Missing Values', 'Number of Rows with 0', 'Number of Rows with Negative Values'],
+                intervals={'Average value': self.estimator.mean(self.serie), 'Standard Deviation Value': self.estimator.std(self.serie)}
+            )
+        return pd.DataFrame(data)
+
+def profile_numeric_column(serie, bins=None, bin_strategy="fixed", approximate=False, state_key=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> profile_numeric_column (function): Function that computes every statistic, the histogram and the frequent values of a numeric column, to be run in the background (see utils.background)
+
+    --------------------
+    Parameters
+    --------------------
+    -> serie (pd.Series): Numeric column, as converted by the schema
+    -> bins (int): Number of bins of the histogram (default set to config.HISTOGRAM_BINS)
+    -> bin_strategy (str): Binning strategy of the histogram, one of BIN_STRATEGIES (default set to "fixed")
+    -> approximate (bool): Flag stating if the number of unique values and the median are estimated with sketches (default set to False)
+    -> state_key (str): Content hash of the upload the column comes from, to share its ColumnState through the store (default set to None)
+
+    --------------------
+    Returns
+    --------------------
+    -> (NumericColumn): Column with everything already computed
+
+    """
+    num_col_instance = NumericColumn(df=serie.to_frame(), bins=bins, bin_strategy=bin_strategy, approximate=approximate)
+    num_col_instance.state_key = state_key
+    num_col_instance.cols_list = [serie.name]
+    num_col_instance.set_data(serie.name)
+    return compute_stats(num_col_instance)
@@ -1,15 +1,36 @@
 import streamlit as st
-from tab_text.logics import TextColumn
+from tab_text.logics import TextColumn, profile_text_column
+from utils.background import background_profiler
+from utils.schema import exact_schema_ready, is_text_dtype
+from utils.store import hash_upload
 
 
-def display_tab_text_content(file_path=None, df=None):
-    text_column = TextColumn(file_path=file_path, df=df)
+def submit_text_profiling(file_path=None, df=None):
+    optimize = st.session_state.get("optimize_memory", False)
+    # In sample-first mode the columns of the sample are used until the whole upload has been loaded in the background
+    sample_first = st.session_state.get("sample_first", False) and file_path is not None and not exact_schema_ready(file_path, optimize)
+    text_column = TextColumn(file_path=file_path, df=df, optimize=optimize, sample_first=sample_first, approximate=st.session_state.get("approximate_stats", False))
     text_column.find_text_cols()
 
+    # Every text column is profiled in the background, tasks already submitted are not run again
+    task_names = {}
+    # The column classes switch to the sample on their own when the whole upload would not fit in the memory budget
+    if file_path is not None and not text_column.sample_first:
+        key = hash_upload(file_path)
+        for col in text_column.cols_list:
+            if is_text_dtype(text_column.df[col].dtype):
+                task_names[col] = ("text", col, text_column.optimize, text_column.top_k, text_column.approximate)
+                background_profiler.submit(key, task_names[col], profile_text_column, text_column.df[col], text_column.top_k, text_column.approximate, key)
+    return text_column, task_names
+
+
+def display_tab_text_content(file_path=None, df=None):
+    text_column, task_names = submit_text_profiling(file_path, df)
+
     if not text_column.cols_list:
         st.error('No text columns available')
     else:
-        text_cols_list = [col for col in text_column.cols_list if text_column.df[col].dtype == 'object']
+        text_cols_list = [col for col in text_column.cols_list if is_text_dtype(text_column.df[col].dtype)]
 
         if not text_cols_list:
             st.error('No text columns available')
@@ -17,7 +38,19 @@ def display_tab_text_content(file_path=None, df=None):
             selected_text_column = st.selectbox('Which text column do you want to explore', text_cols_list)
 
             if selected_text_column:
-                text_column.set_data(selected_text_column)
+                # Use the column profiled in the background, waiting for it if needed, or profile it now if it wasn't submitted
+                profiled = None
+                if selected_text_column in task_names:
+                    key = hash_upload(file_path)
+                    n_done, n_total = background_profiler.progress(key, task_names.values())
+                    if n_done < n_total:
+                        st.progress(n_done / n_total, text=f'Profiling text columns in the background: {n_done} of {n_total} done')
+                    with st.spinner(f'Profiling {selected_text_column}...'):
+                        profiled = background_profiler.result(key, task_names[selected_text_column])
+                if profiled is not None:
+                    text_column = profiled
+                else:
+                    text_column.set_data(selected_text_column)
 
                 with st.expander('Text Column', expanded=True):
                     summary = text_column.get_summary()
@@ -29,6 +62,8 @@ def display_tab_text_content(file_path=None, df=None):
                 with st.expander('Bar Chart', expanded=True):
                     if text_column.barchart:
                         st.altair_chart(text_column.barchart, use_container_width=True)
+                        if text_column.heavy_hitters is not None:
+                            st.caption(f'Counts over the whole file, found chunk by chunk: each one may be up to {text_column.heavy_hitters.error_bound:,} below the true count.')
                     else:
                         st.write('No Bar Chart')
 
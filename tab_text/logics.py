@@ -1,40 +1,218 @@
 import pandas as pd
 import altair as alt
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
 
+from utils import config
+from utils.budget import over_memory_budget
+from utils.estimate import sample_estimator
+from utils.incremental import load_column_state
+from utils.ingest import iter_csv_chunks
+from utils.instrument import instrument_methods
+from utils.lazy import compute_stats, memoized_stat, reset_stats
+from utils.optimize import to_text
+from utils.schema import TEXT, get_schema
+from utils.sketches import MisraGries, distinct_error
+from utils.store import dataset_store, hash_upload
+
+
+TEXT_FLAGS = ['n_empty', 'n_space', 'n_lower', 'n_upper', 'n_alpha', 'n_digit']
+
+
+def profile_text_loop(values):
+    # Fused fallback: every flag of a value is computed in the same pass, only counters are kept
+    counts = dict.fromkeys(TEXT_FLAGS, 0)
+    for value in values:
+        counts['n_empty'] += value.strip() == ''
+        counts['n_space'] += value.isspace()
+        counts['n_lower'] += value.islower()
+        counts['n_upper'] += value.isupper()
+        counts['n_alpha'] += value.isalpha()
+        counts['n_digit'] += value.isdigit()
+    return counts
+
+
+def count_true(mask):
+    return pc.sum(mask).as_py() or 0
+
+
+def arrow_strings(serie):
+    # Series backed by Arrow strings are used without copying them
+    if isinstance(serie.dtype, pd.StringDtype) and serie.dtype.storage == "pyarrow":
+        return serie.array.__arrow_array__()
+    return pa.array(serie, type=pa.string(), from_pandas=True)
+
+
+def profile_text(serie):
+    """
+    --------------------
+    Description
+    --------------------
+    -> profile_text (function): Function that counts, in one go, the values of a text serie that are empty, only whitespace, lowercase, uppercase, alphabetic or digits.
+    When pyarrow is available every flag is computed by a vectorized Arrow kernel and summed, without building filtered copies of the serie.
+    Arrow and Python disagree on a few non-ASCII characters (superscript digits, modifier letters...), so the case and digit flags of non-ASCII values are computed with the str methods to keep the results identical.
+    Without pyarrow, a single fused Python loop is used instead.
+
+    --------------------
+    Parameters
+    --------------------
+    -> serie (pd.Series): Text serie, missing values are not counted in any flag
+
+    --------------------
+    Returns
+    --------------------
+    -> (dict): Dictionary with n_empty, n_space, n_lower, n_upper, n_alpha and n_digit
+
+    """
+    if pa is None:
+        return profile_text_loop(serie.dropna())
+
+    # Missing values are nulls of the Arrow array, no kernel counts them
+    array = arrow_strings(serie)
+    counts = {
+        'n_empty': count_true(pc.equal(pc.utf8_trim_whitespace(array), '')),
+        'n_space': count_true(pc.utf8_is_space(array)),
+        'n_alpha': count_true(pc.utf8_is_alpha(array))
+    }
+
+    is_ascii = pc.string_is_ascii(array)
+    for flag, kernel in [('n_lower', pc.utf8_is_lower), ('n_upper', pc.utf8_is_upper), ('n_digit', pc.utf8_is_digit)]:
+        counts[flag] = count_true(pc.and_(kernel(array), is_ascii))
+    non_ascii = array.filter(pc.invert(is_ascii))
+    if len(non_ascii):
+        python_counts = profile_text_loop(non_ascii.to_pylist())
+        for flag in ['n_lower', 'n_upper', 'n_digit']:
+            counts[flag] += python_counts[flag]
+    return counts
+
+
+def top_k_with_other(counts, top_k, n_total, n_distinct=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> top_k_with_other (function): Function that keeps the top_k largest counts and adds one "Other" row holding the count of every remaining value
+
+    --------------------
+    Parameters
+    --------------------
+    -> counts (pd.Series): Count of each value, indexed by value
+    -> top_k (int): Number of values kept
+    -> n_total (int): Total number of values counted, including the ones not present in counts
+    -> n_distinct (int): Number of distinct values, shown in the label of the "Other" row when it is known (default set to None)
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): Dataframe with the columns value and occurrence
+
+    """
+    top = counts.nlargest(top_k)
+    chart_data = pd.DataFrame({'value': top.index.astype(str), 'occurrence': top.values})
+    n_other = n_total - int(top.sum())
+    if n_other > 0:
+        label = f'Other ({n_distinct - len(top)} values)' if n_distinct is not None else 'Other'
+        chart_data.loc[len(chart_data)] = [label, n_other]
+    return chart_data
+
+
+def stream_heavy_hitters(file_path, cols_list, capacity=None, chunk_rows=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> stream_heavy_hitters (function): Function that reads text columns of a CSV file chunk by chunk and finds the most frequent values of each one with a bounded Misra-Gries summary, whatever the number of distinct values
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str, file-like or PartitionedUpload): Uploaded file or path to the CSV file
+    -> cols_list (list): List of the names of the text columns, all read in the same pass
+    -> capacity (int): Maximum number of counters kept per column (default set to config.HEAVY_HITTERS_CAPACITY)
+    -> chunk_rows (int): Number of rows per chunk (default set to config.CHUNK_ROWS)
+
+    --------------------
+    Returns
+    --------------------
+    -> (dict): Summary (MisraGries) holding the approximate counts of the most frequent values, for each column
+
+    """
+    capacity = config.HEAVY_HITTERS_CAPACITY if capacity is None else capacity
+    summaries = {col: MisraGries(capacity) for col in cols_list}
+    if not summaries:
+        return summaries
+    for chunk in iter_csv_chunks(file_path, chunk_rows, usecols=list(summaries), dtype=str):
+        for col, summary in summaries.items():
+            summary.update(chunk[col])
+    return summaries
+
+
+def load_heavy_hitters(file_path, col_name, store=dataset_store):
+    # Summary of the most frequent values of a column over the whole file, kept in the store so that the file is only read once per column
+    key = hash_upload(file_path)
+    name = ("heavy_hitters", col_name, config.HEAVY_HITTERS_CAPACITY)
+    summary = store.get(key, name)
+    if summary is None:
+        summary = stream_heavy_hitters(file_path, [col_name])[col_name]
+        store.put(key, name, summary, int(summary.counters.memory_usage(deep=True)))
+    return summary
+
+
+@instrument_methods
 class TextColumn:
-    def __init__(self, file_path=None, df=None):
+    # Statistics are computed by their set_* method the first time they are read, and forgotten when set_data loads another column
+    state = memoized_stat("set_state")
+    profile = memoized_stat("set_profile")
+    value_counts = memoized_stat("set_value_counts")
+    heavy_hitters = memoized_stat("set_heavy_hitters")
+    n_unique = memoized_stat("set_unique")
+    n_missing = memoized_stat("set_missing")
+    n_empty = memoized_stat("set_empty")
+    n_mode = memoized_stat("set_mode")
+    n_space = memoized_stat("set_whitespace")
+    n_lower = memoized_stat("set_lowercase")
+    n_upper = memoized_stat("set_uppercase")
+    n_alpha = memoized_stat("set_alphabet")
+    n_digit = memoized_stat("set_digit")
+    barchart = memoized_stat("set_barchart", alt.Chart())
+    frequent = memoized_stat("set_frequent", pd.DataFrame(columns=['value', 'occurrence', 'percentage']))
+
+    def __init__(self, file_path=None, df=None, top_k=None, optimize=False, sample_first=False, approximate=False):
         self.file_path = file_path
         self.df = df
+        self.optimize = optimize
+        # In sample-first mode the columns come from the sample of the upload and the statistics are extrapolated to the whole file
+        self.sample_first = sample_first
+        # Set by find_text_cols when sample-first mode is switched on because the whole file would not fit in the memory budget
+        self.over_budget = False
+        self.estimator = None
+        # In approximate mode the number of unique values comes from a HyperLogLog sketch and the most frequent values from a Misra-Gries summary, instead of the counts of every value
+        self.approximate = approximate
+        self.top_k = config.BARCHART_TOP_K if top_k is None else top_k
+        # Content hash of the upload, under which the mergeable state of each column is kept (see utils.incremental.ColumnState), None for samples
+        self.state_key = None
         self.cols_list = []
         self.serie = None
-        self.n_unique = None
-        self.n_missing = None
-        self.n_empty = None
-        self.n_mode = None
-        self.n_space = None
-        self.n_lower = None
-        self.n_upper = None
-        self.n_alpha = None
-        self.n_digit = None
-        self.barchart = alt.Chart()
-        self.frequent = pd.DataFrame(columns=['value', 'occurrence', 'percentage'])
 
     def find_text_cols(self):
+        # A file whose parsed dataframe would not fit in the memory budget is profiled from its sample instead
+        if not self.sample_first and self.file_path is not None and over_memory_budget(self.file_path, self.optimize):
+            self.sample_first = self.over_budget = True
         if self.file_path is not None:
-            self.file_path.seek(0)
-            data = pd.read_csv(self.file_path)
-
-            list_of_text_columns = []
-            for col in data.columns:
-                try:
-                    if data[col].dtype == 'object':
-                        list_of_text_columns.append(col)
-                except Exception as e:
-                    print(f"Error processing column {col}: {str(e)}")
+            # Column types come from the schema inferred once per upload and shared with the other tabs
+            schema = get_schema(self.file_path, optimize=self.optimize, sample_first=self.sample_first)
+            list_of_text_columns = schema.cols_of(TEXT)
+            if self.sample_first:
+                self.estimator = sample_estimator(self.file_path)
+            else:
+                self.state_key = hash_upload(self.file_path)
 
             if list_of_text_columns:
-                self.df = data
+                self.df = schema.df
                 self.cols_list = list_of_text_columns
             else:
                 print('No Text Columns found')
@@ -46,64 +224,86 @@ class TextColumn:
             self.serie = self.df[col_name]
             if isinstance(self.serie, pd.Series):
                 self.convert_serie_to_text()
-                self.set_unique()
-                self.set_missing()
-                self.set_empty()
-                self.set_mode()
-                self.set_whitespace()
-                self.set_lowercase()
-                self.set_uppercase()
-                self.set_alphabet()
-                self.set_digit()
-                self.set_barchart()
-                self.set_frequent()
             else:
                 self.serie = None
+            reset_stats(self)
 
     def convert_serie_to_text(self):
-        self.serie = self.serie.astype(str)
+        # Arrow strings keep missing values as nulls, without a Python object per value
+        self.serie = to_text(self.serie)
 
     def is_serie_none(self):
         return self.serie is None
 
+    def state_name(self):
+        return ("column_state", "text", self.serie.name, str(self.serie.dtype), self.approximate)
+
+    def set_state(self):
+        # Counts of values, missing values and text flags, only the new rows are counted when rows were appended to an earlier upload
+        if not self.is_serie_none():
+            self.state = load_column_state(self.state_key, self.state_name(), self.serie, dataset_store, profile_text, self.approximate)
+
+    def set_profile(self):
+        if not self.is_serie_none():
+            self.profile = dict(self.state.counts)
+
+    def set_value_counts(self):
+        # Shared by the number of unique values, the bar chart and the frequent values, only the most frequent values are counted in approximate mode
+        if not self.is_serie_none():
+            counts = self.state.heavy_hitters.counters if self.approximate else self.state.value_counts
+            self.value_counts = counts.sort_values(ascending=False, kind="stable")
+
     def set_unique(self):
-        self.n_unique = self.serie.nunique()
+        if self.approximate and not self.is_serie_none():
+            self.n_unique = self.state.distinct.count()
+        else:
+            self.n_unique = len(self.value_counts)
 
     def set_missing(self):
         if not self.is_serie_none():
-            n_missing_nan = self.serie.isna().sum()
-            n_missing_nan_str = self.serie.apply(lambda x: x == 'nan').sum()
-            self.n_missing = n_missing_nan + n_missing_nan_str
+            self.n_missing = self.state.n_missing
 
     def set_empty(self):
         if self.serie is not None:
-            self.n_empty = len(self.serie[self.serie.str.strip() == ''])
+            self.n_empty = self.profile['n_empty']
         else:
             self.n_empty = 0
 
     def set_mode(self):
-        self.n_mode = self.serie.mode().iloc[0]
+        # Smallest of the most frequent values, as Series.mode sorts them; a column with only missing values has no mode
+        value_counts = self.value_counts
+        self.n_mode = value_counts.index[value_counts == value_counts.iloc[0]].min() if len(value_counts) else None
 
     def set_whitespace(self):
-        self.n_space = len(self.serie[self.serie.str.isspace()])
+        self.n_space = self.profile['n_space']
 
     def set_lowercase(self):
         if not self.is_serie_none():
-            self.n_lower = self.serie[self.serie.str.islower()].count()
+            self.n_lower = self.profile['n_lower']
 
     def set_uppercase(self):
         if not self.is_serie_none():
-            self.n_upper = self.serie[self.serie.str.isupper()].count()
+            self.n_upper = self.profile['n_upper']
 
     def set_alphabet(self):
-        self.n_alpha = len(self.serie[self.serie.str.isalpha()])
+        self.n_alpha = self.profile['n_alpha']
 
     def set_digit(self):
-        self.n_digit = len(self.serie[self.serie.str.isdigit()])
+        self.n_digit = self.profile['n_digit']
+
+    def set_heavy_hitters(self):
+        # Files over the memory budget are never loaded whole, the most frequent values of the whole column are found chunk by chunk with bounded memory
+        if self.over_budget and not self.is_serie_none():
+            self.heavy_hitters = load_heavy_hitters(self.file_path, self.serie.name)
+        elif self.approximate and not self.is_serie_none():
+            self.heavy_hitters = self.state.heavy_hitters
 
     def set_barchart(self):
-        value_counts = self.serie.value_counts().reset_index()
-        value_counts.columns = ['value', 'occurrence']
+        # Only the top K values are charted, the others are added up in an "Other" bar
+        if self.heavy_hitters is not None:
+            value_counts = top_k_with_other(self.heavy_hitters.counters, self.top_k, self.heavy_hitters.n_values)
+        else:
+            value_counts = top_k_with_other(self.value_counts, self.top_k, self.state.n_values, len(self.value_counts))
         zoom = alt.selection_interval(bind='scales', encodings=['x'])
         self.barchart = alt.Chart(value_counts).mark_bar().encode(
             y='occurrence:Q',
@@ -114,11 +314,18 @@ class TextColumn:
 
     def set_frequent(self, end=20):
         self.serie.dropna()
-        value_counts = self.serie.value_counts().reset_index()
+        value_counts = self.value_counts.head(end).reset_index()
         value_counts.columns = ['value', 'occurrence']
         total = len(self.serie)
         value_counts['percentage'] = (value_counts['occurrence'] / total) * 100
-        self.frequent = value_counts.head(end)
+        if self.estimator is not None:
+            value_counts = self.estimator.estimate_frequent(value_counts, 'occurrence')
+        self.frequent = value_counts
+
+    def format_unique(self):
+        if self.approximate and self.n_unique is not None:
+            return "≈ {:,} (± {:.1%})".format(self.n_unique, distinct_error())
+        return self.n_unique
 
     def get_summary(self):
         summary_df = pd.DataFrame({
@@ -126,7 +333,38 @@ class TextColumn:
                             'Mode Value', 'Number of Rows with Only Whitespace', 'Number of Rows with only Lowercases',
                             'Number of Rows with Only Uppercases', 'Number of Rows with Only Alphabet',
                             'Number of Rows with Only Digit'],
-            'Value': [self.n_unique, self.n_missing, self.n_empty, self.n_mode, self.n_space, self.n_lower,
+            'Value': [self.format_unique(), self.n_missing, self.n_empty, self.n_mode, self.n_space, self.n_lower,
                       self.n_upper, self.n_alpha, self.n_digit]
         })
+        if self.estimator is not None:
+            # Counts of rows are extrapolated to the whole file, the unique and mode values are the ones of the sample
+            return self.estimator.estimate_summary(summary_df, counts=[description for description in summary_df['Description'] if description not in ['Number of Unique Values', 'Mode Value']])
         return summary_df
+
+
+def profile_text_column(serie, top_k=None, approximate=False, state_key=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> profile_text_column (function): Function that computes every statistic, the bar chart and the frequent values of a text column, to be run in the background (see utils.background)
+
+    --------------------
+    Parameters
+    --------------------
+    -> serie (pd.Series): Text column
+    -> top_k (int): Number of bars before the "Other" bar (default set to config.BARCHART_TOP_K)
+    -> approximate (bool): Flag stating if the number of unique values is estimated with a sketch (default set to False)
+    -> state_key (str): Content hash of the upload the column comes from, to share its ColumnState through the store (default set to None)
+
+    --------------------
+    Returns
+    --------------------
+    -> (TextColumn): Column with everything already computed
+
+    """
+    text_column = TextColumn(df=serie.to_frame(), top_k=top_k, approximate=approximate)
+    text_column.state_key = state_key
+    text_column.cols_list = [serie.name]
+    text_column.set_data(serie.name)
+    return compute_stats(text_column)
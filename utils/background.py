@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils import config
+
+
+class BackgroundProfiler:
+    """
+    --------------------
+    Description
+    --------------------
+    -> BackgroundProfiler (class): Class that runs profiling tasks in a pool of threads or processes and keeps their results, so that the columns of an upload are ready before the user selects them.
+    Tasks are grouped by upload (content hash) and named, a task submitted twice under the same name only runs once; the results of the least recently used uploads are dropped after max_uploads.
+
+    --------------------
+    Attributes
+    --------------------
+    -> executor_kind (str): "thread" to run the tasks in threads of the app process, "process" to run them in separate processes, "off" to run nothing in the background (default set to config.PROFILE_EXECUTOR)
+    -> max_workers (int): Number of tasks run at the same time (default set to config.PROFILE_WORKERS)
+    -> max_uploads (int): Number of uploads whose results are kept (default set to config.STORE_MAX_ENTRIES)
+    -> tasks (OrderedDict): Futures of each upload, ordered from least to most recently used, each mapping a task name to its future
+    -> local_executor (ThreadPoolExecutor): Single thread of the app process running the tasks that fill the shared dataset store, one at a time whatever the executor kind, so that a large upload is never loaded twice at once (see submit_local)
+
+    """
+    def __init__(self, executor_kind=config.PROFILE_EXECUTOR, max_workers=config.PROFILE_WORKERS, max_uploads=config.STORE_MAX_ENTRIES):
+        self.executor_kind = executor_kind
+        self.enabled = executor_kind != "off"
+        self.max_workers = max_workers
+        self.max_uploads = max_uploads
+        self.tasks = OrderedDict()
+        self._executor = None
+        self._local_executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # The pool is only started by the first task, processes are expensive to create
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.executor_kind == "process" else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.max_workers)
+        return self._executor
+
+    @property
+    def local_executor(self):
+        if self._local_executor is None:
+            self._local_executor = ThreadPoolExecutor(max_workers=1)
+        return self._local_executor
+
+    def submit(self, key, name, function, *args, **kwargs):
+        """
+        --------------------
+        Description
+        --------------------
+        -> submit (method): Class method that starts a task in the background, unless a task with the same name was already submitted for the upload
+
+        --------------------
+        Parameters
+        --------------------
+        -> key (str): Content hash of the upload
+        -> name (hashable): Name of the task, which must change whenever its arguments do (e.g. the column name and the settings)
+        -> function (callable): Module-level function running the task, its arguments and result must be picklable with the "process" executor
+        -> *args, **kwargs: Arguments passed to the function
+
+        --------------------
+        Returns
+        --------------------
+        -> (concurrent.futures.Future): Future of the task, None if the profiler is off
+
+        """
+        return self._submit(False, key, name, function, args, kwargs)
+
+    def submit_local(self, key, name, function, *args, **kwargs):
+        # Same as submit, but the task runs in the local executor so that what it puts in the shared dataset store is seen by the app
+        return self._submit(True, key, name, function, args, kwargs)
+
+    def _submit(self, local, key, name, function, args, kwargs):
+        if not self.enabled:
+            return None
+        with self._lock:
+            tasks = self.tasks.setdefault(key, {})
+            self.tasks.move_to_end(key)
+            if name not in tasks:
+                executor = self.local_executor if local else self.executor
+                tasks[name] = executor.submit(function, *args, **kwargs)
+            while len(self.tasks) > self.max_uploads:
+                _, dropped = self.tasks.popitem(last=False)
+                for future in dropped.values():
+                    future.cancel()
+            return tasks[name]
+
+    def future(self, key, name):
+        with self._lock:
+            return self.tasks.get(key, {}).get(name)
+
+    def result(self, key, name):
+        # Wait for a task and return its result, None if it wasn't submitted, was dropped or failed (the caller then computes it itself)
+        future = self.future(key, name)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except (Exception, CancelledError):
+            return None
+
+    def progress(self, key, names):
+        # Number of the given tasks that are finished, and number of them that were submitted
+        futures = [self.future(key, name) for name in names]
+        futures = [future for future in futures if future is not None]
+        return sum(future.done() for future in futures), len(futures)
+
+    def forget(self, key):
+        with self._lock:
+            for future in self.tasks.pop(key, {}).values():
+                future.cancel()
+
+
+background_profiler = BackgroundProfiler()
@@ -0,0 +1,99 @@
+import io
+
+import pandas as pd
+
+from utils import config
+from utils.incremental import read_range
+from utils.ingest import upload_size
+from utils.optimize import optimize_dataframe
+from utils.partitions import is_partitioned
+from utils.store import dataset_store, hash_upload
+
+
+def estimate_memory(file_path, optimize=False, sample_bytes=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> estimate_memory (function): Function that estimates the memory the parsed dataframe of an upload would take, without parsing it whole: the first bytes of the file are parsed and their memory usage per byte of CSV is scaled to the size of the upload.
+    Rows at the start of the file stand for the whole file, so the estimate is rough on files whose rows get longer or change type further down.
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str, file-like or PartitionedUpload): Uploaded file or path to the CSV file
+    -> optimize (bool): Flag stating if the memory-optimized dataframe is estimated (see utils.optimize) (default set to False)
+    -> sample_bytes (int): Number of bytes parsed from the start of the file (default set to config.MEMORY_BUDGET_SAMPLE_BYTES)
+
+    --------------------
+    Returns
+    --------------------
+    -> (int): Estimated memory usage in bytes of the parsed dataframe, index included
+
+    """
+    sample_bytes = config.MEMORY_BUDGET_SAMPLE_BYTES if sample_bytes is None else sample_bytes
+    size = upload_size(file_path)
+    # The first file stands for every file of a partitioned upload
+    part = file_path.open_parts()[0] if is_partitioned(file_path) else file_path
+    part_size = upload_size(part)
+    prefix = read_range(part, 0, min(sample_bytes, part_size))
+    cut = len(prefix) < part_size
+    end = len(prefix)
+    # A cut prefix ends on its last line break, earlier ones are tried if that line break is inside a quoted field
+    for attempt in range(8):
+        if cut:
+            end = prefix.rfind(b"\n", 0, end - (attempt > 0)) + 1
+        if end == 0:
+            break
+        try:
+            df = pd.read_csv(io.BytesIO(prefix[:end]), low_memory=False)
+        except pd.errors.EmptyDataError:
+            return 0
+        except pd.errors.ParserError:
+            if cut:
+                continue
+            break
+        if optimize:
+            df = optimize_dataframe(df)
+        return int(df.memory_usage(deep=True).sum() / end * size)
+    # Without a parsable prefix the size of the file itself is the estimate
+    return size
+
+
+def over_memory_budget(file_path, optimize=False, budget=None, store=dataset_store):
+    """
+    --------------------
+    Description
+    --------------------
+    -> over_memory_budget (function): Function that tells if loading an upload whole would exceed the memory budget of a dataset, in which case the dataset is summarized chunk by chunk and the columns are profiled from a sample instead.
+    The estimate is kept in the store, so that it is only computed once per upload.
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str, file-like or PartitionedUpload): Uploaded file or path to the CSV file
+    -> optimize (bool): Flag stating if the memory-optimized dataframe would be loaded (default set to False)
+    -> budget (int): Memory budget of a dataset in bytes, 0 for no budget (default set to config.MEMORY_BUDGET_BYTES)
+    -> store (DatasetStore): Store keeping the estimates (default set to the shared store)
+
+    --------------------
+    Returns
+    --------------------
+    -> (bool): Flag stating if the estimated memory usage of the parsed dataframe is over the budget
+
+    """
+    budget = config.MEMORY_BUDGET_BYTES if budget is None else budget
+    if budget <= 0:
+        return False
+    return memory_estimate(file_path, optimize, store) > budget
+
+
+def memory_estimate(file_path, optimize=False, store=dataset_store):
+    # Estimated memory usage of the parsed dataframe, kept in the store per upload
+    key = hash_upload(file_path)
+    name = ("memory_estimate", optimize)
+    estimate = store.get(key, name)
+    if estimate is None:
+        estimate = store.put(key, name, estimate_memory(file_path, optimize))
+    return estimate
+
@@ -0,0 +1,80 @@
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+# Shared dataset store (utils.store): upper bounds on the parsed uploads kept in memory
+STORE_MAX_BYTES = _env_int("CSV_EXPLORER_STORE_MAX_BYTES", 2 * 1024 ** 3)
+STORE_MAX_ENTRIES = _env_int("CSV_EXPLORER_STORE_MAX_ENTRIES", 8)
+
+# Disk cache (utils.disk_cache): parsed uploads saved as Arrow files so that later sessions don't parse them again
+DISK_CACHE_ENABLED = os.environ.get("CSV_EXPLORER_DISK_CACHE", "1") != "0"
+DISK_CACHE_DIR = os.environ.get("CSV_EXPLORER_DISK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "csv_explorer"))
+DISK_CACHE_MAX_BYTES = _env_int("CSV_EXPLORER_DISK_CACHE_MAX_BYTES", 10 * 1024 ** 3)
+
+# Memory-optimized load (utils.optimize): largest share of distinct values for a string column to be stored as category
+CATEGORY_MAX_RATIO = _env_float("CSV_EXPLORER_CATEGORY_MAX_RATIO", 0.5)
+
+# Background profiling (utils.background): "thread" or "process" pool profiling every column right after upload, "off" to profile on selection only
+PROFILE_EXECUTOR = os.environ.get("CSV_EXPLORER_PROFILE_EXECUTOR", "thread")
+PROFILE_WORKERS = _env_int("CSV_EXPLORER_PROFILE_WORKERS", min(4, os.cpu_count() or 1))
+
+# Chunked ingestion (utils.ingest): files larger than this are summarised chunk by chunk instead of being loaded whole
+CHUNKED_THRESHOLD_BYTES = _env_int("CSV_EXPLORER_CHUNKED_THRESHOLD_BYTES", 512 * 1024 ** 2)
+CHUNK_ROWS = _env_int("CSV_EXPLORER_CHUNK_ROWS", 100_000)
+# Number of rows kept from the start, the end and a uniform sample of the file in chunked mode
+CHUNKED_PREVIEW_ROWS = _env_int("CSV_EXPLORER_CHUNKED_PREVIEW_ROWS", 50)
+
+# Schema inference (utils.schema): number of values sampled per column and share of them that must convert
+SCHEMA_SAMPLE_ROWS = _env_int("CSV_EXPLORER_SCHEMA_SAMPLE_ROWS", 1000)
+SCHEMA_MIN_CONFIDENCE = _env_float("CSV_EXPLORER_SCHEMA_MIN_CONFIDENCE", 0.9)
+
+# Numeric histogram (tab_num.logics): default number of bins, cap for the automatic strategies
+HISTOGRAM_BINS = _env_int("CSV_EXPLORER_HISTOGRAM_BINS", 20)
+HISTOGRAM_MAX_BINS = _env_int("CSV_EXPLORER_HISTOGRAM_MAX_BINS", 200)
+
+# Text bar chart (tab_text.logics): number of bars before the "Other" bucket, counters kept when streaming chunks
+BARCHART_TOP_K = _env_int("CSV_EXPLORER_BARCHART_TOP_K", 30)
+HEAVY_HITTERS_CAPACITY = _env_int("CSV_EXPLORER_HEAVY_HITTERS_CAPACITY", 1000)
+
+# Datetime bar chart (tab_date.logics): number of bars aimed for when the bucket granularity is picked automatically
+DATE_TARGET_BARS = _env_int("CSV_EXPLORER_DATE_TARGET_BARS", 60)
+
+# Instrumentation (utils.instrument): record the time, rows and memory of every set_* / find_* step from the start, number of calls kept
+INSTRUMENT = os.environ.get("CSV_EXPLORER_INSTRUMENT", "0") == "1"
+INSTRUMENT_MAX_RECORDS = _env_int("CSV_EXPLORER_INSTRUMENT_MAX_RECORDS", 10_000)
+# Memory tracing (tracemalloc) slows down steps that allocate a lot, turn it off for timings closer to the real ones
+INSTRUMENT_MEMORY = os.environ.get("CSV_EXPLORER_INSTRUMENT_MEMORY", "1") != "0"
+
+# Sample-first mode (utils.ingest, utils.estimate): rows kept in the uniform sample used for the first estimates, confidence level of their intervals
+SAMPLE_ROWS = _env_int("CSV_EXPLORER_SAMPLE_ROWS", 100_000)
+SAMPLE_CONFIDENCE = _env_float("CSV_EXPLORER_SAMPLE_CONFIDENCE", 0.95)
+
+# Sketches (utils.sketches): HyperLogLog precision (relative error 1.04 / sqrt(2 ** precision)) and KLL size (rank error about 1.65 / k) of the approximate statistics
+SKETCH_PRECISION = _env_int("CSV_EXPLORER_SKETCH_PRECISION", 14)
+SKETCH_K = _env_int("CSV_EXPLORER_SKETCH_K", 200)
+
+# Multi-file uploads (utils.partitions): number of files parsed at the same time
+PARTITION_WORKERS = _env_int("CSV_EXPLORER_PARTITION_WORKERS", min(8, os.cpu_count() or 1))
+
+# Incremental re-profiling (utils.incremental): recognize an upload as an earlier one with rows appended and only parse the new rows, number of earlier uploads remembered
+INCREMENTAL = os.environ.get("CSV_EXPLORER_INCREMENTAL", "1") != "0"
+INCREMENTAL_MAX_UPLOADS = _env_int("CSV_EXPLORER_INCREMENTAL_MAX_UPLOADS", 32)
+
+# Parallel parsing (utils.parallel_parse): number of byte ranges of a file parsed at the same time, "thread" or "process" pool, smallest file split
+PARSE_WORKERS = _env_int("CSV_EXPLORER_PARSE_WORKERS", min(8, os.cpu_count() or 1))
+PARSE_EXECUTOR = os.environ.get("CSV_EXPLORER_PARSE_EXECUTOR", "thread")
+PARALLEL_PARSE_MIN_BYTES = _env_int("CSV_EXPLORER_PARALLEL_PARSE_MIN_BYTES", 32 * 1024 ** 2)
+
+# Memory budget (utils.budget): estimated memory of a parsed dataset above which it is read chunk by chunk and its columns profiled from a sample (0 for no budget), bytes parsed for the estimate
+MEMORY_BUDGET_BYTES = _env_int("CSV_EXPLORER_MEMORY_BUDGET_BYTES", 2 * 1024 ** 3)
+MEMORY_BUDGET_SAMPLE_BYTES = _env_int("CSV_EXPLORER_MEMORY_BUDGET_SAMPLE_BYTES", 1024 ** 2)
+
+# Row index (utils.row_index): number of rows between two byte offsets kept, rows are read by parsing at most this many rows per offset
+ROW_INDEX_STRIDE = _env_int("CSV_EXPLORER_ROW_INDEX_STRIDE", 64)
@@ -0,0 +1,184 @@
+import warnings
+from collections import Counter
+
+import pandas as pd
+
+from utils import config
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    # pandas < 2.2 only exposes the format guesser privately
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# Number of sampled values whose format is guessed one by one to build the list of candidate formats
+N_GUESSED_VALUES = 50
+
+
+class DateParseReport:
+    """
+    --------------------
+    Description
+    --------------------
+    -> DateParseReport (class): Class that records how a column was parsed as datetime, so that the app can explain why it was (or wasn't) treated as a datetime column
+
+    --------------------
+    Attributes
+    --------------------
+    -> col_name (str): Name of the column
+    -> date_format (str): Format guessed from a sample of values and used for the vectorized parse (None if no format was found)
+    -> n_values (int): Number of non-missing values checked
+    -> n_format (int): Number of values parsed with the guessed format
+    -> n_fallback (int): Number of values that didn't match the format but were parsed by the slow per-value fallback
+    -> is_date (bool): Flag stating if the column is treated as a datetime column (default set to False)
+
+    """
+    def __init__(self, col_name, date_format, n_values, n_format, n_fallback):
+        self.col_name = col_name
+        self.date_format = date_format
+        self.n_values = n_values
+        self.n_format = n_format
+        self.n_fallback = n_fallback
+        self.is_date = False
+
+    @property
+    def n_failed(self):
+        return self.n_values - self.n_format - self.n_fallback
+
+    @property
+    def ratio(self):
+        if self.n_values == 0:
+            return 0.0
+        return (self.n_format + self.n_fallback) / self.n_values
+
+    def to_state(self):
+        return [self.col_name, self.date_format, self.n_values, self.n_format, self.n_fallback, self.is_date]
+
+    @classmethod
+    def from_state(cls, state):
+        report = cls(*state[:5])
+        report.is_date = state[5]
+        return report
+
+    def to_dict(self):
+        return {
+            "Column Name": self.col_name,
+            "Treated as Datetime": self.is_date,
+            "Detected Format": self.date_format,
+            "Values Checked": self.n_values,
+            "Parsed with Format": self.n_format,
+            "Parsed by Fallback": self.n_fallback,
+            "Not Parsed": self.n_failed,
+            "Success Ratio": round(self.ratio, 4)
+        }
+
+
+def guess_format(sample):
+    """
+    --------------------
+    Description
+    --------------------
+    -> guess_format (function): Function that guesses the datetime format of a column from a sample of its values.
+    A format is guessed for the first values (month first, then day first) and the candidate that parses the largest share of the sample wins; month first wins ties as it does in pd.to_datetime.
+
+    --------------------
+    Parameters
+    --------------------
+    -> sample (pd.Series): Sample of non-missing text values of the column
+
+    --------------------
+    Returns
+    --------------------
+    -> (str): Best datetime format, or None if no candidate parses any value
+
+    """
+    candidates = Counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for value in sample.head(N_GUESSED_VALUES):
+            for dayfirst in (False, True):
+                date_format = guess_datetime_format(str(value), dayfirst=dayfirst)
+                if date_format is not None:
+                    candidates[date_format] += 1
+
+    best_format, best_ratio = None, 0.0
+    for date_format, _ in candidates.most_common():
+        ratio = parse_with_format(sample, date_format).notna().mean()
+        if ratio > best_ratio:
+            best_format, best_ratio = date_format, ratio
+    return best_format
+
+
+def parse_with_format(serie, date_format):
+    try:
+        parsed = pd.to_datetime(serie, format=date_format, errors="coerce")
+    except (ValueError, TypeError):
+        parsed = None
+    # Values with different time zones can't share a datetime64 column, they are left to the fallback
+    if parsed is None or not pd.api.types.is_datetime64_any_dtype(parsed):
+        return pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    return parsed
+
+
+def parse_fallback(serie):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            parsed = pd.to_datetime(serie, format="mixed", errors="coerce")
+    except (ValueError, TypeError):
+        return None
+    # Values with different time zones can't share a datetime64 column, they are left unparsed
+    if not pd.api.types.is_datetime64_any_dtype(parsed):
+        return None
+    return parsed
+
+
+def parse_datetime(serie, date_format=None, sample_size=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> parse_datetime (function): Function that converts a text column to datetime with one vectorized call using a format guessed from a sample of values.
+    Only the values that don't match the format are sent to the slow per-value parser (format='mixed'); values that neither can parse become NaT.
+
+    --------------------
+    Parameters
+    --------------------
+    -> serie (pd.Series): Text column to convert
+    -> date_format (str): Datetime format to use (default set to None, which guesses it from the sample)
+    -> sample_size (int): Maximum number of values used to guess the format (default set to config.SCHEMA_SAMPLE_ROWS)
+
+    --------------------
+    Returns
+    --------------------
+    -> (tuple): Converted pd.Series and its DateParseReport
+
+    """
+    sample_size = config.SCHEMA_SAMPLE_ROWS if sample_size is None else sample_size
+    n_values = int(serie.notna().sum())
+    if date_format is None:
+        values = serie.dropna()
+        sample = values.sample(sample_size, random_state=0) if len(values) > sample_size else values
+        date_format = guess_format(sample.astype(str))
+
+    if date_format is None:
+        parsed = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    else:
+        parsed = parse_with_format(serie, date_format)
+    n_format = int(parsed.notna().sum())
+
+    leftover = serie.notna() & parsed.isna()
+    n_fallback = 0
+    if leftover.any():
+        fallback = parse_fallback(serie[leftover].astype(str))
+        if fallback is not None and n_format == 0:
+            parsed = fallback.reindex(serie.index)
+            n_fallback = int(fallback.notna().sum())
+        elif fallback is not None and str(parsed.dt.tz) == str(fallback.dt.tz):
+            fallback = fallback.dropna()
+            parsed = parsed.copy()
+            parsed.loc[fallback.index] = fallback
+            n_fallback = len(fallback)
+
+    report = DateParseReport(serie.name, date_format, n_values, n_format, n_fallback)
+    return parsed, report
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+
+from utils import config
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+METADATA_KEY = b"csv_explorer"
+
+
+class DiskCache:
+    """
+    --------------------
+    Description
+    --------------------
+    -> DiskCache (class): Class that saves parsed dataframes on disk as uncompressed Arrow IPC (Feather v2) files, keyed by the content hash of the upload, so that later sessions can memory-map them instead of parsing the CSV again.
+    Files are evicted from the least recently used one once the total size exceeds max_bytes; reading a file marks it as used.
+
+    --------------------
+    Attributes
+    --------------------
+    -> directory (str): Folder holding the cached files
+    -> max_bytes (int): Maximum number of bytes held by all cached files together
+    -> enabled (bool): Flag stating if the cache is used, it is switched off when pyarrow is missing
+
+    """
+    def __init__(self, directory=config.DISK_CACHE_DIR, max_bytes=config.DISK_CACHE_MAX_BYTES, enabled=config.DISK_CACHE_ENABLED):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled and pa is not None
+        self._lock = threading.Lock()
+
+    def path(self, key, name):
+        return os.path.join(self.directory, f"{key}.{name}.arrow")
+
+    def get(self, key, name):
+        """
+        --------------------
+        Description
+        --------------------
+        -> get (method): Class method that memory-maps a cached dataframe; numeric columns without missing values are used without copying the file
+
+        --------------------
+        Parameters
+        --------------------
+        -> key (str): Content hash of the upload
+        -> name (str): Name of the cached item
+
+        --------------------
+        Returns
+        --------------------
+        -> (tuple): Dataframe and the metadata saved with it, or None if the item isn't cached
+
+        """
+        if not self.enabled:
+            return None
+        path = self.path(key, name)
+        try:
+            with pa.memory_map(path, "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+            os.utime(path)
+        except (OSError, pa.ArrowInvalid):
+            return None
+        metadata = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b"{}"))
+        df = table.to_pandas(split_blocks=True)
+
+        # Arrow gives None for missing strings where pd.read_csv gives NaN
+        for col_index, col_name in enumerate(table.column_names):
+            if table.column(col_index).null_count and df.dtypes.iloc[col_index] == object:
+                serie = df.iloc[:, col_index]
+                df.isetitem(col_index, serie.where(serie.notna(), np.nan))
+        return df, metadata
+
+    def put(self, key, name, df, metadata=None):
+        if not self.enabled:
+            return False
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowException, TypeError, ValueError):
+            # Columns mixing Python types can't be stored as Arrow, the dataframe just isn't cached
+            return False
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: json.dumps(metadata or {})})
+
+        # Write to a temporary file first so that a reader never maps a half-written file
+        path = self.path(key, name)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with pa.OSFile(temp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(temp_path, path)
+        except OSError:
+            self._remove(temp_path)
+            return False
+        self.evict()
+        return True
+
+    def files(self):
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".arrow"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, file_name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file_name))
+        return sorted(entries)
+
+    def evict(self):
+        with self._lock:
+            entries = self.files()
+            n_bytes = sum(size for _, size, _ in entries)
+            for _, size, file_name in entries[:-1]:
+                if n_bytes <= self.max_bytes:
+                    break
+                if self._remove(os.path.join(self.directory, file_name)):
+                    n_bytes -= size
+
+    def invalidate(self, key):
+        if not self.enabled:
+            return
+        for _, _, file_name in self.files():
+            if file_name.startswith(f"{key}."):
+                self._remove(os.path.join(self.directory, file_name))
+
+    def _remove(self, path):
+        # Files still mapped by another session can't be removed on some platforms, they are left for a later eviction
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+disk_cache = DiskCache()
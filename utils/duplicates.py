@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+from utils import config
+from utils.sketches import HyperLogLog, hash_values
+
+
+def normalize_for_hashing(df, numeric_as_float=False):
+    """
+    --------------------
+    Description
+    --------------------
+    -> normalize_for_hashing (function): Function that prepares a dataframe so that rows pandas considers duplicated get the same hash.
+    -0.0 is turned into 0.0 and, when numeric_as_float is set, integer columns are hashed as floats so that chunks inferred as int or float agree.
+
+    --------------------
+    Parameters
+    --------------------
+    -> df (pd.DataFrame): Rows to hash
+    -> numeric_as_float (bool): Flag stating if integer columns are converted to float64 (default set to False)
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): Dataframe to hash, df itself if nothing needed converting
+
+    """
+    converted = {}
+    for col_index, dtype in enumerate(df.dtypes):
+        if pd.api.types.is_float_dtype(dtype):
+            converted[col_index] = df.iloc[:, col_index] + 0.0
+        elif numeric_as_float and pd.api.types.is_integer_dtype(dtype):
+            converted[col_index] = df.iloc[:, col_index].astype("float64")
+    if not converted:
+        return df
+    df = df.copy(deep=False)
+    for col_index, serie in converted.items():
+        df.isetitem(col_index, serie)
+    return df
+
+
+class DuplicateCounter:
+    """
+    --------------------
+    Description
+    --------------------
+    -> DuplicateCounter (class): Class that counts duplicated rows from 64-bit row hashes, one chunk of rows at a time.
+    In exact mode it keeps one hash per distinct row (8 bytes each) instead of the rows themselves; two different rows share a hash with probability about n_rows ** 2 / 2 ** 65.
+    In approximate mode it keeps a HyperLogLog sketch of fixed size instead, and the count is within error_bound of the exact one with about 99.7% confidence (3 standard errors).
+
+    --------------------
+    Attributes
+    --------------------
+    -> approximate (bool): Flag stating if the number of distinct rows is estimated with a HyperLogLog sketch (default set to False)
+    -> numeric_as_float (bool): Flag stating if integer columns are hashed as floats, needed when chunks are parsed separately (default set to False)
+    -> n_rows (int): Number of rows seen so far (default set to 0)
+
+    """
+    def __init__(self, approximate=False, numeric_as_float=False, precision=14):
+        self.approximate = approximate
+        self.numeric_as_float = numeric_as_float
+        self.n_rows = 0
+        self.sketch = HyperLogLog(precision) if approximate else None
+        self._hashes = []
+        self._n_pending = 0
+        self._n_compacted = 0
+
+    def update(self, df):
+        if len(df) == 0:
+            return
+        hashes = hash_values(normalize_for_hashing(df, self.numeric_as_float))
+        self.n_rows += len(df)
+        if self.approximate:
+            self.sketch.update_hashes(hashes)
+            return
+        hashes = np.unique(hashes)
+        self._hashes.append(hashes)
+        self._n_pending += len(hashes)
+        # Merge the hashes once the pending ones outgrow the merged ones, which keeps the total work linearithmic
+        if self._n_pending > max(self._n_compacted, config.CHUNK_ROWS):
+            self._compact()
+
+    def merge(self, other):
+        # Add the rows counted by another counter, e.g. on another file of the same dataset
+        self.n_rows += other.n_rows
+        if self.approximate:
+            self.sketch.merge(other.sketch)
+            return self
+        self._hashes.extend(other._hashes)
+        self._n_pending += sum(len(hashes) for hashes in other._hashes)
+        return self
+
+    def _compact(self):
+        merged = np.unique(np.concatenate(self._hashes)) if len(self._hashes) > 1 else self._hashes[0]
+        self._hashes = [merged]
+        self._n_compacted = len(merged)
+        self._n_pending = 0
+
+    @property
+    def n_distinct(self):
+        if self.approximate:
+            return min(self.sketch.count(), self.n_rows)
+        if not self._hashes:
+            return 0
+        self._compact()
+        return self._n_compacted
+
+    @property
+    def n_bytes(self):
+        # Memory kept by the counter: the sketch registers, or 8 bytes per hash
+        if self.approximate:
+            return int(self.sketch.registers.nbytes)
+        return sum(int(hashes.nbytes) for hashes in self._hashes)
+
+    @property
+    def n_duplicates(self):
+        return self.n_rows - self.n_distinct
+
+    @property
+    def error_bound(self):
+        if not self.approximate:
+            return 0
+        return int(np.ceil(3 * self.sketch.relative_error * self.n_distinct))
+
+    def format_duplicates(self):
+        if self.approximate:
+            return f"≈ {self.n_duplicates} (± {self.error_bound})"
+        return self.n_duplicates
+
+
+def count_duplicates(df, subset=None, approximate=False, chunk_rows=None, counter=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> count_duplicates (function): Function that counts the duplicated rows of a dataframe (as df.duplicated().sum() would) by hashing it chunk by chunk, so that no full-size intermediate is built
+
+    --------------------
+    Parameters
+    --------------------
+    -> df (pd.DataFrame): Dataframe to check
+    -> subset (list): List of columns names used to compare rows (default set to None, which uses all columns)
+    -> approximate (bool): Flag stating if the count is estimated with a HyperLogLog sketch (default set to False)
+    -> chunk_rows (int): Number of rows hashed at a time (default set to config.CHUNK_ROWS)
+    -> counter (DuplicateCounter): Counter of the first rows of df, only the rows after them are hashed (default set to None, which hashes every row)
+
+    --------------------
+    Returns
+    --------------------
+    -> (DuplicateCounter): Counter holding the number of duplicated rows
+
+    """
+    chunk_rows = config.CHUNK_ROWS if chunk_rows is None else chunk_rows
+    if subset:
+        df = df[list(subset)]
+    counter = DuplicateCounter(approximate=approximate) if counter is None else counter
+    for start in range(counter.n_rows, len(df), chunk_rows):
+        counter.update(df.iloc[start:start + chunk_rows])
+    return counter
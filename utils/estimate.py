@@ -0,0 +1,151 @@
+import math
+import numbers
+from statistics import NormalDist
+
+import pandas as pd
+
+from utils import config
+from utils.store import load_sample
+
+
+class SampleEstimator:
+    """
+    --------------------
+    Description
+    --------------------
+    -> SampleEstimator (class): Class that extrapolates statistics computed on a uniform sample of rows to the whole file, with confidence intervals from the normal approximation.
+    Counts use the Wilson score interval of their share of rows, means the standard error of the sample mean and standard deviations the standard error s / sqrt(2 (n - 1)); all of them shrink with the finite population correction, down to an empty interval when the sample holds every row.
+
+    --------------------
+    Attributes
+    --------------------
+    -> n_sample (int): Number of rows in the sample
+    -> n_population (int): Number of rows in the file
+    -> confidence (float): Confidence level of the intervals (default set to config.SAMPLE_CONFIDENCE)
+    -> z (float): Quantile of the standard normal distribution matching the confidence level
+    -> fpc (float): Finite population correction applied to every standard error
+
+    """
+    def __init__(self, n_sample, n_population, confidence=None):
+        self.n_sample = n_sample
+        self.n_population = n_population
+        self.confidence = config.SAMPLE_CONFIDENCE if confidence is None else confidence
+        self.z = NormalDist().inv_cdf(0.5 + self.confidence / 2)
+        if n_population <= 1 or n_sample >= n_population:
+            self.fpc = 0.0
+        else:
+            self.fpc = math.sqrt((n_population - n_sample) / (n_population - 1))
+
+    @property
+    def is_exact(self):
+        return self.fpc == 0.0
+
+    @property
+    def interval_name(self):
+        return f"{self.confidence:.0%} Confidence Interval"
+
+    def count(self, k, units=1):
+        """
+        --------------------
+        Description
+        --------------------
+        -> count (method): Class method that extrapolates a count found in the sample (e.g. rows with missing values) to the whole file
+
+        --------------------
+        Parameters
+        --------------------
+        -> k (int): Count in the sample
+        -> units (int): Number of values counted per row, e.g. the number of columns for missing cells (default set to 1)
+
+        --------------------
+        Returns
+        --------------------
+        -> (tuple): Estimate, lower bound and upper bound of the count in the whole file
+
+        """
+        n = self.n_sample * units
+        total = self.n_population * units
+        if n == 0:
+            return 0, 0, total
+        p = k / n
+        if self.is_exact:
+            return k, k, k
+        # Wilson score interval, with the standard error shrunk by the finite population correction
+        z = self.z * self.fpc
+        center = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+        margin = z / (1 + z ** 2 / n) * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2))
+        return p * total, max(center - margin, 0.0) * total, min(center + margin, 1.0) * total
+
+    def mean(self, serie):
+        # Interval of the mean of the non-missing values
+        values = serie.dropna()
+        if len(values) < 2:
+            return None
+        mean = values.mean()
+        margin = self.z * self.fpc * values.std() / math.sqrt(len(values))
+        return mean, mean - margin, mean + margin
+
+    def std(self, serie):
+        values = serie.dropna()
+        if len(values) < 2:
+            return None
+        std = values.std()
+        margin = self.z * self.fpc * std / math.sqrt(2 * (len(values) - 1))
+        return std, max(std - margin, 0.0), std + margin
+
+    def format_interval(self, low, high, decimals=0):
+        return f"[{low:,.{decimals}f}, {high:,.{decimals}f}]"
+
+    def estimate_summary(self, summary, counts=(), intervals=None, decimals=2, labels=None):
+        """
+        --------------------
+        Description
+        --------------------
+        -> estimate_summary (method): Class method that turns a summary table computed on the sample (columns Description and Value) into estimates for the whole file, with a confidence interval column
+
+        --------------------
+        Parameters
+        --------------------
+        -> summary (pd.DataFrame): Summary table computed on the sample
+        -> counts (list): Descriptions of the rows holding counts of rows, which are extrapolated with count
+        -> intervals (dict): Descriptions of other rows mapped to their (estimate, lower bound, upper bound), e.g. from mean or std (default set to None)
+        -> decimals (int): Number of decimals of the bounds of these other rows (default set to 2)
+        -> labels (dict): Descriptions of rows mapped to the text shown instead of an interval, e.g. for values that are exact (default set to None, which shows "on the sample")
+
+        --------------------
+        Returns
+        --------------------
+        -> (pd.DataFrame): Summary table with the estimated values and the confidence intervals, rows that can't be extrapolated (e.g. unique values or minimum) keep their value on the sample
+
+        """
+        intervals = {} if intervals is None else intervals
+        labels = {} if labels is None else labels
+        values = []
+        bounds = []
+        for description, value in zip(summary["Description"], summary["Value"]):
+            if description in counts and isinstance(value, numbers.Number) and not pd.isna(value):
+                estimate, low, high = self.count(value)
+                values.append(f"{estimate:,.0f}")
+                bounds.append(self.format_interval(low, high))
+            elif intervals.get(description) is not None:
+                _, low, high = intervals[description]
+                values.append(value)
+                bounds.append(self.format_interval(low, high, decimals))
+            else:
+                values.append(value)
+                bounds.append(labels.get(description, "on the sample"))
+        return pd.DataFrame({"Description": summary["Description"], "Value": values, self.interval_name: bounds})
+
+    def estimate_frequent(self, frequent, count_col):
+        # Occurrences of the most frequent values are extrapolated, their shares are already estimates of the shares in the whole file
+        frequent = frequent.copy()
+        estimates = [self.count(k) for k in frequent[count_col]]
+        frequent[count_col] = [round(estimate) for estimate, _, _ in estimates]
+        frequent[self.interval_name] = [self.format_interval(low, high) for _, low, high in estimates]
+        return frequent
+
+
+def sample_estimator(file_path):
+    # Estimator of the sample kept for an upload in sample-first mode (see utils.store.load_sample)
+    scan = load_sample(file_path)
+    return SampleEstimator(len(scan.df), scan.n_rows)
@@ -0,0 +1,437 @@
+import copy
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils import config
+from utils.ingest import upload_size
+from utils.partitions import is_partitioned
+from utils.sketches import HyperLogLog, KLLSketch, MisraGries
+
+HASH_BLOCK_SIZE = 1024 * 1024
+# Last bytes of each remembered upload, compared before hashing a prefix so that unrelated files are rejected without reading them
+TAIL_BYTES = 256
+
+
+class AppendedUpload:
+    """
+    --------------------
+    Description
+    --------------------
+    -> AppendedUpload (class): Class that describes an upload recognized as an earlier upload followed by new rows at the end
+
+    --------------------
+    Attributes
+    --------------------
+    -> base_key (str): Content hash of the earlier upload
+    -> base_size (int): Size in bytes of the earlier upload, i.e. offset of the first new row
+
+    """
+    def __init__(self, base_key, base_size):
+        self.base_key = base_key
+        self.base_size = base_size
+
+
+class UploadHistory:
+    """
+    --------------------
+    Description
+    --------------------
+    -> UploadHistory (class): Class that remembers the size and the content hash of the uploads whose state was kept, so that a later upload starting with the same bytes is recognized as the same file with rows appended.
+    An upload is only a candidate base if it ends with a line break, otherwise its last row could go on in the new upload.
+
+    --------------------
+    Attributes
+    --------------------
+    -> max_uploads (int): Number of uploads remembered, the least recently used ones are forgotten first (default set to config.INCREMENTAL_MAX_UPLOADS)
+    -> uploads (OrderedDict): Size in bytes and last bytes of each remembered upload, keyed by content hash
+    -> bases (dict): Earlier upload found for each upload looked up, so that the prefix is only hashed once per upload
+
+    """
+    def __init__(self, max_uploads=config.INCREMENTAL_MAX_UPLOADS):
+        self.max_uploads = max_uploads
+        self.uploads = OrderedDict()
+        self.bases = {}
+        self._lock = threading.Lock()
+
+    def remember(self, file_path, key):
+        if is_partitioned(file_path):
+            return
+        tail = read_range(file_path, -TAIL_BYTES, None)
+        if not tail.endswith(b"\n"):
+            return
+        with self._lock:
+            if key not in self.uploads:
+                # A newly remembered upload may be the base of uploads already looked up
+                self.bases = {upload_key: base for upload_key, base in self.bases.items() if base is not None}
+            self.uploads[key] = (upload_size(file_path), tail)
+            self.uploads.move_to_end(key)
+            while len(self.uploads) > self.max_uploads:
+                self.uploads.popitem(last=False)
+
+    def forget(self, key):
+        with self._lock:
+            self.uploads.pop(key, None)
+            self.bases.pop(key, None)
+
+    def base_of(self, key):
+        # Earlier upload already found by find_base for this upload, without reading it again (None if it wasn't looked up)
+        with self._lock:
+            return self.bases.get(key)
+
+    def find_base(self, file_path, key):
+        """
+        --------------------
+        Description
+        --------------------
+        -> find_base (method): Class method that looks for the largest remembered upload the given upload starts with, hashing the shared prefix once for all the candidates
+
+        --------------------
+        Parameters
+        --------------------
+        -> file_path (str or file-like): Uploaded file or path to the CSV file
+        -> key (str): Content hash of the upload
+
+        --------------------
+        Returns
+        --------------------
+        -> (AppendedUpload): Earlier upload and offset of the new rows, None if the upload doesn't extend any remembered one
+
+        """
+        if is_partitioned(file_path):
+            return None
+        with self._lock:
+            if key in self.bases:
+                return self.bases[key]
+            uploads = list(self.uploads.items())
+        size = upload_size(file_path)
+        candidates = sorted(
+            (base_size, base_key) for base_key, (base_size, tail) in uploads
+            if base_size < size and base_key != key and read_range(file_path, base_size - len(tail), base_size) == tail
+        )
+        found = None
+        digest = hashlib.blake2b(digest_size=16)
+        position = 0
+        for base_size, base_key in candidates:
+            for start in range(position, base_size, HASH_BLOCK_SIZE):
+                digest.update(read_range(file_path, start, min(start + HASH_BLOCK_SIZE, base_size)))
+            position = base_size
+            # The digest of the prefix is the one hash_upload gives the earlier upload
+            if digest.copy().hexdigest() == base_key:
+                found = AppendedUpload(base_key, base_size)
+        with self._lock:
+            self.bases[key] = found
+            while len(self.bases) > self.max_uploads:
+                self.bases.pop(next(iter(self.bases)))
+        return found
+
+
+upload_history = UploadHistory()
+
+
+def read_range(file_path, start, end):
+    # Bytes of an upload between two offsets (a negative start counts from the end), without moving the read position of in-memory uploads
+    size = upload_size(file_path)
+    start = max(size + start, 0) if start < 0 else start
+    end = size if end is None else end
+    if hasattr(file_path, "getbuffer"):
+        with file_path.getbuffer() as buffer:
+            return bytes(buffer[start:end])
+    if hasattr(file_path, "getvalue"):
+        return file_path.getvalue()[start:end]
+    if hasattr(file_path, "read"):
+        position = file_path.tell()
+        file_path.seek(start)
+        block = file_path.read(end - start)
+        file_path.seek(position)
+        return block if isinstance(block, bytes) else block.encode()
+    with open(file_path, "rb") as handle:
+        handle.seek(start)
+        return handle.read(end - start)
+
+
+def open_appended(file_path, appended):
+    # Only the new rows, as a file-like object without header (columns names are given when parsing them)
+    return io.BytesIO(read_range(file_path, appended.base_size, None))
+
+
+def appended_read_options(columns, dtypes):
+    """
+    --------------------
+    Description
+    --------------------
+    -> appended_read_options (function): Function that gives the pd.read_csv arguments parsing the new rows of an upload the way they were parsed with the earlier rows: same columns names and text columns kept as text, so that "01" stays "01" in a column of strings
+
+    --------------------
+    Parameters
+    --------------------
+    -> columns (list): List of the columns names of the earlier upload
+    -> dtypes (dict or pd.Series): Data type of each column of the earlier upload
+
+    --------------------
+    Returns
+    --------------------
+    -> (dict): Arguments for pd.read_csv
+
+    """
+    text_cols = {col: str for col in columns if dtypes[col] == object}
+    return {"header": None, "names": list(columns), "dtype": text_cols or None}
+
+
+def dtype_kind(dtype):
+    # Integers and floats hash the same once integers are hashed as floats, any other change of data type changes the hashes of the values
+    return "number" if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) else str(dtype)
+
+
+def load_incremental(file_path, key, name, compute, extend, store, n_bytes=lambda state: 0):
+    """
+    --------------------
+    Description
+    --------------------
+    -> load_incremental (function): Function that returns a state derived from an upload (aggregates, counters...) kept in the store, extending the state of the earlier upload when this one is the same file with rows appended instead of computing it from scratch
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+    -> key (str): Content hash of the upload
+    -> name (hashable): Name of the state in the store, which must change whenever the settings it depends on do
+    -> compute (callable): Function computing the state of the whole upload
+    -> extend (callable): Function called with a copy of the state of the earlier upload and the AppendedUpload, returning the state of the whole upload (None if it can't be extended, it is then computed)
+    -> store (DatasetStore): Store keeping the states
+    -> n_bytes (callable): Function giving the memory usage of a state, used to bound the store (default set to 0 bytes)
+
+    --------------------
+    Returns
+    --------------------
+    -> (object): State of the upload
+
+    """
+    state = store.get(key, name)
+    if state is not None:
+        return state
+    if config.INCREMENTAL:
+        appended = upload_history.find_base(file_path, key)
+        base_state = None if appended is None else store.get(appended.base_key, name)
+        if base_state is not None:
+            state = extend(copy.deepcopy(base_state), appended)
+    if state is None:
+        state = compute()
+    upload_history.remember(file_path, key)
+    return store.put(key, name, state, n_bytes(state))
+
+
+def extend_dataframe(file_path, appended, base_df):
+    """
+    --------------------
+    Description
+    --------------------
+    -> extend_dataframe (function): Function that parses only the new rows of an upload and adds them after the dataframe of the earlier upload
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+    -> appended (AppendedUpload): Earlier upload the file extends
+    -> base_df (pd.DataFrame): Parsed dataframe of the earlier upload
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): Parsed dataframe of the whole upload, None if a column of numbers of the earlier upload gets text in the new rows (pd.read_csv would then have kept every value of the column as text, which can't be recovered from the parsed numbers)
+
+    """
+    try:
+        new_rows = pd.read_csv(open_appended(file_path, appended), low_memory=False, **appended_read_options(base_df.columns, base_df.dtypes))
+    except pd.errors.EmptyDataError:
+        return base_df
+    for col in base_df.columns:
+        if base_df[col].dtype == object or new_rows[col].dtype != object:
+            continue
+        # True and False stay booleans in a column of booleans with missing values, any other value means the column is text
+        values = new_rows[col].dropna()
+        if not (pd.api.types.is_bool_dtype(base_df[col].dtype) and values.map(type).eq(bool).all()):
+            return None
+    return pd.concat([base_df, new_rows], ignore_index=True)
+
+
+def merge_counts(counts, other):
+    # Values already counted keep their place, values seen for the first time are added after them in order of appearance
+    positions = counts.index.get_indexer(other.index)
+    known = positions >= 0
+    totals = counts.to_numpy().copy()
+    np.add.at(totals, positions[known], other.to_numpy()[known])
+    return pd.concat([pd.Series(totals, index=counts.index, name=counts.name), other[~known]])
+
+
+class ColumnState:
+    """
+    --------------------
+    Description
+    --------------------
+    -> ColumnState (class): Class that holds the statistics of a column that can be carried on when rows are added to it: counts, extremes, sum and sum of squared deviations, count of each value, additive counters and, in approximate mode, the sketches of the distinct values, of the quantiles and of the most frequent values.
+    In approximate mode values are never counted exactly and rows are added config.CHUNK_ROWS at a time, so the memory used depends on the size of the sketches, not on the number of rows or distinct values.
+    Updating it with the new rows of an upload gives the state of the whole column, so only the statistics that need every value at once (exact median, histogram edges) are computed on the whole column again.
+
+    --------------------
+    Attributes
+    --------------------
+    -> n_rows (int): Number of rows seen so far, missing values included (default set to 0)
+    -> n_missing (int): Number of missing values seen so far (default set to 0)
+    -> count_values (bool): Flag stating if the count of each value is kept, only for the columns whose profile reads it and never in approximate mode (default set to True)
+    -> value_counts (pd.Series): Count of each non-missing value, in order of first appearance, None when values aren't counted (default set to None)
+    -> col_min (object): Smallest non-missing value of a numeric or datetime column (default set to None)
+    -> col_max (object): Largest non-missing value of a numeric or datetime column (default set to None)
+    -> col_sum (float): Sum of the values of a numeric column (default set to 0)
+    -> m2 (float): Sum of squared deviations from the mean of a numeric column, merged with Chan's formula so that the standard deviation keeps its precision (default set to 0)
+    -> counts (dict): Counters returned by the counts function given to update, added up over the rows (default set to empty)
+    -> distinct (HyperLogLog): Sketch of the distinct values, only kept in approximate mode (default set to None)
+    -> quantiles (KLLSketch): Sketch of the values of a numeric column, only kept in approximate mode (default set to None)
+    -> heavy_hitters (MisraGries): Summary of the most frequent values, kept in approximate mode instead of value_counts (default set to None)
+
+    """
+    def __init__(self, approximate=False, count_values=True):
+        self.count_values = count_values and not approximate
+        self.n_rows = 0
+        self.n_missing = 0
+        self.value_counts = None
+        self.col_min = None
+        self.col_max = None
+        self.col_sum = 0.0
+        self.m2 = 0.0
+        self.counts = {}
+        self.distinct = HyperLogLog(config.SKETCH_PRECISION) if approximate else None
+        self.quantiles = KLLSketch(config.SKETCH_K) if approximate else None
+        self.heavy_hitters = MisraGries(config.HEAVY_HITTERS_CAPACITY) if approximate else None
+
+    @property
+    def n_values(self):
+        return self.n_rows - self.n_missing
+
+    @property
+    def std(self):
+        # Same formula as pandas: sum of squared deviations from the mean divided by n - 1
+        return np.sqrt(self.m2 / (self.n_values - 1)) if self.n_values > 1 else np.nan
+
+    @property
+    def n_bytes(self):
+        n_bytes = 0 if self.value_counts is None else int(self.value_counts.memory_usage(deep=True))
+        if self.distinct is not None:
+            n_bytes += self.distinct.registers.nbytes + int(self.heavy_hitters.counters.memory_usage(deep=True))
+        if self.quantiles is not None:
+            n_bytes += sum(level.nbytes for level in self.quantiles.levels)
+        return n_bytes
+
+    def update(self, piece, counts=None):
+        """
+        --------------------
+        Description
+        --------------------
+        -> update (method): Class method that adds rows to the state, the new rows of an upload or every row of a column
+
+        --------------------
+        Parameters
+        --------------------
+        -> piece (pd.Series): Rows to add
+        -> counts (callable): Function returning a dictionary of counters of a serie that add up over its rows (default set to None)
+
+        --------------------
+        Returns
+        --------------------
+        -> (ColumnState): The state itself
+
+        """
+        if self.heavy_hitters is not None and len(piece) > config.CHUNK_ROWS:
+            for start in range(0, len(piece), config.CHUNK_ROWS):
+                self.update(piece.iloc[start:start + config.CHUNK_ROWS], counts)
+            return self
+        n_before = self.n_values
+        n_missing = int(piece.isna().sum())
+        self.n_rows += len(piece)
+        self.n_missing += n_missing
+        if self.count_values:
+            # Categorical columns count every category, even the ones absent from the rows
+            piece_counts = piece.value_counts(sort=False)
+            piece_counts = piece_counts[piece_counts > 0]
+            self.value_counts = piece_counts if self.value_counts is None else merge_counts(self.value_counts, piece_counts)
+        if counts is not None:
+            for name, count in counts(piece).items():
+                self.counts[name] = self.counts.get(name, 0) + count
+        if n_missing == len(piece):
+            return self
+
+        dtype = piece.dtype
+        is_number = pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+        if self.distinct is None and not is_number and not pd.api.types.is_datetime64_any_dtype(dtype):
+            return self
+        # Rows are only copied without their missing values when a statistic goes over them
+        values = piece.dropna() if n_missing else piece
+        if self.distinct is not None:
+            self.distinct.update(values)
+            self.heavy_hitters.update(values)
+        if is_number:
+            array = values.to_numpy(dtype=np.float64)
+            piece_sum = array.sum()
+            piece_mean = piece_sum / len(array)
+            scratch = np.subtract(array, piece_mean)
+            np.square(scratch, out=scratch)
+            piece_m2 = scratch.sum()
+            if n_before:
+                delta = piece_mean - self.col_sum / n_before
+                piece_m2 += delta * delta * n_before * len(array) / (n_before + len(array))
+            self.m2 += piece_m2
+            self.col_sum += piece_sum
+            if self.quantiles is not None:
+                self.quantiles.update(array)
+        elif not pd.api.types.is_datetime64_any_dtype(dtype):
+            return self
+        piece_min, piece_max = values.min(), values.max()
+        self.col_min = piece_min if self.col_min is None else min(self.col_min, piece_min)
+        self.col_max = piece_max if self.col_max is None else max(self.col_max, piece_max)
+        return self
+
+
+def load_column_state(key, name, serie, store, counts=None, approximate=False, count_values=True, from_scratch=True):
+    """
+    --------------------
+    Description
+    --------------------
+    -> load_column_state (function): Function that returns the ColumnState of a column of an upload kept in the store, updating a copy of the state of the earlier upload with the new rows only when this one is the same file with rows appended
+
+    --------------------
+    Parameters
+    --------------------
+    -> key (str): Content hash of the upload, None for columns that don't come from an upload (the state is then computed and not kept)
+    -> name (hashable): Name of the state in the store, which must change with the data type of the column and the settings it depends on
+    -> serie (pd.Series): Whole column
+    -> store (DatasetStore): Store keeping the states
+    -> counts (callable): Function returning a dictionary of counters of a serie that add up over its rows (default set to None)
+    -> approximate (bool): Flag stating if the sketches of the distinct values, of the quantiles and of the most frequent values are kept instead of the count of each value (default set to False)
+    -> count_values (bool): Flag stating if the count of each value is kept (default set to True)
+    -> from_scratch (bool): Flag stating if the state is computed when neither this upload nor the earlier one has it kept, otherwise None is returned and the caller computes its statistics its own way (default set to True)
+
+    --------------------
+    Returns
+    --------------------
+    -> (ColumnState): State of the whole column, None if it would be computed from scratch and from_scratch is False
+
+    """
+    if key is None:
+        return ColumnState(approximate, count_values).update(serie, counts) if from_scratch else None
+    state = store.get(key, name)
+    if state is not None:
+        return state
+    # The earlier upload was looked up when the dataframe was parsed, its rows are the first ones of the column
+    appended = upload_history.base_of(key) if config.INCREMENTAL else None
+    base_state = None if appended is None else store.get(appended.base_key, name)
+    if base_state is not None and base_state.n_rows <= len(serie):
+        state = copy.deepcopy(base_state).update(serie.iloc[base_state.n_rows:], counts)
+    elif from_scratch:
+        state = ColumnState(approximate, count_values).update(serie, counts)
+    else:
+        return None
+    return store.put(key, name, state, state.n_bytes)
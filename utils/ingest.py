@@ -0,0 +1,266 @@
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils import config
+from utils.partitions import is_partitioned
+
+
+def upload_size(file_path):
+    """
+    --------------------
+    Description
+    --------------------
+    -> upload_size (function): Function that returns the size in bytes of an uploaded file, a file-like object or a path on disk without reading it
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+
+    --------------------
+    Returns
+    --------------------
+    -> (int): Size of the file in bytes
+
+    """
+    if hasattr(file_path, "size") and isinstance(file_path.size, int):
+        return file_path.size
+    if hasattr(file_path, "seek"):
+        position = file_path.tell()
+        size = file_path.seek(0, os.SEEK_END)
+        file_path.seek(position)
+        return size
+    return os.path.getsize(file_path)
+
+
+def upload_columns(file_path):
+    # Columns names of the header, read without parsing the rows (the union of the headers for a PartitionedUpload)
+    if is_partitioned(file_path):
+        return file_path.columns
+    if hasattr(file_path, "seek"):
+        file_path.seek(0)
+    try:
+        return pd.read_csv(file_path, nrows=0).columns.tolist()
+    except pd.errors.EmptyDataError:
+        return []
+
+
+def use_chunked_mode(file_path, threshold=None):
+    threshold = config.CHUNKED_THRESHOLD_BYTES if threshold is None else threshold
+    return upload_size(file_path) > threshold
+
+
+def iter_csv_chunks(file_path, chunk_rows=None, **kwargs):
+    """
+    --------------------
+    Description
+    --------------------
+    -> iter_csv_chunks (function): Function that reads a CSV file chunk by chunk so that only one chunk is held in memory at a time.
+    The index of each chunk carries on from the previous one, so it matches the row numbers of the whole file.
+    The files of a PartitionedUpload are read one after the other, their chunks having the columns of all the files (missing ones filled with NaN).
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str, file-like or PartitionedUpload): Uploaded file or path to the CSV file
+    -> chunk_rows (int): Number of rows per chunk (default set to config.CHUNK_ROWS)
+    -> **kwargs: Extra arguments passed on to pd.read_csv (usecols must be a list of columns names)
+
+    --------------------
+    Returns
+    --------------------
+    -> (generator): Generator of pd.DataFrame chunks
+
+    """
+    chunk_rows = config.CHUNK_ROWS if chunk_rows is None else chunk_rows
+    if is_partitioned(file_path):
+        yield from iter_partition_chunks(file_path, chunk_rows, **kwargs)
+        return
+    if hasattr(file_path, "seek"):
+        file_path.seek(0)
+    try:
+        with pd.read_csv(file_path, chunksize=chunk_rows, **kwargs) as reader:
+            for chunk in reader:
+                yield chunk
+    except pd.errors.EmptyDataError:
+        return
+
+
+def iter_partition_chunks(upload, chunk_rows, usecols=None, **kwargs):
+    # Chunks of the files one after the other, with the columns of all the files and row numbers carrying on from one file to the next
+    columns = upload.columns if usecols is None else list(usecols)
+    n_rows = 0
+    for part, part_columns in zip(upload.open_parts(), upload.part_columns):
+        if not part_columns:
+            continue
+        # Only the requested columns the file has are read (its first one if it has none of them, to keep its rows), the others are added empty
+        part_usecols = None if usecols is None else [col for col in columns if col in part_columns] or part_columns[:1]
+        part_rows = 0
+        for chunk in iter_csv_chunks(part, chunk_rows, usecols=part_usecols, **kwargs):
+            part_rows += len(chunk)
+            if chunk.columns.tolist() != columns:
+                chunk = chunk.reindex(columns=columns)
+            chunk.index = chunk.index + n_rows
+            yield chunk
+        n_rows += part_rows
+
+
+def merge_dtypes(left, right):
+    """
+    --------------------
+    Description
+    --------------------
+    -> merge_dtypes (function): Function that combines the data types inferred on two chunks of the same column into the data type pandas would have inferred on the whole column
+
+    --------------------
+    Parameters
+    --------------------
+    -> left (np.dtype): Data type of the column so far (None for the first chunk)
+    -> right (np.dtype): Data type of the column in the new chunk
+
+    --------------------
+    Returns
+    --------------------
+    -> (np.dtype): Combined data type
+
+    """
+    if left is None or left == right:
+        return right
+    is_number = pd.api.types.is_numeric_dtype
+    is_bool = pd.api.types.is_bool_dtype
+    if is_number(left) and is_number(right) and not is_bool(left) and not is_bool(right):
+        return np.dtype("float64")
+    return np.dtype("object")
+
+
+class ReservoirSample:
+    """
+    --------------------
+    Description
+    --------------------
+    -> ReservoirSample (class): Class that keeps a uniform random sample of fixed size of the rows of a stream of chunks (reservoir sampling, Algorithm R applied one chunk at a time)
+
+    --------------------
+    Attributes
+    --------------------
+    -> size (int): Maximum number of rows kept in the sample
+    -> n_seen (int): Number of rows seen so far (default set to 0)
+    -> df (pd.DataFrame): Rows currently in the sample, indexed by their row number in the stream (default set to None)
+
+    """
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.n_seen = 0
+        self.df = None
+        self._slots = np.empty(0, dtype=np.int64)
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk):
+        positions = np.arange(self.n_seen, self.n_seen + len(chunk))
+        self.n_seen += len(chunk)
+
+        # Row i takes slot i while the reservoir fills up, then a random slot j <= i that is kept only if j < size
+        slots = positions.copy()
+        full = positions >= self.size
+        slots[full] = self._rng.integers(0, positions[full] + 1)
+        keep = np.flatnonzero(slots < self.size)
+        if len(keep) == 0:
+            return
+
+        # When a slot is hit several times in the same chunk, the last row wins as it would row by row
+        kept_slots = slots[keep][::-1]
+        _, last = np.unique(kept_slots, return_index=True)
+        keep = keep[::-1][last]
+        new_slots = slots[keep]
+
+        new_rows = chunk.iloc[keep]
+        if self.df is None:
+            self.df, self._slots = new_rows, new_slots
+        else:
+            survivors = ~np.isin(self._slots, new_slots)
+            self.df = pd.concat([self.df[survivors], new_rows])
+            self._slots = np.concatenate([self._slots[survivors], new_slots])
+
+    def merge(self, other):
+        # Sample of the rows of both streams, other's stream following this one: a uniform subsample of each sample, of sizes drawn as a uniform sample of the union would split
+        if other.df is None:
+            self.n_seen += other.n_seen
+            return self
+        other_df = other.df.set_axis(other.df.index + self.n_seen)
+        if self.df is None:
+            self.df, self._slots, self.n_seen = other_df, np.arange(len(other_df)), self.n_seen + other.n_seen
+            return self
+        size = min(self.size, self.n_seen + other.n_seen)
+        n_other = self._rng.hypergeometric(other.n_seen, self.n_seen, size)
+        self.df = pd.concat([self.df.sample(size - n_other, random_state=self._rng), other_df.sample(n_other, random_state=self._rng)])
+        self._slots = np.arange(len(self.df))
+        self.n_seen += other.n_seen
+        return self
+
+    def get_sample(self, n=None):
+        if self.df is None:
+            return None
+        if n is None or n >= len(self.df):
+            return self.df.sort_index()
+        return self.df.sample(n)
+
+
+class SampleScan:
+    """
+    --------------------
+    Description
+    --------------------
+    -> SampleScan (class): Class that streams a CSV file chunk by chunk once and keeps what the sample-first mode needs: a uniform sample of the rows, the first and last rows, the exact number of rows and the data type of each column
+
+    --------------------
+    Attributes
+    --------------------
+    -> reservoir (ReservoirSample): Uniform sample of the rows of the file
+    -> head_df (pd.DataFrame): First rows of the file (default set to None)
+    -> tail_df (pd.DataFrame): Last rows of the file (default set to None)
+    -> n_rows (int): Number of rows of the file (default set to 0)
+    -> cols_list (list): List of columns names of the file (default set to empty list)
+    -> dtypes (dict): Data type of each column, as pd.read_csv would infer it on the whole file (default set to empty dict)
+    -> preview_rows (int): Number of rows kept for the head and the tail
+
+    """
+    def __init__(self, sample_rows, preview_rows, seed=None):
+        self.reservoir = ReservoirSample(sample_rows, seed)
+        self.preview_rows = preview_rows
+        self.head_df = None
+        self.tail_df = None
+        self.n_rows = 0
+        self.cols_list = []
+        self.dtypes = {}
+
+    def update(self, chunk):
+        if self.head_df is None:
+            self.head_df = chunk.head(self.preview_rows)
+            self.cols_list = chunk.columns.tolist()
+        self.tail_df = pd.concat([self.tail_df, chunk.tail(self.preview_rows)]).tail(self.preview_rows)
+        self.reservoir.update(chunk)
+        self.n_rows += len(chunk)
+        for col in chunk.columns:
+            self.dtypes[col] = merge_dtypes(self.dtypes.get(col), chunk[col].dtype)
+
+    @functools.cached_property
+    def df(self):
+        # Sampled rows in file order, with columns of mixed chunks cast to the data type of the whole file (computed once the file has been streamed)
+        sample = self.reservoir.get_sample()
+        if sample is None:
+            return pd.DataFrame(columns=self.cols_list)
+        mixed = {col: dtype for col, dtype in self.dtypes.items() if sample[col].dtype != dtype}
+        return sample.astype(mixed) if mixed else sample
+
+
+def scan_sample(file_path, sample_rows=None, preview_rows=None, chunk_rows=None):
+    # Stream the whole file once, only one chunk and the sample are held in memory
+    sample_rows = config.SAMPLE_ROWS if sample_rows is None else sample_rows
+    preview_rows = config.CHUNKED_PREVIEW_ROWS if preview_rows is None else preview_rows
+    scan = SampleScan(sample_rows, preview_rows)
+    for chunk in iter_csv_chunks(file_path, chunk_rows):
+        scan.update(chunk)
+    return scan
@@ -0,0 +1,225 @@
+import contextlib
+import contextvars
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import pandas as pd
+
+from utils import config
+
+
+class Instrumentation:
+    """
+    --------------------
+    Description
+    --------------------
+    -> Instrumentation (class): Class that records the wall time, the number of rows processed and the bytes allocated by each instrumented call (see instrumented).
+    Allocated bytes are the peak of the memory traced by tracemalloc during the call, above what was allocated when it started; tracemalloc only runs while the instrumentation is enabled, it also sees the allocations of other threads running at the same time and slows down steps that allocate a lot, so times are closer to the real ones with trace_memory off.
+    When it is disabled, an instrumented call only costs one attribute check.
+    The shared instance is switched by config.INSTRUMENT for the whole process (CLI, benchmarks, app start-up); an app session records its own calls in its own instance (see recording), which never starts tracemalloc so that one session can't slow down the others.
+
+    --------------------
+    Attributes
+    --------------------
+    -> enabled (bool): Flag stating if calls are recorded (default set to config.INSTRUMENT)
+    -> trace_memory (bool): Flag stating if allocated bytes are measured, they are recorded as None otherwise (default set to config.INSTRUMENT_MEMORY)
+    -> records (deque): Last max_records calls recorded, as dictionaries
+    -> max_records (int): Maximum number of calls kept (default set to config.INSTRUMENT_MAX_RECORDS)
+
+    """
+    def __init__(self, enabled=config.INSTRUMENT, trace_memory=config.INSTRUMENT_MEMORY, max_records=config.INSTRUMENT_MAX_RECORDS):
+        self.enabled = False
+        self.trace_memory = trace_memory
+        self.max_records = max_records
+        self.records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracing = False
+        self.set_enabled(enabled)
+
+    def set_enabled(self, enabled):
+        if enabled == self.enabled:
+            return
+        # tracemalloc is only stopped if it was started here (e.g. not when a benchmark traces memory)
+        if enabled and self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        elif not enabled and self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.enabled = enabled
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+    def call(self, name, function, args, kwargs):
+        """
+        --------------------
+        Description
+        --------------------
+        -> call (method): Class method that runs an instrumented function and records it.
+        Nested instrumented calls are recorded separately, and the peak memory of an inner call is also counted in the calls around it.
+
+        --------------------
+        Parameters
+        --------------------
+        -> name (str): Name under which the call is recorded (e.g. "NumericColumn.set_histogram")
+        -> function (callable): Function to run
+        -> args (tuple): Positional arguments of the function
+        -> kwargs (dict): Keyword arguments of the function
+
+        --------------------
+        Returns
+        --------------------
+        -> (object): Result of the function
+
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # The peak counter is reset for this call, the caller keeps the peak it reached so far
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+        frame = {"start": current if tracing else 0, "peak": current if tracing else 0}
+        stack.append(frame)
+
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            if tracing and tracemalloc.is_tracing():
+                frame["peak"] = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                if stack:
+                    stack[-1]["peak"] = max(stack[-1]["peak"], frame["peak"])
+
+        with self._lock:
+            self.records.append({
+                "name": name,
+                "seconds": seconds,
+                "rows": count_rows(args, result),
+                "allocated_bytes": frame["peak"] - frame["start"] if tracing else None,
+                "thread": threading.current_thread().name,
+                "time": time.time()
+            })
+        return result
+
+    def to_frame(self):
+        with self._lock:
+            return pd.DataFrame(list(self.records), columns=["name", "seconds", "rows", "allocated_bytes", "thread", "time"])
+
+    def summary(self):
+        # One row per instrumented function, the slowest first
+        df = self.to_frame()
+        summary = df.groupby("name").agg(
+            calls=("seconds", "size"),
+            total_seconds=("seconds", "sum"),
+            max_seconds=("seconds", "max"),
+            max_rows=("rows", "max"),
+            max_allocated_bytes=("allocated_bytes", "max")
+        )
+        return summary.sort_values("total_seconds", ascending=False).reset_index()
+
+    def to_json(self):
+        with self._lock:
+            return json.dumps(list(self.records), indent=1)
+
+
+def count_rows(args, result):
+    # Rows processed: the serie or dataframe of the object the method belongs to, otherwise the dataframe passed or returned
+    candidates = []
+    if args:
+        candidates += [getattr(args[0], "serie", None), getattr(args[0], "df", None), args[0]]
+    candidates.append(result)
+    for candidate in candidates:
+        if isinstance(candidate, (pd.Series, pd.DataFrame)):
+            return len(candidate)
+    return None
+
+
+instrumentation = Instrumentation()
+# Instrumentation of the session whose script runs in the current context (see recording), None outside of a session
+_session_instrumentation = contextvars.ContextVar("session_instrumentation", default=None)
+
+
+def active_instrumentation():
+    # Calls are recorded by the instrumentation of the current session if there is one, by the shared one otherwise
+    session_instrumentation = _session_instrumentation.get()
+    return instrumentation if session_instrumentation is None else session_instrumentation
+
+
+@contextlib.contextmanager
+def recording(session_instrumentation):
+    """
+    --------------------
+    Description
+    --------------------
+    -> recording (function): Context manager under which instrumented calls are recorded by the instrumentation of one session instead of the shared one, so that each session of the app switches recording and keeps records on its own.
+    Calls made by other threads (e.g. background profiling) are not part of the session and go to the shared instrumentation.
+
+    --------------------
+    Parameters
+    --------------------
+    -> session_instrumentation (Instrumentation): Instrumentation of the session, created with trace_memory=False (memory is then only measured while the shared instrumentation traces it)
+
+    --------------------
+    Returns
+    --------------------
+    -> (Instrumentation): Instrumentation of the session
+
+    """
+    token = _session_instrumentation.set(session_instrumentation)
+    try:
+        yield session_instrumentation
+    finally:
+        _session_instrumentation.reset(token)
+
+
+def instrumented(function=None, name=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> instrumented (function): Decorator that records every call of a function or method with the instrumentation of the current session, or the shared one outside of a session (see Instrumentation and recording)
+
+    --------------------
+    Parameters
+    --------------------
+    -> function (callable): Function to instrument
+    -> name (str): Name under which the calls are recorded (default set to the qualified name of the function)
+
+    --------------------
+    Returns
+    --------------------
+    -> (callable): Instrumented function
+
+    """
+    if function is None:
+        return functools.partial(instrumented, name=name)
+    name = function.__qualname__ if name is None else name
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        active = active_instrumentation()
+        if not active.enabled:
+            return function(*args, **kwargs)
+        return active.call(name, function, args, kwargs)
+    return wrapper
+
+
+def instrument_methods(cls):
+    # Class decorator: instruments every set_* and find_* method of the class
+    for attr_name, value in list(vars(cls).items()):
+        if callable(value) and (attr_name.startswith("set_") or attr_name.startswith("find_")):
+            setattr(cls, attr_name, instrumented(value, name=f"{cls.__name__}.{attr_name}"))
+    return cls
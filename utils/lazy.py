@@ -0,0 +1,55 @@
+import copy
+
+
+class memoized_stat:
+    """
+    --------------------
+    Description
+    --------------------
+    -> memoized_stat (class): Descriptor that turns an attribute filled by a set_* method into a statistic computed on first access.
+    Reading the attribute calls the setter once, which stores the value on the instance, and later reads return the stored value without calling it again.
+    Setters may fill several memoized attributes at once (e.g. a dataframe and a flag derived from it), and assigning the attribute directly skips the setter.
+
+    --------------------
+    Attributes
+    --------------------
+    -> setter (str): Name of the method that computes the statistic and assigns it to the attribute
+    -> default (object): Value returned when the setter leaves the attribute unset, for instance when no serie is loaded (default set to None)
+    -> name (str): Name of the attribute, set when the class is created
+
+    """
+    def __init__(self, setter, default=None):
+        self.setter = setter
+        self.default = default
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        values = instance.__dict__
+        if self.name not in values:
+            getattr(instance, self.setter)()
+        if self.name not in values:
+            # Mutable defaults (empty charts, empty dataframes) are copied so that instances don't share them
+            values[self.name] = copy.copy(self.default)
+        return values[self.name]
+
+
+def reset_stats(instance):
+    # Forget every memoized statistic of an instance, so that they are computed again on the next access (e.g. for a new column)
+    for cls in type(instance).__mro__:
+        for name, value in vars(cls).items():
+            if isinstance(value, memoized_stat):
+                instance.__dict__.pop(name, None)
+
+
+def compute_stats(instance):
+    # Compute every memoized statistic of an instance now, e.g. in a background task, so that reading them later is instant
+    for cls in type(instance).__mro__:
+        for name, value in vars(cls).items():
+            if isinstance(value, memoized_stat):
+                getattr(instance, name)
+    return instance
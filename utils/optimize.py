@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+from utils import config
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def is_string_column(serie):
+    # Only object columns holding nothing but strings (and missing values) are re-encoded
+    if not pd.api.types.is_object_dtype(serie.dtype):
+        return False
+    return pd.api.types.infer_dtype(serie, skipna=True) in ("string", "empty")
+
+
+def downcast_float(serie):
+    # Floats are only stored on 32 bits when every value survives the round trip, so that statistics don't move
+    if serie.dtype != np.float64:
+        return serie
+    values = serie.to_numpy()
+    downcast = values.astype(np.float32)
+    with np.errstate(over="ignore", invalid="ignore"):
+        is_exact = np.array_equal(downcast.astype(np.float64), values, equal_nan=True)
+    return serie.astype(np.float32) if is_exact else serie
+
+
+def optimize_column(serie, category_ratio=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> optimize_column (function): Function that stores a column with a smaller data type holding exactly the same values.
+    Integers are downcast to the smallest integer type, floats to float32 when no value changes, string columns with few distinct values become categorical and the other string columns become Arrow strings (when pyarrow is available).
+
+    --------------------
+    Parameters
+    --------------------
+    -> serie (pd.Series): Column to convert, it is not modified
+    -> category_ratio (float): Largest share of distinct values for a string column to be converted to category (default set to config.CATEGORY_MAX_RATIO)
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.Series): Converted column, or the column itself if no smaller type fits
+
+    """
+    category_ratio = config.CATEGORY_MAX_RATIO if category_ratio is None else category_ratio
+    dtype = serie.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return serie
+    if pd.api.types.is_integer_dtype(dtype):
+        return pd.to_numeric(serie, downcast="integer")
+    if pd.api.types.is_float_dtype(dtype):
+        return downcast_float(serie)
+    if not is_string_column(serie):
+        return serie
+
+    n_values = int(serie.notna().sum())
+    if n_values == 0:
+        return serie
+    if serie.nunique() <= category_ratio * n_values:
+        return serie.astype("category")
+    if pyarrow is not None:
+        return serie.astype("string[pyarrow]")
+    return serie
+
+
+def optimize_dataframe(df, category_ratio=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> optimize_dataframe (function): Function that converts every column of a dataframe with optimize_column to reduce its memory usage
+
+    --------------------
+    Parameters
+    --------------------
+    -> df (pd.DataFrame): Dataframe to convert, it is not modified
+    -> category_ratio (float): Largest share of distinct values for a string column to be converted to category (default set to config.CATEGORY_MAX_RATIO)
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): Converted dataframe, columns that kept their type are shared with df
+
+    """
+    optimized = df.copy(deep=False)
+    for col_index in range(df.shape[1]):
+        serie = df.iloc[:, col_index]
+        converted = optimize_column(serie, category_ratio)
+        if converted is not serie:
+            optimized.isetitem(col_index, converted)
+    return optimized
+
+
+def to_text(serie):
+    # Text columns as strings backed by Arrow (by Python objects without pyarrow) where missing values stay missing, unlike astype(str) which turns them into 'nan'
+    # Arrow string columns of the optimized dataframe are used without copying them
+    dtype = pd.StringDtype("pyarrow" if pyarrow is not None else "python")
+    if serie.dtype == dtype:
+        return serie
+    return serie.astype(dtype)
+
+
+def to_object(serie):
+    # Categorical and Arrow string columns are turned back into object columns with NaN for missing values, as pd.read_csv builds them
+    if not isinstance(serie.dtype, (pd.CategoricalDtype, pd.StringDtype)):
+        return serie
+    return serie.astype(object).where(serie.notna(), np.nan)
@@ -0,0 +1,256 @@
+import io
+import mmap
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils import config
+
+QUOTE, COMMA, NEWLINE, RETURN = b'"'[0], b","[0], b"\n"[0], b"\r"[0]
+FIELD_ENDS = [COMMA, NEWLINE, RETURN]
+# Bytes scanned at a time for quotes and line breaks, so that the boolean masks stay small whatever the size of the file
+SCAN_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def count_quotes(data, start, end):
+    # Number of quote characters between two offsets, block by block
+    return sum(int(np.count_nonzero(data[block:min(block + SCAN_BLOCK_BYTES, end)] == QUOTE)) for block in range(start, end, SCAN_BLOCK_BYTES))
+
+
+def quotes_are_structural(data):
+    """
+    --------------------
+    Description
+    --------------------
+    -> quotes_are_structural (function): Function that checks that every quote of a CSV file opens or closes a quoted field, or is a doubled quote inside one.
+    Under this condition a line break ends a record exactly when an even number of quotes comes before it, which is what split_records relies on; quotes inside unquoted fields (e.g. 5" screen) make the file fall back to a single parser.
+
+    --------------------
+    Parameters
+    --------------------
+    -> data (np.ndarray): Bytes of the file as an array of uint8
+
+    --------------------
+    Returns
+    --------------------
+    -> (bool): Flag stating if the file can be split on line breaks preceded by an even number of quotes
+
+    """
+    n_bytes = len(data)
+    n_before = 0
+    for block in range(0, n_bytes, SCAN_BLOCK_BYTES):
+        positions = np.flatnonzero(data[block:min(block + SCAN_BLOCK_BYTES, n_bytes)] == QUOTE) + block
+        if len(positions) == 0:
+            continue
+        if not quotes_in_place(data, positions, n_before):
+            return False
+        n_before += len(positions)
+    return n_before % 2 == 0
+
+
+def quotes_in_place(data, positions, n_before):
+    # Quotes of even rank open a field (after a delimiter, a line break, or the quote just before), odd ones close it (before a delimiter, a line break, or the quote just after)
+    n_bytes = len(data)
+    opening = (np.arange(len(positions)) + n_before) % 2 == 0
+    previous = data[np.maximum(positions - 1, 0)]
+    following = data[np.minimum(positions + 1, n_bytes - 1)]
+    opens = (positions == 0) | np.isin(previous, FIELD_ENDS + [QUOTE])
+    closes = (positions == n_bytes - 1) | np.isin(following, FIELD_ENDS + [QUOTE])
+    return bool(np.all(np.where(opening, opens, closes)))
+
+
+def next_record_start(data, position, n_quotes_before):
+    # Offset just after the first line break at or after position that is outside quotes, len(data) if there is none
+    n_bytes = len(data)
+    window = 1024 * 1024
+    while position < n_bytes:
+        end = min(position + window, n_bytes)
+        block = data[position:end]
+        breaks = np.flatnonzero(block == NEWLINE)
+        if len(breaks):
+            quotes = np.cumsum(block == QUOTE)
+            outside = (n_quotes_before + quotes[breaks]) % 2 == 0
+            if outside.any():
+                return position + int(breaks[np.argmax(outside)]) + 1
+        n_quotes_before += int(np.count_nonzero(block == QUOTE))
+        position = end
+    return n_bytes
+
+
+def split_records(data, n_parts):
+    """
+    --------------------
+    Description
+    --------------------
+    -> split_records (function): Function that cuts a CSV file into byte ranges of about the same size that start and end on record boundaries, line breaks inside quoted fields being skipped
+
+    --------------------
+    Parameters
+    --------------------
+    -> data (np.ndarray): Bytes of the file as an array of uint8
+    -> n_parts (int): Number of ranges aimed for
+
+    --------------------
+    Returns
+    --------------------
+    -> (list): List of (start, end) offsets, the first range starting with the header; None if the quotes of the file don't allow splitting it
+
+    """
+    if not quotes_are_structural(data):
+        return None
+    n_bytes = len(data)
+    bounds = [0]
+    n_quotes = 0
+    for target in np.linspace(0, n_bytes, n_parts + 1)[1:-1].astype(np.int64):
+        if target <= bounds[-1]:
+            continue
+        n_quotes += count_quotes(data, bounds[-1], target)
+        start = next_record_start(data, int(target), n_quotes)
+        if start >= n_bytes:
+            break
+        n_quotes += count_quotes(data, int(target), start)
+        bounds.append(start)
+    bounds.append(n_bytes)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_range(content, names=None, dtype=None):
+    # One range of the file, with the header for the first one and the columns names of the header for the others
+    try:
+        if names is None:
+            return pd.read_csv(io.BytesIO(content), low_memory=False, dtype=dtype)
+        return pd.read_csv(io.BytesIO(content), low_memory=False, header=None, names=names, dtype=dtype)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame() if names is None else pd.DataFrame(columns=names)
+
+
+def value_kind(serie):
+    # Kind of values of a column in one range, the data types pd.read_csv infers depend on it
+    dtype = serie.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return "bool"
+    if dtype == np.int64:
+        return "int"
+    if dtype == np.float64 and serie.notna().any():
+        return "float"
+    if dtype == np.float64:
+        return "empty"
+    if dtype == object:
+        # Booleans with missing values are read as an object column of True and False
+        inferred = pd.api.types.infer_dtype(serie, skipna=True)
+        return {"empty": "empty", "boolean": "bool"}.get(inferred, "text")
+    return str(dtype)
+
+
+def reconcile_columns(frames):
+    """
+    --------------------
+    Description
+    --------------------
+    -> reconcile_columns (function): Function that finds, for each column, what the ranges parsed separately need so that stacking them gives the data types pd.read_csv infers on the whole column.
+    Integers and floats combine as pandas does; a column with text in one range and numbers or booleans in others is text in the whole file, so those ranges are parsed again keeping the column as text.
+
+    --------------------
+    Parameters
+    --------------------
+    -> frames (list): List of the dataframes parsed from each range
+
+    --------------------
+    Returns
+    --------------------
+    -> (dict): Columns to read as text again for each range index, None if a column mixes kinds pd.read_csv would combine in another way (e.g. booleans and numbers), the whole file is then parsed by a single parser
+
+    """
+    reparse = {}
+    for col in frames[0].columns:
+        kinds = [value_kind(df[col]) for df in frames]
+        present = set(kinds) - {"empty"}
+        if len(present) <= 1 or present <= {"int", "float"}:
+            continue
+        if "text" not in present or not present <= {"text", "int", "float", "bool"}:
+            return None
+        for index, kind in enumerate(kinds):
+            if kind not in ("text", "empty"):
+                reparse.setdefault(index, []).append(col)
+    return reparse
+
+
+def buffer_of(file_path):
+    # Bytes of the upload without copying them: the buffer of an in-memory upload, or the file mapped in memory
+    if hasattr(file_path, "getbuffer"):
+        return file_path.getbuffer()
+    if hasattr(file_path, "getvalue"):
+        return file_path.getvalue()
+    if hasattr(file_path, "read"):
+        file_path.seek(0)
+        content = file_path.read()
+        return content if isinstance(content, bytes) else content.encode()
+    with open(file_path, "rb") as handle:
+        if handle.seek(0, 2) == 0:
+            return b""
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def release_buffer(buffer):
+    # Arrays made from the buffer must be deleted first
+    if isinstance(buffer, memoryview):
+        buffer.release()
+    elif isinstance(buffer, mmap.mmap):
+        buffer.close()
+
+
+def parallel_read_csv(file_path, workers=None, executor_kind=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> parallel_read_csv (function): Function that parses a CSV file with several parsers at once: the file is cut into byte ranges on record boundaries (see split_records), each range is parsed by pd.read_csv in a pool of threads or processes, and the data types of the ranges are reconciled before stacking them.
+    The result has the columns, data types and values pd.read_csv(file_path, low_memory=False) gives; files whose quotes or mixed columns can't be handled this way return None so that the caller parses them with a single parser.
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+    -> workers (int): Number of ranges parsed at the same time (default set to config.PARSE_WORKERS)
+    -> executor_kind (str): "thread" (the C parser releases the GIL while it tokenizes) or "process" (every stage runs in parallel, the ranges and the parsed frames are copied between processes) (default set to config.PARSE_EXECUTOR)
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): Parsed dataframe, None if the file has to be parsed by a single parser
+
+    """
+    workers = config.PARSE_WORKERS if workers is None else workers
+    executor_kind = config.PARSE_EXECUTOR if executor_kind is None else executor_kind
+    buffer = buffer_of(file_path)
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    ranges = split_records(data, workers)
+    # Each range is copied once into its parser (or worker process), then the upload buffer is released
+    contents = None if ranges is None or len(ranges) < 2 else [bytes(data[start:end]) for start, end in ranges]
+    del data
+    release_buffer(buffer)
+    if contents is None:
+        return None
+
+    # The header is read on its own for the columns names given to the other ranges
+    pool = ProcessPoolExecutor if executor_kind == "process" else ThreadPoolExecutor
+    with pool(max_workers=min(workers, len(contents))) as executor:
+        first = executor.submit(parse_range, contents[0])
+        names = list(pd.read_csv(io.BytesIO(contents[0]), nrows=0).columns)
+        others = [executor.submit(parse_range, content, names) for content in contents[1:]]
+        frames = [first.result()] + [future.result() for future in others]
+
+        # pd.read_csv turns the first column into the index when the header is one field short, the ranges would then disagree
+        if any(not isinstance(df.index, pd.RangeIndex) or list(df.columns) != names for df in frames):
+            return None
+        # Ranges without rows (e.g. only the header) would turn every column into objects when stacked
+        kept = [index for index, df in enumerate(frames) if len(df)] or [0]
+        frames, contents = [frames[index] for index in kept], [contents[index] for index in kept]
+        reparse = reconcile_columns(frames)
+        if reparse is None:
+            return None
+        futures = {index: executor.submit(parse_range, contents[index], None if kept[index] == 0 else names, {col: str for col in cols}) for index, cols in reparse.items()}
+        for index, future in futures.items():
+            frames[index] = future.result()
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,222 @@
+import functools
+import hashlib
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils import config
+
+
+class PartitionedUpload:
+    """
+    --------------------
+    Description
+    --------------------
+    -> PartitionedUpload (class): Class that holds several CSV files (e.g. daily partitions) explored as one logical dataset, in the order of their names.
+    The content of each file is kept as immutable bytes, so that partitions can be read by several threads at the same time without sharing a read position.
+
+    --------------------
+    Attributes
+    --------------------
+    -> names (list): List of the names of the files
+    -> contents (list): List of the contents of the files (bytes)
+    -> name (str): Name of the dataset, made of the names of its files
+    -> size (int): Total size of the files in bytes
+
+    """
+    def __init__(self, names, contents):
+        order = sorted(range(len(names)), key=lambda index: names[index])
+        self.names = [names[index] for index in order]
+        self.contents = [contents[index] for index in order]
+        self.name = ", ".join(self.names)
+        self.size = sum(len(content) for content in self.contents)
+
+    def __len__(self):
+        return len(self.names)
+
+    def open_parts(self):
+        # A new file-like object per call, reading the shared bytes without copying them
+        return [io.BytesIO(content) for content in self.contents]
+
+    @functools.cached_property
+    def content_hash(self):
+        # The size of each file is hashed as well, so that moving bytes from one file to the next changes the hash
+        digest = hashlib.blake2b(digest_size=16)
+        for content in self.contents:
+            digest.update(len(content).to_bytes(8, "little"))
+            digest.update(content)
+        return digest.hexdigest()
+
+    @functools.cached_property
+    def part_columns(self):
+        # Header of each file, read without parsing its rows
+        columns = []
+        for part in self.open_parts():
+            try:
+                columns.append(pd.read_csv(part, nrows=0).columns.tolist())
+            except pd.errors.EmptyDataError:
+                columns.append([])
+        return columns
+
+    @functools.cached_property
+    def columns(self):
+        # Union of the columns of the files, in the order they first appear (as pd.concat would order them)
+        return list(dict.fromkeys(col for columns in self.part_columns for col in columns))
+
+
+def is_partitioned(file_path):
+    return isinstance(file_path, PartitionedUpload)
+
+
+def open_uploads(uploads):
+    """
+    --------------------
+    Description
+    --------------------
+    -> open_uploads (function): Function that turns the files picked in the uploader into what the tabs explore: the file itself when a single CSV was picked, a PartitionedUpload made of every CSV otherwise (zip archives are expanded into the CSV files they contain)
+
+    --------------------
+    Parameters
+    --------------------
+    -> uploads (list): List of uploaded files
+
+    --------------------
+    Returns
+    --------------------
+    -> (file-like or PartitionedUpload): Upload to explore, None if no CSV file was picked
+
+    """
+    names, contents = [], []
+    for upload in uploads:
+        if not upload.name.lower().endswith(".zip"):
+            names.append(upload.name)
+            contents.append(upload.getvalue())
+            continue
+        with zipfile.ZipFile(io.BytesIO(upload.getvalue())) as archive:
+            for member in archive.infolist():
+                # Folders and the metadata added by macOS are skipped
+                if member.is_dir() or member.filename.startswith("__MACOSX/") or not member.filename.lower().endswith(".csv"):
+                    continue
+                names.append(f"{upload.name}/{member.filename}")
+                contents.append(archive.read(member))
+    if not names:
+        return None
+    if len(uploads) == 1 and len(names) == 1 and names[0] == uploads[0].name:
+        return uploads[0]
+    return PartitionedUpload(names, contents)
+
+
+def map_partitions(upload, function, *args, max_workers=None, **kwargs):
+    """
+    --------------------
+    Description
+    --------------------
+    -> map_partitions (function): Function that runs a function on every file of a PartitionedUpload in a pool of threads (pandas releases the GIL while it parses a CSV), and returns the results in the order of the files
+
+    --------------------
+    Parameters
+    --------------------
+    -> upload (PartitionedUpload): Files to process
+    -> function (callable): Function called with a file-like object of each file as first argument
+    -> *args, **kwargs: Extra arguments passed on to the function
+    -> max_workers (int): Number of files processed at the same time (default set to config.PARTITION_WORKERS)
+
+    --------------------
+    Returns
+    --------------------
+    -> (list): Result of the function for each file
+
+    """
+    max_workers = config.PARTITION_WORKERS if max_workers is None else max_workers
+    parts = upload.open_parts()
+    if max_workers <= 1 or len(parts) <= 1:
+        return [function(part, *args, **kwargs) for part in parts]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(parts))) as executor:
+        return list(executor.map(lambda part: function(part, *args, **kwargs), parts))
+
+
+def parse_partition(part):
+    try:
+        return pd.read_csv(part, low_memory=False)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+
+
+def split_partition(part):
+    # Number of rows and columns of one file, each column copied out of the blocks of the parsed dataframe so that it can be released on its own
+    df = parse_partition(part)
+    return len(df), {col: df[col].copy() for col in df.columns}
+
+
+def read_partitions(upload, max_workers=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> read_partitions (function): Function that parses every file of a PartitionedUpload on its own, in parallel, and stacks their rows in the order of the files.
+    The union is built one column at a time and the columns of the files are released as soon as they are stacked, so that memory peaks at about one copy of the data plus one column, instead of the two copies a pd.concat of the whole dataframes holds.
+    Each column gets the data type pd.concat gives its pieces (e.g. integers in one file and floats in another make floats), files without the column add missing values.
+
+    --------------------
+    Parameters
+    --------------------
+    -> upload (PartitionedUpload): Files to read
+    -> max_workers (int): Number of files parsed at the same time (default set to config.PARTITION_WORKERS)
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): Rows of all the files, with the columns of all the files in the order they first appear
+
+    """
+    parts = [(n_rows, columns) for n_rows, columns in map_partitions(upload, split_partition, max_workers=max_workers) if columns]
+    if not parts:
+        return pd.DataFrame()
+    union = {}
+    for col in dict.fromkeys(col for _, columns in parts for col in columns):
+        pieces = [columns.pop(col) if col in columns else pd.Series(np.nan, index=pd.RangeIndex(n_rows)) for n_rows, columns in parts]
+        union[col] = pd.concat(pieces, ignore_index=True)
+        del pieces
+    # The stacked columns are kept as they are, without consolidating them into blocks (which would copy them again)
+    return pd.DataFrame(union, copy=False)
+
+
+def schema_differences(names, part_columns, part_dtypes):
+    """
+    --------------------
+    Description
+    --------------------
+    -> schema_differences (function): Function that lists the columns whose presence or data type is not the same in every file of a PartitionedUpload
+
+    --------------------
+    Parameters
+    --------------------
+    -> names (list): List of the names of the files
+    -> part_columns (list): List of the columns of each file
+    -> part_dtypes (list): List of dictionaries mapping the columns of each file to their data type
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): One row per column differing between files, with the files missing it and the files of each data type (empty if the files all share the same schema)
+
+    """
+    rows = []
+    columns = list(dict.fromkeys(col for cols in part_columns for col in cols))
+    for col in columns:
+        missing = [name for name, cols in zip(names, part_columns) if col not in cols]
+        by_dtype = {}
+        for name, cols, dtypes in zip(names, part_columns, part_dtypes):
+            if col in cols:
+                by_dtype.setdefault(str(dtypes[col]), []).append(name)
+        if not missing and len(by_dtype) <= 1:
+            continue
+        rows.append({
+            "Column Name": col,
+            "Missing From": ", ".join(missing),
+            "Data Types": "; ".join(f"{dtype} ({', '.join(files)})" for dtype, files in by_dtype.items())
+        })
+    return pd.DataFrame(rows, columns=["Column Name", "Missing From", "Data Types"])
@@ -0,0 +1,190 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from utils import config
+from utils.disk_cache import disk_cache
+from utils.incremental import read_range
+from utils.parallel_parse import NEWLINE, QUOTE, RETURN, SCAN_BLOCK_BYTES, buffer_of, quotes_in_place, release_buffer
+from utils.partitions import is_partitioned
+from utils.store import dataset_store, hash_upload
+
+
+class RowIndex:
+    """
+    --------------------
+    Description
+    --------------------
+    -> RowIndex (class): Class that holds the byte offset of every stride-th row of a CSV file, so that any rows can be read by seeking to the offset before them and parsing at most stride rows per offset, without parsing the rest of the file.
+    Blank lines are skipped as pd.read_csv skips them, so row numbers match the index of the parsed dataframe.
+
+    --------------------
+    Attributes
+    --------------------
+    -> checkpoints (np.ndarray): Byte offset of rows 0, stride, 2 * stride... (int64)
+    -> n_rows (int): Number of rows of the file, header excluded
+    -> stride (int): Number of rows between two offsets kept (default set to config.ROW_INDEX_STRIDE)
+    -> data_start (int): Byte offset of the first row, i.e. size of the header
+    -> size (int): Size of the file in bytes
+
+    """
+    def __init__(self, checkpoints, n_rows, stride, data_start, size):
+        self.checkpoints = checkpoints
+        self.n_rows = n_rows
+        self.stride = stride
+        self.data_start = data_start
+        self.size = size
+
+    def block_range(self, block):
+        # Bytes of the rows block * stride to (block + 1) * stride, blank lines after them included
+        end = self.checkpoints[block + 1] if block + 1 < len(self.checkpoints) else self.size
+        return int(self.checkpoints[block]), int(end)
+
+    def read_rows(self, file_path, rows, columns, dtype=None):
+        """
+        --------------------
+        Description
+        --------------------
+        -> read_rows (method): Class method that parses the given rows of the file, reading only the blocks of stride rows that contain them
+
+        --------------------
+        Parameters
+        --------------------
+        -> file_path (str or file-like): Uploaded file or path to the CSV file the index was built on
+        -> rows (np.ndarray): Row numbers to read
+        -> columns (list): List of the columns names of the file
+        -> dtype (dict): Data types passed on to pd.read_csv, e.g. to keep text columns as text in rows that only hold numbers (default set to None)
+
+        --------------------
+        Returns
+        --------------------
+        -> (pd.DataFrame): Rows in increasing order, indexed by their row numbers
+
+        """
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        rows = rows[(rows >= 0) & (rows < self.n_rows)]
+        blocks = np.unique(rows // self.stride)
+        # The blocks are read one after the other and parsed together, every block but the last one of the file holds exactly stride rows
+        content = b"".join(read_range(file_path, *self.block_range(block)) for block in blocks)
+        try:
+            df = pd.read_csv(io.BytesIO(content), header=None, names=columns, dtype=dtype, low_memory=False)
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame(columns=columns)
+        positions = np.searchsorted(blocks, rows // self.stride) * self.stride + rows % self.stride
+        df = df.iloc[positions]
+        df.index = pd.Index(rows)
+        return df
+
+    def sample_rows(self, n, seed=None):
+        # Row numbers of a uniform sample without replacement
+        return np.sort(np.random.default_rng(seed).choice(self.n_rows, size=min(n, self.n_rows), replace=False))
+
+    def to_frame(self):
+        # The offsets are saved in the disk cache as a one-column dataframe, the other attributes as its metadata
+        return pd.DataFrame({"offset": self.checkpoints}), {"n_rows": self.n_rows, "stride": self.stride, "data_start": self.data_start, "size": self.size}
+
+    @classmethod
+    def from_frame(cls, df, metadata):
+        return cls(df["offset"].to_numpy(dtype=np.int64), metadata["n_rows"], metadata["stride"], metadata["data_start"], metadata["size"])
+
+
+def build_row_index(file_path, stride=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> build_row_index (function): Function that builds the RowIndex of a CSV file in one sequential scan of its bytes, block by block: records end on line breaks preceded by an even number of quotes, so line breaks inside quoted fields are skipped
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+    -> stride (int): Number of rows between two offsets kept (default set to config.ROW_INDEX_STRIDE)
+
+    --------------------
+    Returns
+    --------------------
+    -> (RowIndex): Index of the rows, None for uploads made of several files and files with quotes inside unquoted fields (see utils.parallel_parse.quotes_are_structural)
+
+    """
+    stride = config.ROW_INDEX_STRIDE if stride is None else stride
+    if is_partitioned(file_path):
+        return None
+    buffer = buffer_of(file_path)
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    n_bytes = len(data)
+    checkpoints = []
+    n_rows = 0
+    n_quotes = 0
+    header_seen = False
+    data_start = None
+    for block in range(0, n_bytes, SCAN_BLOCK_BYTES):
+        end = min(block + SCAN_BLOCK_BYTES, n_bytes)
+        quotes = np.flatnonzero(data[block:end] == QUOTE) + block
+        if len(quotes) and not quotes_in_place(data, quotes, n_quotes):
+            checkpoints = None
+            break
+        breaks = np.flatnonzero(data[block:end] == NEWLINE) + block
+        breaks = breaks[(n_quotes + np.searchsorted(quotes, breaks)) % 2 == 0]
+        n_quotes += len(quotes)
+
+        # Records start at the beginning of the file and after each line break outside quotes, blank ones are skipped
+        starts = breaks + 1
+        if block == 0:
+            starts = np.concatenate([[0], starts])
+        starts = starts[starts < n_bytes]
+        following = data[np.minimum(starts + 1, n_bytes - 1)]
+        blank = (data[starts] == NEWLINE) | ((data[starts] == RETURN) & (following == NEWLINE) & (starts + 1 < n_bytes))
+        starts = starts[~blank]
+        # The first record is the header
+        if not header_seen and len(starts):
+            header_seen = True
+            starts = starts[1:]
+        if data_start is None and len(starts):
+            data_start = int(starts[0])
+        row_numbers = n_rows + np.arange(len(starts))
+        checkpoints.append(starts[row_numbers % stride == 0])
+        n_rows += len(starts)
+    del data
+    release_buffer(buffer)
+    if checkpoints is None:
+        return None
+    checkpoints = np.concatenate(checkpoints).astype(np.int64) if checkpoints else np.zeros(0, dtype=np.int64)
+    return RowIndex(checkpoints, n_rows, stride, n_bytes if data_start is None else data_start, n_bytes)
+
+
+def load_row_index(file_path, store=dataset_store, cache=disk_cache):
+    """
+    --------------------
+    Description
+    --------------------
+    -> load_row_index (function): Function that returns the RowIndex of an upload, building it only if it is neither in the store nor in the disk cache, where it is saved with the parsed dataframes of the upload
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+    -> store (DatasetStore): Store used to cache the index (default set to the shared store)
+    -> cache (DiskCache): Disk cache the index is saved in (default set to the shared disk cache)
+
+    --------------------
+    Returns
+    --------------------
+    -> (RowIndex): Index of the rows, None if the upload can't be indexed
+
+    """
+    key = hash_upload(file_path)
+    row_index = store.get(key, "row_index")
+    if row_index is not None:
+        # False marks uploads that can't be indexed, so that they aren't scanned again
+        return row_index or None
+    cached = cache.get(key, "row_index")
+    if cached is not None:
+        row_index = RowIndex.from_frame(*cached)
+    else:
+        row_index = build_row_index(file_path)
+        if row_index is not None:
+            cache.put(key, "row_index", *row_index.to_frame())
+    store.put(key, "row_index", row_index or False, 0 if row_index is None else row_index.checkpoints.nbytes)
+    return row_index
@@ -0,0 +1,333 @@
+import copy
+
+import pandas as pd
+
+from utils import config
+from utils.background import background_profiler
+from utils.budget import over_memory_budget
+from utils.dates import DateParseReport, parse_datetime
+from utils.disk_cache import disk_cache
+from utils.incremental import upload_history
+from utils.instrument import instrumented
+from utils.store import dataset_store, detach_upload, hash_upload, load_dataframe, load_sample
+
+NUMERIC = "numeric"
+DATETIME = "datetime"
+TEXT = "text"
+OTHER = "other"
+
+
+class Schema:
+    """
+    --------------------
+    Description
+    --------------------
+    -> Schema (class): Class that holds the column types inferred on a dataframe and the dataframe with every column converted to its inferred type.
+    It is computed once per upload and shared by the numeric, text and datetime tabs.
+
+    --------------------
+    Attributes
+    --------------------
+    -> kinds (dict): Inferred type of each column: "numeric", "datetime", "text" or "other"
+    -> confidence (dict): Share of the sampled values of each column that support its inferred type (between 0 and 1)
+    -> df (pd.DataFrame): Dataframe where numeric and datetime columns have been converted, the other columns are left untouched
+    -> converted (list): List of columns names that have been converted from text
+    -> date_reports (dict): DateParseReport of each text column that was tried as datetime (on the sample, or on the whole column once converted)
+
+    """
+    def __init__(self, kinds, confidence, df, converted, date_reports):
+        self.kinds = kinds
+        self.confidence = confidence
+        self.df = df
+        self.converted = converted
+        self.date_reports = date_reports
+
+    def cols_of(self, kind):
+        return [col for col, col_kind in self.kinds.items() if col_kind == kind]
+
+    def to_frame(self):
+        return pd.DataFrame({
+            "Column Name": list(self.kinds),
+            "Inferred Type": list(self.kinds.values()),
+            "Confidence": [self.confidence[col] for col in self.kinds]
+        })
+
+    def to_metadata(self):
+        # Everything but the dataframe, in a JSON friendly form, to be saved next to it in the disk cache
+        return {
+            "kinds": list(self.kinds.items()),
+            "confidence": list(self.confidence.items()),
+            "converted": self.converted,
+            "date_reports": [report.to_state() for report in self.date_reports.values()]
+        }
+
+    @classmethod
+    def from_metadata(cls, metadata, df):
+        date_reports = [DateParseReport.from_state(state) for state in metadata["date_reports"]]
+        return cls(dict(metadata["kinds"]), dict(metadata["confidence"]), df, metadata["converted"],
+                   {report.col_name: report for report in date_reports})
+
+    def date_reports_frame(self):
+        return pd.DataFrame([report.to_dict() for report in self.date_reports.values()])
+
+
+def is_text_dtype(dtype):
+    return pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype)
+
+
+def sample_values(serie, sample_size):
+    values = serie.dropna()
+    if len(values) > sample_size:
+        values = values.sample(sample_size, random_state=0)
+    return values
+
+
+def to_numeric(serie):
+    return pd.to_numeric(serie, errors="coerce")
+
+
+def infer_column(serie, sample_size=None, min_confidence=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> infer_column (function): Function that infers the type of a column from a bounded random sample of its non-missing values.
+    Text columns are classified as numeric (or datetime) when at least min_confidence of the sampled values can be converted.
+
+    --------------------
+    Parameters
+    --------------------
+    -> serie (pd.Series): Column to classify
+    -> sample_size (int): Maximum number of values tried (default set to config.SCHEMA_SAMPLE_ROWS)
+    -> min_confidence (float): Share of convertible values required to classify a text column as numeric or datetime (default set to config.SCHEMA_MIN_CONFIDENCE)
+
+    --------------------
+    Returns
+    --------------------
+    -> (tuple): Inferred type, confidence score and DateParseReport of the sample (None if the column wasn't tried as datetime)
+
+    """
+    sample_size = config.SCHEMA_SAMPLE_ROWS if sample_size is None else sample_size
+    min_confidence = config.SCHEMA_MIN_CONFIDENCE if min_confidence is None else min_confidence
+
+    dtype = serie.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return OTHER, 1.0, None
+    if pd.api.types.is_numeric_dtype(dtype):
+        return NUMERIC, 1.0, None
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return DATETIME, 1.0, None
+    if not is_text_dtype(dtype):
+        return OTHER, 1.0, None
+
+    sample = sample_values(serie, sample_size)
+    if sample.empty:
+        return TEXT, 1.0, None
+    sample = sample.astype(str)
+
+    numeric_ratio = float(to_numeric(sample).notna().mean())
+    if numeric_ratio >= min_confidence:
+        return NUMERIC, numeric_ratio, None
+    _, date_report = parse_datetime(sample, sample_size=sample_size)
+    if date_report.ratio >= min_confidence:
+        return DATETIME, date_report.ratio, date_report
+    return TEXT, 1.0 - max(numeric_ratio, date_report.ratio), date_report
+
+
+@instrumented
+def infer_schema(df, sample_size=None, min_confidence=None):
+    """
+    --------------------
+    Description
+    --------------------
+    -> infer_schema (function): Function that classifies every column of a dataframe from a sample and converts each numeric or datetime text column once, on its whole length
+
+    --------------------
+    Parameters
+    --------------------
+    -> df (pd.DataFrame): Dataframe to classify, it is not modified
+    -> sample_size (int): Maximum number of values tried per column (default set to config.SCHEMA_SAMPLE_ROWS)
+    -> min_confidence (float): Share of convertible values required to classify a text column as numeric or datetime (default set to config.SCHEMA_MIN_CONFIDENCE)
+
+    --------------------
+    Returns
+    --------------------
+    -> (Schema): Inferred schema and converted dataframe
+
+    """
+    kinds = {}
+    confidence = {}
+    converted = {}
+    date_reports = {}
+    for col in df.columns:
+        kinds[col], confidence[col], date_reports[col] = infer_column(df[col], sample_size, min_confidence)
+        if not is_text_dtype(df[col].dtype):
+            continue
+        if kinds[col] == NUMERIC:
+            converted[col] = to_numeric(df[col])
+        elif kinds[col] == DATETIME:
+            # The whole column is parsed with the format found on the sample
+            converted[col], date_reports[col] = parse_datetime(df[col], date_reports[col].date_format, sample_size)
+            date_reports[col].is_date = True
+
+    typed_df = df.copy(deep=False)
+    for col, serie in converted.items():
+        typed_df[col] = serie
+    date_reports = {col: report for col, report in date_reports.items() if report is not None}
+    return Schema(kinds, confidence, typed_df, list(converted), date_reports)
+
+
+def extend_schema(schema, df):
+    """
+    --------------------
+    Description
+    --------------------
+    -> extend_schema (function): Function that gives the schema of a dataframe made of the dataframe of an earlier upload with rows appended: the column types and date formats of the earlier schema are kept, and only the new rows of the numeric and datetime text columns are converted
+
+    --------------------
+    Parameters
+    --------------------
+    -> schema (Schema): Schema of the earlier upload
+    -> df (pd.DataFrame): Parsed dataframe of the whole upload, its first rows being the ones of the earlier upload
+
+    --------------------
+    Returns
+    --------------------
+    -> (Schema): Schema of the whole upload, None if the columns or their data types changed (the schema is then inferred again)
+
+    """
+    n_base = len(schema.df)
+    if list(df.columns) != list(schema.df.columns) or len(df) < n_base:
+        return None
+    converted = {}
+    date_reports = copy.deepcopy(schema.date_reports)
+    for col in df.columns:
+        if col not in schema.converted:
+            # Text columns keep the type inferred on the earlier rows, the others are typed by their data type (e.g. integers becoming floats stay numeric)
+            if is_text_dtype(df[col].dtype) != is_text_dtype(schema.df[col].dtype):
+                return None
+            if not is_text_dtype(df[col].dtype) and infer_column(df[col].iloc[:0])[0] != schema.kinds[col]:
+                return None
+            continue
+        new_rows = df[col].iloc[n_base:]
+        if not is_text_dtype(df[col].dtype):
+            return None
+        if schema.kinds[col] == NUMERIC:
+            new_values = to_numeric(new_rows)
+        else:
+            # Without a format the earlier rows were parsed one by one, a format guessed on the new rows could parse them differently
+            report = date_reports[col]
+            if report.date_format is None:
+                return None
+            new_values, new_report = parse_datetime(new_rows, report.date_format)
+            report.n_values += new_report.n_values
+            report.n_format += new_report.n_format
+            report.n_fallback += new_report.n_fallback
+        converted[col] = pd.concat([schema.df[col], new_values], ignore_index=True)
+        if schema.kinds[col] == DATETIME and not pd.api.types.is_datetime64_any_dtype(converted[col].dtype):
+            return None
+
+    typed_df = df.copy(deep=False)
+    for col, serie in converted.items():
+        typed_df[col] = serie
+    return Schema(dict(schema.kinds), dict(schema.confidence), typed_df, list(converted), date_reports)
+
+
+def load_schema(file_path, store=dataset_store, cache=disk_cache, optimize=False):
+    """
+    --------------------
+    Description
+    --------------------
+    -> load_schema (function): Function that returns the schema of an upload, inferring it only if its content is neither in the store nor in the disk cache
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+    -> store (DatasetStore): Store used to cache the schema (default set to the shared store)
+    -> cache (DiskCache): Disk cache where the converted dataframe is saved for later sessions (default set to the shared disk cache)
+    -> optimize (bool): Flag stating if the schema is inferred on the memory-optimized dataframe (default set to False)
+
+    --------------------
+    Returns
+    --------------------
+    -> (Schema): Inferred schema and converted dataframe
+
+    """
+    key = hash_upload(file_path)
+    name = "schema_optimized" if optimize else "schema"
+    schema = store.get(key, name)
+    if schema is None:
+        cached = cache.get(key, name)
+        if cached is not None:
+            schema = Schema.from_metadata(cached[1], cached[0])
+            # The dataframe read from the disk cache is not shared with a parsed one, all of it is accounted for
+            n_bytes = schema.df.memory_usage(deep=True).sum()
+        else:
+            df = load_dataframe(file_path, store, cache, optimize)
+            # An upload with rows appended to an earlier one keeps its column types, only the new rows are converted
+            appended = upload_history.base_of(key) if config.INCREMENTAL and not optimize else None
+            base_schema = None if appended is None else store.get(appended.base_key, name)
+            schema = None if base_schema is None else extend_schema(base_schema, df)
+            schema = infer_schema(df) if schema is None else schema
+            cache.put(key, name, schema.df, schema.to_metadata())
+            # Columns that were not converted are shared with the parsed dataframe and already accounted for
+            n_bytes = schema.df[schema.converted].memory_usage(index=False, deep=True).sum()
+        store.put(key, name, schema, int(n_bytes))
+    return schema
+
+
+def load_sample_schema(file_path, store=dataset_store):
+    # Schema inferred on the sample of the sample-first mode (see utils.store.load_sample), shared by every tab until the exact one is ready
+    key = hash_upload(file_path)
+    schema = store.get(key, "sample_schema")
+    if schema is None:
+        schema = infer_schema(load_sample(file_path, store).df)
+        store.put(key, "sample_schema", schema, int(schema.df[schema.converted].memory_usage(index=False, deep=True).sum()))
+    return schema
+
+
+def get_schema(file_path=None, df=None, optimize=False, sample_first=False):
+    # Uploads go through the store, dataframes provided directly are classified on the fly
+    if file_path is not None:
+        if sample_first:
+            return load_sample_schema(file_path)
+        return load_schema(file_path, optimize=optimize)
+    return infer_schema(df)
+
+
+def exact_schema_ready(file_path, optimize=False, store=dataset_store, profiler=background_profiler):
+    """
+    --------------------
+    Description
+    --------------------
+    -> exact_schema_ready (function): Function used by the sample-first mode to know if the whole upload has been parsed and its schema inferred, so that exact statistics can replace the estimates.
+    The first call starts loading them in the local executor of the background profiler (see BackgroundProfiler.submit_local), on a copy of in-memory uploads.
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+    -> optimize (bool): Flag stating if the memory-optimized dataframe is loaded (default set to False)
+    -> store (DatasetStore): Store where the schema is looked for (default set to the shared store)
+    -> profiler (BackgroundProfiler): Profiler running the load (default set to the shared profiler)
+
+    --------------------
+    Returns
+    --------------------
+    -> (bool): True once load_schema returns without parsing the upload again, always False when the upload is over the memory budget (see utils.budget)
+
+    """
+    key = hash_upload(file_path)
+    if store.get(key, "schema_optimized" if optimize else "schema") is not None:
+        # Tasks still queued hold their own reference to the copy of the upload
+        store.discard(key, "upload_copy")
+        return True
+    # The whole upload is never loaded when it would not fit in the memory budget, the estimates stay
+    if over_memory_budget(file_path, optimize, store=store):
+        return False
+    name = ("exact", optimize)
+    future = profiler.future(key, name)
+    if future is None:
+        future = profiler.submit_local(key, name, load_schema, detach_upload(file_path), optimize=optimize)
+    return future is not None and future.done() and not future.cancelled() and future.exception() is None
@@ -0,0 +1,340 @@
+import numpy as np
+import pandas as pd
+
+from utils import config
+from utils.ingest import iter_csv_chunks
+
+
+def hash_values(values, categorize=True):
+    """
+    --------------------
+    Description
+    --------------------
+    -> hash_values (function): Function that computes a 64-bit hash of every value of a serie or of every row of a dataframe
+
+    --------------------
+    Parameters
+    --------------------
+    -> values (pd.Series or pd.DataFrame): Values to hash
+    -> categorize (bool): Flag stating if text values are factorized before being hashed, faster when values repeat a lot but it builds a hash table of the distinct values (default set to True)
+
+    --------------------
+    Returns
+    --------------------
+    -> (np.ndarray): Array of uint64 hashes
+
+    """
+    return pd.util.hash_pandas_object(values, index=False, categorize=categorize).to_numpy()
+
+
+def bit_length(values):
+    # Vectorized int.bit_length() for uint64 arrays: the exponent of the float64 conversion, exact below 2 ** 53 (the remainders
+    # of a HyperLogLog with precision 11 or more), otherwise a binary search on the position of the highest set bit
+    if len(values) == 0 or values.max() < np.uint64(1 << 53):
+        return np.frexp(values.astype(np.float64))[1].astype(np.uint8)
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= np.uint64(1 << shift)
+        length[mask] += shift
+        values[mask] >>= np.uint64(shift)
+    length += (values > 0).astype(np.uint8)
+    return length
+
+
+class HyperLogLog:
+    """
+    --------------------
+    Description
+    --------------------
+    -> HyperLogLog (class): Class that estimates the number of distinct values of a stream in a fixed amount of memory (2 ** precision bytes).
+    The relative standard error of the estimate is 1.04 / sqrt(2 ** precision), about 0.81% with the default precision, and two sketches built on separate chunks can be merged.
+
+    --------------------
+    Attributes
+    --------------------
+    -> precision (int): Number of hash bits used to pick a register (default set to 14)
+    -> registers (np.ndarray): Largest rank seen by each register
+
+    """
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def update_hashes(self, hashes):
+        if len(hashes) == 0:
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        n_bits = 64 - self.precision
+        index = (hashes >> np.uint64(n_bits)).astype(np.intp)
+        remainder = hashes & np.uint64((1 << n_bits) - 1)
+        rank = (n_bits + 1 - bit_length(remainder)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def update(self, values):
+        # Values are hashed one by one, a hash table of the distinct values is what the sketch is meant to avoid
+        self.update_hashes(hash_values(values, categorize=False))
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Only HyperLogLog sketches with the same precision can be merged")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        n_zeros = int(np.count_nonzero(self.registers == 0))
+        # Small cardinalities are better estimated by linear counting on the empty registers
+        if estimate <= 2.5 * m and n_zeros > 0:
+            estimate = m * np.log(m / n_zeros)
+        return int(round(estimate))
+
+
+class MisraGries:
+    """
+    --------------------
+    Description
+    --------------------
+    -> MisraGries (class): Class that finds the most frequent values of a stream with at most `capacity` counters (Misra-Gries summary).
+    Each chunk is counted with value_counts and merged into the counters; when there are too many counters, the (capacity + 1)-th largest count is subtracted from all of them and the ones left at zero are dropped.
+    Two summaries built on separate chunks can be merged, and every estimated count is below the true one by at most error_bound.
+
+    --------------------
+    Attributes
+    --------------------
+    -> capacity (int): Maximum number of counters kept
+    -> counters (pd.Series): Estimated count of each value kept, indexed by value
+    -> n_values (int): Number of non-missing values seen so far (default set to 0)
+
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = pd.Series(dtype="int64")
+        self.n_values = 0
+
+    def update(self, serie):
+        counts = serie.value_counts(sort=False)
+        self.n_values += int(counts.sum())
+        self._add(counts)
+
+    def merge(self, other):
+        self.n_values += other.n_values
+        self._add(other.counters)
+        return self
+
+    def _add(self, counts):
+        counters = self.counters.add(counts, fill_value=0).astype("int64")
+        if len(counters) > self.capacity:
+            # Only the (capacity + 1)-th largest count is needed, np.partition finds it without sorting the others
+            position = len(counters) - self.capacity - 1
+            threshold = np.partition(counters.to_numpy(), position)[position]
+            counters = counters[counters > threshold] - threshold
+        self.counters = counters
+
+    @property
+    def error_bound(self):
+        return (self.n_values - int(self.counters.sum())) // (self.capacity + 1)
+
+    def top(self, k):
+        return self.counters.nlargest(k)
+
+
+class KLLSketch:
+    """
+    --------------------
+    Description
+    --------------------
+    -> KLLSketch (class): Class that estimates the quantiles (median, percentiles...) of a stream of numbers in a fixed amount of memory (KLL sketch, Karnin, Lang and Liberty 2016).
+    Values are kept in levels of compactors: an item of level h stands for 2 ** h values, and when a level exceeds its capacity it is sorted and every other item, starting at random, moves up one level.
+    With the default k = 200 the rank of a returned quantile is within about 1.65% of the requested rank with 99% confidence (see rank_error), the error falls as 1 / k; two sketches built on separate chunks or in separate processes can be merged with the same guarantee.
+
+    --------------------
+    Attributes
+    --------------------
+    -> k (int): Capacity of the top level, the lower levels hold 2/3 of the level above, with at least 2 items (default set to 200)
+    -> levels (list): Items kept at each level, as float64 arrays
+    -> n_values (int): Number of values seen so far (default set to 0)
+
+    """
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self.n_values = 0
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def rank_error(self):
+        return rank_error(self.k)
+
+    def capacity(self, level):
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        # Missing values are skipped, a whole chunk is added to the bottom level at once and then compacted
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.n_values += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n_values += other.n_values
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self.capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0, dtype=np.float64))
+            items = np.sort(items)
+            # An odd item out stays at this level, the others are halved and keep the weight of what they replace
+            n_even = len(items) - len(items) % 2
+            promoted = items[self._rng.integers(2):n_even:2]
+            self.levels[level] = items[n_even:]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            # Capacities depend on the number of levels, so lower levels are checked again
+            level = 0
+
+    def quantiles(self, qs):
+        """
+        --------------------
+        Description
+        --------------------
+        -> quantiles (method): Class method that returns the estimated quantiles of the values seen
+
+        --------------------
+        Parameters
+        --------------------
+        -> qs (list): Requested quantiles, between 0 and 1
+
+        --------------------
+        Returns
+        --------------------
+        -> (np.ndarray): Estimated quantiles, NaN if no value was seen
+
+        """
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.n_values == 0:
+            return np.full(qs.shape, np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** level, dtype=np.float64) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        return items[order][np.minimum(positions, len(items) - 1)]
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+
+class ColumnSketch:
+    """
+    --------------------
+    Description
+    --------------------
+    -> ColumnSketch (class): Class that summarises a column chunk by chunk with mergeable sketches: a HyperLogLog for the number of distinct values and, for numbers, a KLL sketch for the median and the other quantiles.
+    Sketches of the same column built on separate chunks or in separate worker processes combine with merge, and the result carries the error bounds of both sketches.
+
+    --------------------
+    Attributes
+    --------------------
+    -> distinct (HyperLogLog): Sketch of the distinct non-missing values
+    -> quantile_sketch (KLLSketch): Sketch of the values, only fed with numeric or datetime chunks
+    -> n_values (int): Number of non-missing values seen so far (default set to 0)
+    -> n_missing (int): Number of missing values seen so far (default set to 0)
+
+    """
+    def __init__(self, precision=None, k=None):
+        self.distinct = HyperLogLog(config.SKETCH_PRECISION if precision is None else precision)
+        self.quantile_sketch = KLLSketch(config.SKETCH_K if k is None else k)
+        self.n_values = 0
+        self.n_missing = 0
+
+    def update(self, serie):
+        values = serie.dropna()
+        self.n_missing += len(serie) - len(values)
+        self.n_values += len(values)
+        # Integers are hashed as floats, so that a value hashes the same in chunks inferred as int or float
+        self.distinct.update(values.astype("float64") if pd.api.types.is_integer_dtype(values.dtype) else values)
+        if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+            self.quantile_sketch.update(values.to_numpy(dtype=np.float64))
+        elif pd.api.types.is_datetime64_any_dtype(values.dtype):
+            # Timestamps are sketched as nanoseconds since the epoch, see median
+            self.quantile_sketch.update(values.to_numpy(dtype="datetime64[ns]").view("int64"))
+        return self
+
+    def merge(self, other):
+        self.distinct.merge(other.distinct)
+        self.quantile_sketch.merge(other.quantile_sketch)
+        self.n_values += other.n_values
+        self.n_missing += other.n_missing
+        return self
+
+    @property
+    def n_unique(self):
+        return self.distinct.count()
+
+    @property
+    def median(self):
+        return self.quantile_sketch.quantile(0.5)
+
+    def error_bounds(self):
+        # Relative error of the distinct count (99.7% confidence) and normalized rank error of the quantiles (99% confidence)
+        return {"n_unique_relative_error": float(distinct_error(self.distinct.precision)), "quantile_rank_error": self.quantile_sketch.rank_error}
+
+
+def sketch_csv(file_path, usecols=None, chunk_rows=None, **kwargs):
+    """
+    --------------------
+    Description
+    --------------------
+    -> sketch_csv (function): Function that sketches the columns of a CSV file too large to load in one pass, chunk by chunk; sketches of parts of a file read by separate workers can be merged column by column
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+    -> usecols (list): List of columns names to sketch (default set to None, which sketches all columns)
+    -> chunk_rows (int): Number of rows per chunk (default set to config.CHUNK_ROWS)
+    -> **kwargs: Arguments passed to ColumnSketch (precision, k)
+
+    --------------------
+    Returns
+    --------------------
+    -> (dict): ColumnSketch of each column
+
+    """
+    sketches = {}
+    for chunk in iter_csv_chunks(file_path, chunk_rows, usecols=usecols):
+        for col in chunk.columns:
+            sketches.setdefault(col, ColumnSketch(**kwargs)).update(chunk[col])
+    return sketches
+
+
+def distinct_error(precision=None):
+    # Relative error of a HyperLogLog distinct count with about 99.7% confidence (3 standard errors)
+    precision = config.SKETCH_PRECISION if precision is None else precision
+    return 3 * 1.04 / np.sqrt(2 ** precision)
+
+
+def rank_error(k=None):
+    # Normalized rank error of a KLL quantile with 99% confidence
+    return 3.3 / (config.SKETCH_K if k is None else k)
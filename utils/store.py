@@ -0,0 +1,285 @@
+import hashlib
+import io
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils import config
+from utils.disk_cache import disk_cache
+from utils.incremental import extend_dataframe, upload_history
+from utils.ingest import scan_sample, upload_size
+from utils.instrument import instrumented
+from utils.optimize import optimize_dataframe
+from utils.parallel_parse import parallel_read_csv
+from utils.partitions import is_partitioned, read_partitions
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class DatasetStore:
+    """
+    --------------------
+    Description
+    --------------------
+    -> DatasetStore (class): Class that keeps parsed uploads in memory so that every tab and every Streamlit rerun can share them.
+    Each entry is keyed by a content hash of the upload and holds named items (the parsed dataframe and anything derived from it).
+    Once the memory bound is exceeded the least recently used entries are evicted.
+
+    --------------------
+    Attributes
+    --------------------
+    -> max_bytes (int): Maximum number of bytes held by all entries together
+    -> max_entries (int): Maximum number of uploads held at the same time
+    -> entries (OrderedDict): Entries ordered from least to most recently used, each mapping an item name to (value, size in bytes)
+    -> n_bytes (int): Number of bytes currently held by all entries (default set to 0)
+
+    """
+    def __init__(self, max_bytes=config.STORE_MAX_BYTES, max_entries=config.STORE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.n_bytes = 0
+        self._lock = threading.RLock()
+
+    def get(self, key, name):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or name not in entry:
+                return None
+            self.entries.move_to_end(key)
+            return entry[name][0]
+
+    def put(self, key, name, value, n_bytes=0):
+        with self._lock:
+            entry = self.entries.setdefault(key, {})
+            if name in entry:
+                self.n_bytes -= entry[name][1]
+            entry[name] = (value, n_bytes)
+            self.n_bytes += n_bytes
+            self.entries.move_to_end(key)
+            self.evict()
+        return value
+
+    def evict(self):
+        # The most recently used entry is always kept, even if it exceeds the bound on its own
+        with self._lock:
+            while len(self.entries) > 1 and (self.n_bytes > self.max_bytes or len(self.entries) > self.max_entries):
+                _, entry = self.entries.popitem(last=False)
+                self.n_bytes -= sum(n_bytes for _, n_bytes in entry.values())
+
+    def size(self, key, name):
+        # Bytes charged for one item, None if it isn't held
+        with self._lock:
+            entry = self.entries.get(key)
+            return None if entry is None or name not in entry else entry[name][1]
+
+    def discard(self, key, name):
+        # Drop one item of an entry, e.g. to recompute what was derived from the parsed dataframe
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and name in entry:
+                self.n_bytes -= entry.pop(name)[1]
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.n_bytes -= sum(n_bytes for _, n_bytes in entry.values())
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.n_bytes = 0
+
+
+dataset_store = DatasetStore()
+
+# In-memory uploads never change, so their hash is only computed once per upload object
+_upload_hashes = weakref.WeakKeyDictionary()
+# Files on disk are hashed again only when their size or modification time changes
+_path_hashes = {}
+
+
+def hash_upload(file_path):
+    """
+    --------------------
+    Description
+    --------------------
+    -> hash_upload (function): Function that computes a content hash of an uploaded file, a file-like object, a path on disk or a PartitionedUpload
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str, file-like or PartitionedUpload): Uploaded file or path to the CSV file
+
+    --------------------
+    Returns
+    --------------------
+    -> (str): Hexadecimal digest of the content
+
+    """
+    if is_partitioned(file_path):
+        return file_path.content_hash
+    if hasattr(file_path, "getvalue") and file_path in _upload_hashes:
+        return _upload_hashes[file_path]
+
+    digest = hashlib.blake2b(digest_size=16)
+    if hasattr(file_path, "getvalue"):
+        digest.update(file_path.getbuffer() if hasattr(file_path, "getbuffer") else file_path.getvalue())
+        _upload_hashes[file_path] = digest.hexdigest()
+    elif hasattr(file_path, "read"):
+        file_path.seek(0)
+        for block in iter(lambda: file_path.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block if isinstance(block, bytes) else block.encode())
+        file_path.seek(0)
+    else:
+        stat = os.stat(file_path)
+        signature = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        if signature in _path_hashes:
+            return _path_hashes[signature]
+        with open(file_path, "rb") as handle:
+            for block in iter(lambda: handle.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        _path_hashes[signature] = digest.hexdigest()
+    return digest.hexdigest()
+
+
+@instrumented
+def read_csv(file_path):
+    if is_partitioned(file_path):
+        return read_partitions(file_path)
+    # Large files are parsed by several parsers at once, with the same result as a single one
+    if config.PARSE_WORKERS > 1 and upload_size(file_path) >= config.PARALLEL_PARSE_MIN_BYTES:
+        df = parallel_read_csv(file_path)
+        if df is not None:
+            return df
+    if hasattr(file_path, "seek"):
+        file_path.seek(0)
+    try:
+        return pd.read_csv(file_path, low_memory=False)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+
+
+def load_dataframe(file_path, store=dataset_store, cache=disk_cache, optimize=False):
+    """
+    --------------------
+    Description
+    --------------------
+    -> load_dataframe (function): Function that returns the parsed dataframe of an upload, parsing the CSV only if its content is neither in the store nor in the disk cache.
+    The returned dataframe is shared between callers and must be treated as read-only (use df.copy(deep=False) before replacing columns).
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+    -> store (DatasetStore): Store used to cache the parsed dataframe (default set to the shared store)
+    -> cache (DiskCache): Disk cache memory-mapped instead of parsing the CSV, and where newly parsed dataframes are saved (default set to the shared disk cache)
+    -> optimize (bool): Flag stating if the dataframe is stored with smaller data types (see utils.optimize), the memory usage of each column before the conversion is kept under the "memory_before" item (default set to False)
+
+    --------------------
+    Returns
+    --------------------
+    -> (pd.DataFrame): Parsed dataframe
+
+    """
+    key = hash_upload(file_path)
+    name = "df_optimized" if optimize else "df"
+    df = store.get(key, name)
+    if df is not None:
+        return df
+
+    n_bytes = None
+    cached = cache.get(key, name)
+    if cached is not None:
+        df, metadata = cached
+        if optimize:
+            store.put(key, "memory_before", pd.Series(dict(metadata["memory_before"]), dtype="int64"))
+    elif optimize:
+        # The optimized dataframe is built from the parsed one if it is already in memory, without keeping the parsed one otherwise
+        df = store.get(key, "df")
+        df = parse_upload(file_path, key, store, cache)[0] if df is None else df
+        memory_before = df.memory_usage(deep=True, index=False)
+        df = optimize_dataframe(df)
+        store.put(key, "memory_before", memory_before)
+        cache.put(key, name, df, {"memory_before": [(col, int(n_bytes)) for col, n_bytes in memory_before.items()]})
+    else:
+        df, n_bytes = parse_upload(file_path, key, store, cache)
+        cache.put(key, name, df)
+        upload_history.remember(file_path, key)
+    store.put(key, name, df, int(df.memory_usage(deep=True).sum()) if n_bytes is None else n_bytes)
+    return df
+
+
+def parse_upload(file_path, key, store=dataset_store, cache=disk_cache):
+    # An upload made of an earlier one with rows appended only has its new rows parsed, if the parsed dataframe of the earlier one is still in memory or on disk
+    # Returns the dataframe and its memory usage when it is known without measuring every row again (the earlier rows are already charged to the store), None otherwise
+    appended = upload_history.find_base(file_path, key) if config.INCREMENTAL else None
+    if appended is not None:
+        base_df = store.get(appended.base_key, "df")
+        base_bytes = None if base_df is None else store.size(appended.base_key, "df")
+        if base_df is None:
+            cached = cache.get(appended.base_key, "df")
+            base_df = None if cached is None else cached[0]
+        df = None if base_df is None else extend_dataframe(file_path, appended, base_df)
+        if df is not None:
+            if base_bytes is not None:
+                base_bytes += int(df.iloc[len(base_df):].memory_usage(deep=True, index=False).sum())
+            return df, base_bytes
+    return read_csv(file_path), None
+
+
+def load_memory_before(file_path, store=dataset_store, cache=disk_cache):
+    # Memory usage of each column as parsed by pd.read_csv, recorded when the optimized dataframe is built
+    load_dataframe(file_path, store, cache, optimize=True)
+    return store.get(hash_upload(file_path), "memory_before")
+
+
+def load_sample(file_path, store=dataset_store):
+    """
+    --------------------
+    Description
+    --------------------
+    -> load_sample (function): Function that returns the uniform sample of the rows of an upload used by the sample-first mode, streaming the file only if it is not in the store yet.
+    The sample is not saved in the disk cache: it is meant for uploads too large to wait for, which the disk cache would hold whole.
+
+    --------------------
+    Parameters
+    --------------------
+    -> file_path (str or file-like): Uploaded file or path to the CSV file
+    -> store (DatasetStore): Store used to cache the sample (default set to the shared store)
+
+    --------------------
+    Returns
+    --------------------
+    -> (SampleScan): Sample, head, tail, number of rows and data types of the file
+
+    """
+    key = hash_upload(file_path)
+    scan = store.get(key, "sample")
+    if scan is None:
+        scan = scan_sample(file_path)
+        store.put(key, "sample", scan, int(scan.df.memory_usage(deep=True).sum()))
+    return scan
+
+
+def detach_upload(file_path, store=dataset_store):
+    # In-memory uploads share their read position, a copy (made once per upload) lets background threads read one while the app reads it too
+    if not hasattr(file_path, "getvalue"):
+        return file_path
+    key = hash_upload(file_path)
+    copy = store.get(key, "upload_copy")
+    if copy is None:
+        copy = store.put(key, "upload_copy", io.BytesIO(file_path.getvalue()), upload_size(file_path))
+    return copy
+
+
+def invalidate_upload(file_path, store=dataset_store, cache=disk_cache):
+    # Drop everything kept about an upload, in memory and on disk, so that the next access parses it again
+    key = hash_upload(file_path)
+    store.invalidate(key)
+    cache.invalidate(key)
+    upload_history.forget(key)